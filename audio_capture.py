@@ -0,0 +1,163 @@
+# audio_capture.py
+# -*- coding: utf-8 -*-
+# 专用采集线程 + 预分配环形缓冲：取代每帧一次的 run_in_executor(stream.read)
+
+import time
+import asyncio
+import threading
+import contextlib
+from collections import deque
+
+_PA_INPUT_OVERFLOWED = -9981  # PortAudio paInputOverflowed
+
+
+class PcmRingBuffer:
+    """
+    单生产者/单消费者环形缓冲，底层是一块预分配的 bytearray。
+    写指针只由采集线程推进，读指针只由事件循环推进（CPython 下整数赋值是原子的），所以不需要锁。
+    写满时丢弃新数据并计一次 overrun（生产者不能动读指针）。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._w = 0  # 累计写入字节数
+        self._r = 0  # 累计读出字节数
+        self.overruns = 0
+        self.dropped_bytes = 0
+
+    def available(self) -> int:
+        return self._w - self._r
+
+    def free(self) -> int:
+        return self.capacity - (self._w - self._r)
+
+    def write(self, data) -> bool:
+        n = len(data)
+        if n > self.free():
+            self.overruns += 1
+            self.dropped_bytes += n
+            return False
+        pos = self._w % self.capacity
+        first = min(n, self.capacity - pos)
+        self._view[pos:pos + first] = data[:first]
+        if first < n:
+            self._view[:n - first] = data[first:]
+        self._w += n  # 数据拷完再发布
+        return True
+
+    def read_into(self, out: bytearray) -> int:
+        n = min(len(out), self.available())
+        pos = self._r % self.capacity
+        first = min(n, self.capacity - pos)
+        out[:first] = self._view[pos:pos + first]
+        if first < n:
+            out[first:n] = self._view[:n - first]
+        self._r += n
+        return n
+
+
+class CaptureThread:
+    """
+    一个长期运行的采集线程：阻塞读 PyAudio 输入流，写入环形缓冲，每帧最多唤醒事件循环一次
+    （只在消费方确实在等时才 call_soon_threadsafe）。
+    统计：
+    - overruns     ：环形缓冲满（事件循环处理不过来）被丢弃的帧数；
+    - device_overflows：PortAudio 报告输入溢出的次数（驱动层丢音）；
+    - underruns    ：消费方等待超过 2 个帧周期仍拿不到一帧的次数（采集卡顿/断流）。
+    """
+
+    def __init__(self, stream, frames_per_buffer: int, *, sample_width: int = 2, channels: int = 1,
+                 rate: int = 16000, ring_frames: int = 50):
+        self.stream = stream
+        self.frames_per_buffer = frames_per_buffer
+        self.frame_bytes = frames_per_buffer * sample_width * channels
+        self.frame_seconds = frames_per_buffer / rate
+        self.ring = PcmRingBuffer(self.frame_bytes * ring_frames)
+        self.device_overflows = 0
+        self.underruns = 0
+        self.frames_captured = 0
+        self._stamps: "deque[float]" = deque()  # 每帧写入环形缓冲的时刻，与帧一一对应
+        self.last_frame_at: float | None = None  # 最近一次读出的帧的采集时刻（time.monotonic）
+
+        self._running = False
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._event = asyncio.Event()
+        self._waiting = False
+
+    # --------------------- Producer（采集线程） ---------------------
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="lt-capture", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            try:
+                data = self.stream.read(self.frames_per_buffer, exception_on_overflow=True)
+            except IOError as e:
+                if getattr(e, "errno", None) == _PA_INPUT_OVERFLOWED:
+                    # 输入溢出：这一帧已被驱动丢弃，记账后继续读
+                    self.device_overflows += 1
+                    continue
+                if self._running:
+                    print(f"[CAPTURE] read failed: {e}")
+                break
+            except Exception as e:
+                if self._running:  # stop() 打断阻塞读时的异常是预期的
+                    print(f"[CAPTURE] read failed: {e}")
+                break
+            self.frames_captured += 1
+            if self.ring.write(data):
+                self._stamps.append(time.monotonic())
+            if self._waiting:
+                with contextlib.suppress(RuntimeError):  # 事件循环已关闭
+                    self._loop.call_soon_threadsafe(self._event.set)
+        self._running = False
+        if self._loop is not None:
+            with contextlib.suppress(RuntimeError):
+                self._loop.call_soon_threadsafe(self._event.set)
+
+    # --------------------- Consumer（事件循环） ---------------------
+
+    async def read_into(self, out: bytearray) -> memoryview | None:
+        """读满一帧到调用方提供的缓冲；采集线程已退出且没有剩余数据时返回 None。"""
+        n = len(out)
+        while self.ring.available() < n:
+            if not self._running:
+                return None
+            self._event.clear()
+            self._waiting = True
+            try:
+                if self.ring.available() >= n:  # 置位后复查，避免漏掉唤醒
+                    break
+                await asyncio.wait_for(self._event.wait(), timeout=self.frame_seconds * 2)
+            except asyncio.TimeoutError:
+                self.underruns += 1
+            finally:
+                self._waiting = False
+        self.ring.read_into(out)
+        self.last_frame_at = self._stamps.popleft() if self._stamps else None
+        return memoryview(out)
+
+    def stop(self, timeout: float = 1.0, interrupt=None):
+        """interrupt：能让阻塞中的 read() 立即返回的回调（如套接字源的 shutdown），在 join 之前调用，免得白等 timeout。"""
+        self._running = False
+        if interrupt is not None:
+            with contextlib.suppress(Exception):
+                interrupt()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "frames_captured": self.frames_captured,
+            "ring_fill": self.ring.available() // self.frame_bytes,
+            "overruns": self.ring.overruns,
+            "device_overflows": self.device_overflows,
+            "underruns": self.underruns,
+        }
@@ -0,0 +1,192 @@
+# audio_devices.py
+# -*- coding: utf-8 -*-
+# 进程内共享的音频设备表：一个 PyAudio 句柄 + 一次枚举的设备快照，按名称/能力建索引，查找结果缓存
+
+import time
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    import pyaudio
+
+# 匹配模式：字符串 = 名称包含该子串；元组 = 名称同时包含其中所有子串（均不区分大小写）
+Pattern = Union[str, Tuple[str, ...]]
+
+
+def _match(name: str, pattern: Pattern) -> bool:
+    if isinstance(pattern, str):
+        return pattern.lower() in name
+    return all(p.lower() in name for p in pattern)
+
+
+class DeviceRegistry:
+    """
+    PyAudio 在第一次查询/借用时才导入与初始化（无声卡、纯文本的部署完全不加载）。
+    PortAudio 只在初始化时扫描一次设备，且初始化计数是进程全局的：
+    反复 PyAudio()/terminate() 既慢（每次都重扫所有 host API），也看不到“别的实例还开着时”插入的新设备。
+    所以这里只保留一个句柄：
+    - acquire()/release()：客户端借用句柄开流，引用计数；
+    - devices()/info()/find()：读快照，find() 的结果按 (方向, 模式) 缓存；
+    - refresh()：重新初始化 PortAudio 并重建索引。有流在用时推迟到最后一个 release()；
+    - 热插拔：查找落空且快照已超过 miss_rescan_s 时自动刷新一次；开流失败时客户端调用 invalidate()。
+    """
+
+    def __init__(self, miss_rescan_s: float = 5.0):
+        self.miss_rescan_s = miss_rescan_s
+        self._lock = threading.RLock()
+        self._pa: Optional["pyaudio.PyAudio"] = None
+        self._users = 0
+        self._stale = False
+        self._devices: List[dict] = []
+        self._by_name: Dict[str, int] = {}
+        self._inputs: List[int] = []
+        self._outputs: List[int] = []
+        self._cache: Dict[tuple, Optional[int]] = {}
+        self.scanned_at = 0.0
+        self.scans = 0
+
+    # --------------------- Handle ---------------------
+
+    def _ensure(self) -> "pyaudio.PyAudio":
+        if self._pa is None:
+            import pyaudio  # 延迟导入：第一次真正用到设备时才加载并初始化 PortAudio
+            self._pa = pyaudio.PyAudio()
+            self._scan()
+        return self._pa
+
+    def _scan(self):
+        pa = self._pa
+        devices, by_name, inputs, outputs = [], {}, [], []
+        for i in range(pa.get_device_count()):
+            try:
+                info = pa.get_device_info_by_index(i)
+            except Exception:
+                info = {"index": i, "name": "", "maxInputChannels": 0, "maxOutputChannels": 0}
+            devices.append(info)
+            name = (info.get("name") or "").lower()
+            by_name.setdefault(name, i)
+            if int(info.get("maxInputChannels", 0)) > 0:
+                inputs.append(i)
+            if int(info.get("maxOutputChannels", 0)) > 0:
+                outputs.append(i)
+        self._devices, self._by_name = devices, by_name
+        self._inputs, self._outputs = inputs, outputs
+        self._cache.clear()
+        self._stale = False
+        self.scanned_at = time.monotonic()
+        self.scans += 1
+
+    def acquire(self) -> "pyaudio.PyAudio":
+        """借用共享句柄（用来 open() 流）；用完必须 release()。"""
+        with self._lock:
+            pa = self._ensure()
+            self._users += 1
+            return pa
+
+    def release(self):
+        with self._lock:
+            self._users = max(0, self._users - 1)
+            if self._users == 0 and self._stale:
+                self._reinit()
+
+    def _reinit(self):
+        if self._pa is not None:
+            try:
+                self._pa.terminate()
+            except Exception:
+                pass
+            self._pa = None
+        self._ensure()
+
+    def refresh(self) -> bool:
+        """重新扫描设备。返回 True 表示已立即刷新；False 表示有流在用，推迟到全部释放后。"""
+        with self._lock:
+            if self._users:
+                self._stale = True
+                return False
+            self._reinit()
+            return True
+
+    def invalidate(self):
+        """标记快照过期（例如开流失败、疑似设备拔插）：空闲时立即重扫，否则等句柄释放。"""
+        self.refresh()
+
+    def close(self):
+        with self._lock:
+            if self._pa is not None:
+                try:
+                    self._pa.terminate()
+                except Exception:
+                    pass
+            self._pa = None
+            self._users = 0
+            self._devices, self._by_name, self._inputs, self._outputs = [], {}, [], []
+            self._cache.clear()
+
+    # --------------------- Lookup ---------------------
+
+    def devices(self) -> List[dict]:
+        with self._lock:
+            self._ensure()
+            return list(self._devices)
+
+    def info(self, idx: Optional[int]) -> Optional[dict]:
+        if idx is None:
+            return None
+        with self._lock:
+            self._ensure()
+            return self._devices[idx] if 0 <= idx < len(self._devices) else None
+
+    def index_of(self, name: str) -> Optional[int]:
+        """按完整设备名（不区分大小写）查索引。"""
+        with self._lock:
+            self._ensure()
+            return self._by_name.get(name.lower())
+
+    def find(
+        self,
+        kind: str,
+        patterns: Sequence[Pattern],
+        exclude: Sequence[str] = (),
+        fallback: Sequence[Pattern] = (),
+    ) -> Optional[int]:
+        """
+        在 kind（"input"/"output"）设备中按索引顺序找第一个名称匹配 patterns 任一项、且不含 exclude 的设备；
+        都没有时再按 fallback 找一遍。结果缓存到下次刷新。
+        """
+        key = (kind, tuple(patterns), tuple(exclude), tuple(fallback))
+        with self._lock:
+            self._ensure()
+            if key in self._cache:
+                found = self._cache[key]
+                if found is not None or self._users or time.monotonic() - self.scanned_at < self.miss_rescan_s:
+                    return found
+                self._reinit()  # 上次没找到且快照已旧：可能是刚插上的设备，空闲时重扫一次
+            found = self._search(kind, patterns, exclude) if patterns else None
+            if found is None and fallback:
+                found = self._search(kind, fallback, exclude)
+            self._cache[key] = found
+            return found
+
+    def _search(self, kind: str, patterns: Sequence[Pattern], exclude: Sequence[str]) -> Optional[int]:
+        for i in (self._inputs if kind == "input" else self._outputs):
+            name = (self._devices[i].get("name") or "").lower()
+            if any(x.lower() in name for x in exclude):
+                continue
+            if any(_match(name, p) for p in patterns):
+                return i
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._devices),
+            "inputs": len(self._inputs),
+            "outputs": len(self._outputs),
+            "users": self._users,
+            "stale": self._stale,
+            "scans": self.scans,
+            "age_s": round(time.monotonic() - self.scanned_at, 1) if self.scans else None,
+        }
+
+
+DEVICES = DeviceRegistry()
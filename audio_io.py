@@ -0,0 +1,446 @@
+# audio_io.py
+# -*- coding: utf-8 -*-
+# 可插拔的采集源 / 播放端：PyAudio 设备、WAV 文件、裸 TCP 套接字、合成信号、空设备。
+# PyAudio（PortAudio）只在真正用到设备后端时才导入并初始化；纯文本、远程推流、无声卡的部署不碰音频硬件。
+
+import math
+import time
+import wave
+import socket
+import threading
+import contextlib
+from array import array
+from typing import Optional
+
+from jitter_buffer import JitterBuffer
+from resampler import to_mono
+
+PA_INT16 = 8  # 与 pyaudio.paInt16 相同；这里不 import pyaudio
+
+
+# --------------------- Sources ---------------------
+
+class AudioSource:
+    """
+    采集源：open(frame_ms) 返回一个阻塞读的流对象，交给 CaptureThread 在专用线程里读：
+        stream.read(frames, exception_on_overflow=...) -> bytes（PCM16 单声道，frames 个采样）
+        stream.stop_stream() / stream.close()
+        stream.interrupt()（可选）：让阻塞中的 read() 立即返回，停止时在等采集线程退出之前调用
+    open() 之后 rate / frames_per_buffer 为实际值（重采样到 16k 由客户端完成）。
+    """
+
+    name = "source"
+
+    def __init__(self, rate: int = 16000):
+        self.rate = rate
+        self.frames_per_buffer = 0
+
+    def open(self, frame_ms: int):
+        raise NotImplementedError
+
+
+class _PacedStream:
+    """按实时节奏出帧的流（文件、合成信号）：read() 睡到这一帧“应当被采到”的时刻再返回。"""
+
+    def __init__(self, rate: int, produce, close=None, realtime: bool = True):
+        self.rate = rate
+        self._produce = produce
+        self._close = close
+        self.realtime = realtime
+        self._next_t: Optional[float] = None
+
+    def read(self, frames: int, exception_on_overflow: bool = False) -> bytes:
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_t is None:
+                self._next_t = now
+            self._next_t += frames / self.rate
+            if self._next_t > now:
+                time.sleep(self._next_t - now)
+        return self._produce(frames)
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+
+class PyAudioSource(AudioSource):
+    """声卡/虚拟声卡输入：按设备默认采样率打开，借用进程共享的 PyAudio 句柄（audio_devices.DEVICES）。"""
+
+    name = "pyaudio"
+
+    def __init__(self, device_index: Optional[int] = None):
+        super().__init__(rate=44100)
+        self.device_index = device_index
+
+    def open(self, frame_ms: int):
+        from audio_devices import DEVICES  # 延迟导入：用到设备时才加载 PyAudio
+        rate = None
+        if self.device_index is not None:
+            with contextlib.suppress(Exception):
+                rate = int(DEVICES.info(self.device_index).get("defaultSampleRate", 44100))
+        self.rate = rate or 44100
+        self.frames_per_buffer = max(1, self.rate * frame_ms // 1000)
+        pa = DEVICES.acquire()
+        try:
+            stream = pa.open(
+                format=PA_INT16,
+                channels=1,
+                rate=self.rate,
+                input=True,
+                input_device_index=self.device_index,
+                frames_per_buffer=self.frames_per_buffer,
+            )
+        except Exception:
+            DEVICES.release()
+            DEVICES.invalidate()  # 设备可能已拔出/索引已变：下次查找前重新枚举
+            raise
+        return _ReleasingStream(stream, DEVICES.release)
+
+
+class _ReleasingStream:
+    """包一层：关流时顺带归还共享的 PyAudio 句柄。"""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self.read = stream.read
+        self.stop_stream = stream.stop_stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class WavFileSource(AudioSource):
+    """WAV 文件（16-bit PCM，多声道取平均/第一声道）：默认按实时节奏出帧，loop=True 时循环播放，否则读完即结束采集。"""
+
+    name = "wav"
+
+    def __init__(self, path: str, loop: bool = False, realtime: bool = True):
+        super().__init__()
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+
+    def open(self, frame_ms: int):
+        wf = wave.open(self.path, "rb")
+        if wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
+            wf.close()
+            raise ValueError(f"{self.path}: only 16-bit PCM WAV is supported")
+        self.rate, channels = wf.getframerate(), wf.getnchannels()
+        self.frames_per_buffer = max(1, self.rate * frame_ms // 1000)
+
+        def produce(frames: int) -> bytes:
+            data = wf.readframes(frames)
+            if len(data) < frames * 2 * channels and self.loop:
+                wf.rewind()
+                data += wf.readframes(frames - len(data) // (2 * channels))
+            if not data:
+                raise EOFError(f"{self.path}: end of file")
+            pcm = to_mono(data, channels)
+            return pcm + bytes(frames * 2 - len(pcm))  # 最后一块补零到整帧
+
+        return _PacedStream(self.rate, produce, wf.close, realtime=self.realtime)
+
+
+class SyntheticSource(AudioSource):
+    """合成信号：kind="silence" 全静音，"tone" 为 freq Hz 正弦（amplitude 为峰值），实时节奏。压测、无声卡自检用。"""
+
+    name = "synthetic"
+
+    def __init__(self, kind: str = "silence", freq: float = 440.0, amplitude: int = 3000, rate: int = 16000):
+        super().__init__(rate=rate)
+        if kind not in ("silence", "tone"):
+            raise ValueError(f"unknown synthetic source: {kind}")
+        self.kind = kind
+        self.freq = freq
+        self.amplitude = amplitude
+
+    def open(self, frame_ms: int):
+        self.frames_per_buffer = max(1, self.rate * frame_ms // 1000)
+        n = self.frames_per_buffer
+        if self.kind == "silence":
+            silence = bytes(n * 2)
+            return _PacedStream(self.rate, lambda frames: silence if frames == n else bytes(frames * 2))
+        pos = [0]
+        w = 2 * math.pi * self.freq / self.rate
+
+        def produce(frames: int) -> bytes:
+            p = pos[0]
+            pos[0] += frames
+            return array("h", (int(self.amplitude * math.sin(w * (p + i))) for i in range(frames))).tobytes()
+
+        return _PacedStream(self.rate, produce)
+
+
+class SocketSource(AudioSource):
+    """
+    裸 TCP（主动连出，不监听）：连到 host:port 上已在监听的推流端，读它推来的 PCM16 单声道（采样率由 rate 约定）；
+    对端关闭即结束采集。
+    """
+
+    name = "tcp"
+
+    def __init__(self, host: str, port: int, rate: int = 16000, timeout: float = 5.0):
+        super().__init__(rate=rate)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def open(self, frame_ms: int):
+        self.frames_per_buffer = max(1, self.rate * frame_ms // 1000)
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.settimeout(None)
+
+        class _Stream:
+            def read(self, frames: int, exception_on_overflow: bool = False) -> bytes:
+                buf = bytearray(frames * 2)
+                view = memoryview(buf)
+                got = 0
+                while got < len(buf):
+                    n = sock.recv_into(view[got:])
+                    if n == 0:
+                        raise EOFError("socket closed by peer")
+                    got += n
+                return bytes(buf)
+
+            def interrupt(self):
+                with contextlib.suppress(OSError):
+                    sock.shutdown(socket.SHUT_RDWR)  # 让阻塞中的 recv 立即返回
+
+            def stop_stream(self):
+                self.interrupt()
+
+            def close(self):
+                sock.close()
+
+        return _Stream()
+
+
+# --------------------- Sinks ---------------------
+
+class AudioSink:
+    """
+    播放端：start() 后自行从 JitterBuffer 取 TTS（24k/mono/PCM16），stop() 放完剩余（最多 drain_s 秒）后关闭。
+    stop() 会阻塞，事件循环里请放进 executor。
+    """
+
+    name = "sink"
+
+    def start(self, buffer: JitterBuffer, rate: int, channels: int, block_frames: int):
+        raise NotImplementedError
+
+    def stop(self, drain_s: float = 1.0):
+        pass
+
+    @property
+    def active(self) -> bool:
+        return False
+
+    def stats(self) -> dict:
+        return {"sink": self.name}
+
+
+class PyAudioSink(AudioSink):
+    """声卡输出：PortAudio 回调模式（audio_playback.CallbackPlayer）。"""
+
+    name = "pyaudio"
+
+    def __init__(self, device_index: Optional[int] = None):
+        self.device_index = device_index
+        self.player = None
+        self._release = None
+
+    def start(self, buffer: JitterBuffer, rate: int, channels: int, block_frames: int):
+        from audio_devices import DEVICES  # 延迟导入：用到设备时才加载 PyAudio
+        from audio_playback import CallbackPlayer
+        pa = DEVICES.acquire()
+        player = CallbackPlayer(pa, buffer, rate=rate, channels=channels, frames_per_buffer=block_frames,
+                                device_index=self.device_index, sample_format=PA_INT16)
+        try:
+            player.start()
+        except Exception:
+            DEVICES.release()
+            DEVICES.invalidate()  # 设备可能已拔出/索引已变
+            raise
+        self.player, self._release = player, DEVICES.release
+
+    def stop(self, drain_s: float = 1.0):
+        player, self.player = self.player, None
+        if player is not None:
+            player.stop(drain_s)
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+    @property
+    def active(self) -> bool:
+        return self.player is not None and self.player.active
+
+    def stats(self) -> dict:
+        return {"sink": self.name, **(self.player.stats() if self.player else {})}
+
+
+class _ThreadSink(AudioSink):
+    """把缓冲里的音频尽快写到某处（文件/套接字）：一个线程阻塞在 JitterBuffer 的条件变量上，不轮询。"""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self.bytes_written = 0
+
+    def _open(self, rate: int, channels: int):
+        raise NotImplementedError
+
+    def _write(self, pcm: bytes):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def start(self, buffer: JitterBuffer, rate: int, channels: int, block_frames: int):
+        self._open(rate, channels)
+        nbytes = block_frames * 2 * channels
+
+        def run():
+            try:
+                while True:
+                    chunk = buffer.wait_read(nbytes, timeout=0.5)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        self._write(chunk)
+                        self.bytes_written += len(chunk)
+            except Exception as e:
+                print(f"[AUDIO] {self.name} sink stopped: {e}")
+            finally:
+                self._close()
+
+        self._thread = threading.Thread(target=run, name=f"lt-sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, drain_s: float = 1.0):
+        # 调用方已 close() 缓冲：线程写完剩余数据后自行退出
+        if self._thread is not None:
+            self._thread.join(timeout=drain_s)
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self) -> dict:
+        return {"sink": self.name, "bytes_written": self.bytes_written}
+
+
+class WavFileSink(_ThreadSink):
+    """把译音写成 WAV 文件。"""
+
+    name = "wav"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._wf = None
+
+    def _open(self, rate: int, channels: int):
+        self._wf = wave.open(self.path, "wb")
+        self._wf.setnchannels(channels)
+        self._wf.setsampwidth(2)
+        self._wf.setframerate(rate)
+
+    def _write(self, pcm: bytes):
+        self._wf.writeframes(pcm)
+
+    def _close(self):
+        if self._wf is not None:
+            with contextlib.suppress(Exception):
+                self._wf.close()
+            self._wf = None
+
+
+class SocketSink(_ThreadSink):
+    """裸 TCP（主动连出，不监听）：连到 host:port 上已在监听的播放端，把译音 PCM16 原样推过去（对端自己播放）。"""
+
+    name = "tcp"
+
+    def __init__(self, host: str, port: int, timeout: float = 5.0):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock = None
+
+    def _open(self, rate: int, channels: int):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+
+    def _write(self, pcm: bytes):
+        self._sock.sendall(pcm)
+
+    def _close(self):
+        if self._sock is not None:
+            with contextlib.suppress(OSError):
+                self._sock.close()
+            self._sock = None
+
+
+class NullSink(AudioSink):
+    """丢弃译音：关闭缓冲，put() 直接返回，不占内存也不起线程。"""
+
+    name = "null"
+
+    def start(self, buffer: JitterBuffer, rate: int, channels: int, block_frames: int):
+        buffer.close()
+
+
+# --------------------- Specs ---------------------
+
+def _host_port(spec: str):
+    host, _, port = spec.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def make_source(spec: str) -> AudioSource:
+    """
+    按字符串构造采集源（环境变量/命令行用）：
+      pyaudio[:索引]  wav:路径[:loop]  tcp:主机:端口[@采样率]  tone[:频率]  silence
+    tcp 为主动连出：主机:端口 是推流端监听的地址。
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "pyaudio":
+        return PyAudioSource(int(arg) if arg else None)
+    if kind == "wav":
+        path, loop = (arg[:-5], True) if arg.endswith(":loop") else (arg, False)
+        return WavFileSource(path, loop=loop)
+    if kind == "tcp":
+        addr, _, rate = arg.partition("@")
+        return SocketSource(*_host_port(addr), rate=int(rate or 16000))
+    if kind == "tone":
+        return SyntheticSource("tone", freq=float(arg or 440))
+    if kind == "silence":
+        return SyntheticSource("silence")
+    raise ValueError(f"unknown audio source: {spec}")
+
+
+def make_sink(spec: str) -> AudioSink:
+    """
+    按字符串构造播放端：
+      pyaudio[:索引]  wav:路径  tcp:主机:端口  null
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "pyaudio":
+        return PyAudioSink(int(arg) if arg else None)
+    if kind == "wav":
+        return WavFileSink(arg)
+    if kind == "tcp":
+        return SocketSink(*_host_port(arg))
+    if kind == "null":
+        return NullSink()
+    raise ValueError(f"unknown audio sink: {spec}")
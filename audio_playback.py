@@ -0,0 +1,136 @@
+# audio_playback.py
+# -*- coding: utf-8 -*-
+# 回调模式播放：PortAudio 要数据时直接从 JitterBuffer 取，取代“轮询队列 + 阻塞 stream.write”的播放线程
+
+import time
+import threading
+import contextlib
+
+from jitter_buffer import JitterBuffer
+
+# PortAudio 常量（与 pyaudio.paContinue / paComplete / paOutputUnderflow 相同）
+_PA_CONTINUE = 0
+_PA_COMPLETE = 1
+_PA_OUTPUT_UNDERFLOW = 0x4
+
+
+class CallbackPlayer:
+    """
+    一个输出流 = 一个 PortAudio 回调：声卡每要一块（frames_per_buffer 帧）就调用一次 _callback，
+    从 JitterBuffer 拷进预分配的块缓冲，不够的部分补静音后交回。
+    - 没有自己的线程：回调跑在 PortAudio 的音频线程里，按声卡时钟驱动，不轮询、不阻塞在 write；
+    - 块可以取得很小（默认 20ms），输出延迟 ≈ 一两个块，而不是旧播放线程固定的 100ms 写缓冲；
+    - 欠载（TTS 还没到）时整块或部分补静音，流一直开着，不会因为短暂断流而停播。
+    统计：callbacks、underruns（补了静音的回调数）、silence_ms、device_underflows（PortAudio 报告的输出欠载）。
+    """
+
+    def __init__(
+        self,
+        pa,
+        buffer: JitterBuffer,
+        *,
+        rate: int = 24000,
+        channels: int = 1,
+        frames_per_buffer: int = 480,
+        device_index: int | None = None,
+        sample_format: int = 8,  # paInt16
+    ):
+        self.pa = pa
+        self.buffer = buffer
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.device_index = device_index
+        self.sample_format = sample_format
+        self.bytes_per_frame = 2 * channels
+        self._out = bytearray(frames_per_buffer * self.bytes_per_frame)  # 预分配的块缓冲，回调里复用
+        self._zeros = bytes(len(self._out))  # 预分配的整块静音：整块欠载时直接交回，零分配
+        self._stream = None
+        self._stopping = False
+        self._drained = threading.Event()
+
+        self.callbacks = 0
+        self.underruns = 0
+        self.silence_bytes = 0
+        self.device_underflows = 0
+
+    # --------------------- Control ---------------------
+
+    def start(self):
+        self._stopping = False
+        self._drained.clear()
+        self._stream = self.pa.open(
+            format=self.sample_format,
+            channels=self.channels,
+            rate=self.rate,
+            output=True,
+            output_device_index=self.device_index,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=self._callback,
+        )
+        self._stream.start_stream()
+
+    @property
+    def active(self) -> bool:
+        stream = self._stream
+        if stream is None:
+            return False
+        with contextlib.suppress(Exception):
+            return stream.is_active()
+        return False
+
+    def stop(self, drain_s: float = 1.0):
+        """
+        停止播放：先把缓冲里剩下的放完（最多 drain_s 秒；调用方应先 buffer.close() 让生产者停下），再关流。
+        阻塞调用，事件循环里请放进 executor。
+        """
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return
+        self._stopping = True
+        deadline = time.monotonic() + drain_s
+        while self.buffer.fill_ms > 0 and time.monotonic() < deadline and not self._drained.is_set():
+            self._drained.wait(0.02)
+        with contextlib.suppress(Exception):
+            stream.stop_stream()
+        with contextlib.suppress(Exception):
+            stream.close()
+
+    # --------------------- Callback ---------------------
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & _PA_OUTPUT_UNDERFLOW:
+            self.device_underflows += 1
+        self.callbacks += 1
+        out = self._out
+        need = frame_count * self.bytes_per_frame
+        if need != len(out):
+            # 个别后端会给不同的 frame_count：换一块合适的缓冲（之后继续复用）
+            out = self._out = bytearray(need)
+            self._zeros = bytes(need)
+        n = self.buffer.read_into(out)
+        flag = _PA_CONTINUE
+        if n < need:
+            self.underruns += 1
+            self.silence_bytes += need - n
+            if self._stopping and self.buffer.fill_ms <= 0:
+                self._drained.set()
+                flag = _PA_COMPLETE
+            if n == 0:
+                return self._zeros, flag
+            out[n:] = self._zeros[: need - n]
+        # 这一次拷贝省不掉：PyAudio 用 PyArg_ParseTuple("z#i") 解析回调返回值，只收 bytes 这类
+        # 不需释放的只读缓冲，bytearray / memoryview 会被拒（TypeError）。所以块缓冲预分配、
+        # JitterBuffer 直接拷进来（不拼接、不切片），最后只做这一次块大小（20ms@24k 为 960B）的 memcpy
+        return bytes(out), flag
+
+    # --------------------- Stats ---------------------
+
+    def stats(self) -> dict:
+        return {
+            "block_ms": round(self.frames_per_buffer * 1000 / self.rate, 1),
+            "callbacks": self.callbacks,
+            "underruns": self.underruns,
+            "silence_ms": round(self.silence_bytes / self.bytes_per_frame * 1000 / self.rate),
+            "device_underflows": self.device_underflows,
+        }
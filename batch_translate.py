@@ -0,0 +1,314 @@
+# batch_translate.py — 录音文件批量翻译（不经过声卡，按上游能接收的速度推流）
+# 用法：
+#   python batch_translate.py meeting1.wav meeting2.wav --target en --out out/
+#   python batch_translate.py rec/*.pcm --pcm-rate 48000 --jobs 8 --tts
+#
+# 每个文件一条上游连接（同时最多 --jobs 条），输出（输入分散在多个目录时，保留相对于公共上级目录的路径）：
+#   <out>/<名>.<语言>.txt    每句一行，带 [开始 - 结束] 时间（文件内时间）
+#   <out>/<名>.<语言>.jsonl  每句一条 {"index","start","end","text","aligned"}
+#   <out>/<名>.<语言>.wav    --tts 时的译音（24k/mono/PCM16）
+# 对齐：优先用服务端 input_audio_buffer.speech_started/stopped 的 audio_start_ms/audio_end_ms；
+# 服务端不给时退回“收到该句时已发送到的位置”（aligned=approx，推流越快越不准，可用 --speed 1 换精度）。
+
+import os
+import sys
+import json
+import time
+import wave
+import asyncio
+import argparse
+import contextlib
+from collections import deque
+
+from livetranslate_client import LiveTranslateClient
+from resampler import make_resampler, to_mono
+
+READ_MS = 1000     # 每次从文件读 1s，重采样后再切成 frame_ms 的帧
+TAIL_MS = 1500     # 文件末尾补的静音，让服务端 VAD 结束最后一句
+
+
+# --------------------- Input ---------------------
+
+def open_source(path: str, pcm_rate: int, pcm_channels: int):
+    """
+    返回 (采样率, 声道数, 总时长秒, 读块函数, 关闭函数)。WAV 需为 16-bit PCM；其他扩展名按裸 s16le 处理。
+    按块读取，几个小时的录音也不会整体载入内存。
+    """
+    if path.lower().endswith(".wav"):
+        wf = wave.open(path, "rb")
+        if wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
+            wf.close()
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        rate, channels = wf.getframerate(), wf.getnchannels()
+        duration = wf.getnframes() / rate
+
+        def read(nframes: int) -> bytes:
+            return wf.readframes(nframes)
+
+        return rate, channels, duration, read, wf.close
+
+    f = open(path, "rb")
+    rate, channels = pcm_rate, pcm_channels
+    duration = os.path.getsize(path) / (2 * channels * rate)
+
+    def read(nframes: int) -> bytes:
+        return f.read(nframes * 2 * channels)
+
+    return rate, channels, duration, read, f.close
+
+
+def _ts(ms: float) -> str:
+    ms = int(max(0, ms))
+    h, ms = divmod(ms, 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+# --------------------- One file ---------------------
+
+class _Aligner:
+    """把服务端事件/发送进度换算成每句在文件内的 [start, end]（毫秒）。"""
+
+    def __init__(self):
+        self.sent_ms = 0.0
+        self.base_ms = 0.0  # 当前连接的音频 0 点在文件里的位置（重连后服务端的 audio_*_ms 从 0 重新计）
+        self.starts: "deque[float]" = deque()
+        self.ends: "deque[float]" = deque()
+        self.segments: list = []
+        self._cur_start = None
+        self._cur_aligned = "approx"
+
+    def speech_started(self, event):
+        ms = event.get("audio_start_ms")
+        if isinstance(ms, (int, float)):
+            self.starts.append(self.base_ms + ms)
+
+    def speech_stopped(self, event):
+        ms = event.get("audio_end_ms")
+        if isinstance(ms, (int, float)):
+            self.ends.append(self.base_ms + ms)
+
+    def reconnected(self, connection_ms: float):
+        """
+        重连完成：新连接已收到 connection_ms 的重放音频，另有尚未补发的缓冲；
+        推流在断线期间停着，所以新连接的 0 点 = 已送出的文件位置 - 这两部分。
+        旧连接上还没配上句子的断句点作废：新连接会对重放的音频重新报一遍。
+        """
+        self.base_ms = max(0.0, self.sent_ms - connection_ms)
+        self.starts.clear()
+        self.ends.clear()
+
+    def delta(self, _text):
+        if self._cur_start is None:
+            if self.starts:
+                self._cur_start, self._cur_aligned = self.starts.popleft(), "server"
+            else:
+                prev_end = self.segments[-1]["end"] if self.segments else 0
+                self._cur_start, self._cur_aligned = max(prev_end, self.sent_ms), "approx"
+
+    def done(self, text: str):
+        self.delta(text)
+        if self._cur_aligned == "server" and self.ends:
+            end = self.ends.popleft()
+        else:
+            end = self.sent_ms
+        end = max(end, self._cur_start)
+        self.segments.append({
+            "index": len(self.segments),
+            "start": round(self._cur_start / 1000, 3),
+            "end": round(end / 1000, 3),
+            "text": text,
+            "aligned": self._cur_aligned,
+        })
+        self._cur_start = None
+
+
+def output_stems(files, out: str) -> dict:
+    """
+    每个输入文件的输出前缀（不含 .<语言>.txt 等后缀）：<out>/<相对公共上级目录的路径>/<名>。
+    输入都在同一目录时就是 <out>/<名>；不同目录里的同名文件（a/x.wav、b/x.wav）各自落到子目录，不互相覆盖。
+    仍然撞名（同一目录的 x.wav 与 x.pcm、同一文件给了两次）时报错。
+    """
+    dirs = [os.path.dirname(os.path.abspath(p)) for p in files]
+    common = os.path.commonpath(dirs) if dirs else ""
+    stems, seen = {}, {}
+    for path, d in zip(files, dirs):
+        rel = os.path.relpath(d, common)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        out_stem = os.path.normpath(os.path.join(out, rel, stem))
+        if out_stem in seen:
+            raise ValueError(f"{path} and {seen[out_stem]} would both write {out_stem}.*")
+        seen[out_stem] = path
+        stems[path] = out_stem
+    return stems
+
+
+async def translate_file(path: str, out_stem: str, args, api_key: str, budget: asyncio.Semaphore) -> dict:
+    base = f"{out_stem}.{args.target}"
+
+    async with budget:
+        # 拿到连接名额后才打开文件：成百上千个文件排队时不占文件句柄
+        rate, channels, duration, read, close_src = open_source(path, args.pcm_rate, args.pcm_channels)
+        t0 = time.monotonic()
+        client = LiveTranslateClient(
+            api_key, target_language=args.target, voice=args.voice,
+            audio_enabled=args.tts, frame_ms=args.frame_ms,
+        )
+        client.playback_buffer.close()  # 不在本机播放；TTS 直接写文件
+        align = _Aligner()
+        client.on("input_audio_buffer.speech_started", align.speech_started)
+        client.on("input_audio_buffer.speech_stopped", align.speech_stopped)
+
+        def on_state(state):
+            if state == "connected":  # 只有重连成功才会通知
+                align.reconnected(client.connection_audio_ms + client.pending_audio_ms)
+
+        client.on_connection_state = on_state
+        last_event = [time.monotonic()]
+
+        def touch(*_):
+            last_event[0] = time.monotonic()
+
+        tts = None
+        if args.tts:
+            tts = wave.open(base + ".wav", "wb")
+            tts.setnchannels(client.output_channels)
+            tts.setsampwidth(2)
+            tts.setframerate(client.output_rate)
+            client.on_audio(lambda pcm: (tts.writeframes(pcm), touch()))
+        client.on("response.done", touch)
+
+        def on_delta(text):
+            touch()
+            align.delta(text)
+
+        def on_done(text):
+            touch()
+            align.done(text)
+
+        resampler = make_resampler(rate, client.input_rate)
+        frame_bytes = client.input_chunk * 2
+        frame_ms = client.input_chunk * 1000 / client.input_rate
+        reader = None
+        try:
+            await client.connect()
+            reader = asyncio.create_task(client.handle_server_messages(on_delta, on_done))
+            pending = bytearray()
+            eof = False
+            while not eof:
+                block = read(rate * READ_MS // 1000)
+                if not block:
+                    eof = True
+                    block = b""
+                pcm = resampler.process(to_mono(block, channels)) if block else b""
+                if eof:
+                    pcm += bytes(client.input_rate * TAIL_MS // 1000 * 2)
+                pending += pcm
+                while len(pending) >= frame_bytes or (eof and pending):
+                    frame = bytes(pending[:frame_bytes])
+                    del pending[:frame_bytes]
+                    # 断线重连期间先停下，不往预连接缓冲里塞（它满了会丢最旧的帧）
+                    while not client.is_connected:
+                        if not client.is_active or reader.done():
+                            raise RuntimeError("upstream connection lost")
+                        await asyncio.sleep(0.05)
+                    await client.flush_pending()
+                    await client.send_audio_chunk(frame)
+                    align.sent_ms += frame_ms
+                    if args.speed > 0:
+                        # 限速：发送进度不超过 speed 倍实时
+                        ahead = align.sent_ms / 1000 / args.speed - (time.monotonic() - t0)
+                        if ahead > 0:
+                            await asyncio.sleep(ahead)
+            touch()
+            # 等结果收尾：连续 idle_timeout 秒没有新事件，或总等待超过 max_wait
+            sent_done = time.monotonic()
+            while not reader.done():
+                now = time.monotonic()
+                if now - last_event[0] >= args.idle_timeout or now - sent_done >= args.max_wait:
+                    break
+                await asyncio.sleep(0.2)
+        finally:
+            await client.close()
+            if reader is not None:
+                reader.cancel()
+                with contextlib.suppress(BaseException):
+                    await reader
+            close_src()
+            if tts is not None:
+                tts.close()
+
+    segments = align.segments
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        for seg in segments:
+            f.write(f"[{_ts(seg['start'] * 1000)} - {_ts(seg['end'] * 1000)}] {seg['text']}\n")
+    with open(base + ".jsonl", "w", encoding="utf-8") as f:
+        for seg in segments:
+            f.write(json.dumps(seg, ensure_ascii=False) + "\n")
+
+    wall = time.monotonic() - t0
+    return {
+        "file": path,
+        "audio_s": round(duration, 1),
+        "wall_s": round(wall, 1),
+        "speedup": round(duration / wall, 1) if wall else None,
+        "sentences": len(segments),
+        "reconnects": client.reconnects,
+    }
+
+
+# --------------------- CLI ---------------------
+
+async def run(args) -> int:
+    api_key = os.getenv("DASHSCOPE_API_KEY", "").strip()
+    if not api_key:
+        print("[ERROR] 请设置环境变量 DASHSCOPE_API_KEY")
+        return 2
+    try:
+        stems = output_stems(args.files, args.out)
+    except ValueError as e:
+        print(f"[ERROR] 输出文件名冲突：{e}")
+        return 2
+    for stem in set(stems.values()):
+        os.makedirs(os.path.dirname(stem) or ".", exist_ok=True)
+    budget = asyncio.Semaphore(args.jobs)  # 并发连接上限
+    t0 = time.monotonic()
+    results = await asyncio.gather(
+        *(translate_file(p, stems[p], args, api_key, budget) for p in args.files), return_exceptions=True
+    )
+    failed = 0
+    total_audio = 0.0
+    for path, r in zip(args.files, results):
+        if isinstance(r, BaseException):
+            failed += 1
+            print(f"[BATCH] FAIL {path}: {r}")
+        else:
+            total_audio += r["audio_s"]
+            print(f"[BATCH] {json.dumps(r, ensure_ascii=False)}")
+    wall = time.monotonic() - t0
+    print(f"[BATCH] {len(args.files) - failed}/{len(args.files)} files, "
+          f"{total_audio / 60:.1f} min audio in {wall / 60:.1f} min ({total_audio / max(wall, 1e-9):.1f}x realtime)")
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="批量翻译录音文件（WAV / 裸 PCM16）")
+    ap.add_argument("files", nargs="+")
+    ap.add_argument("--target", default="en", help="目标语言")
+    ap.add_argument("--voice", default="Cherry")
+    ap.add_argument("--tts", action="store_true", help="同时保存译音 WAV")
+    ap.add_argument("--out", default="batch_out")
+    ap.add_argument("--jobs", type=int, default=4, help="同时翻译的文件数（= 上游连接数）")
+    ap.add_argument("--speed", type=float, default=0, help="最多按几倍实时推流；0 = 不限速")
+    ap.add_argument("--frame-ms", type=int, default=200, help="上行帧长，批量时取大帧省每帧开销")
+    ap.add_argument("--pcm-rate", type=int, default=16000, help="裸 PCM 的采样率")
+    ap.add_argument("--pcm-channels", type=int, default=1, help="裸 PCM 的声道数")
+    ap.add_argument("--idle-timeout", type=float, default=8.0, help="发完后多少秒没有新结果就收尾")
+    ap.add_argument("--max-wait", type=float, default=120.0, help="发完后最多再等多少秒")
+    args = ap.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# bench_recv.py — 下行事件解码/分发基准
+# 用法：
+#   python bench_recv.py                       # 合成一段典型事件流（以音频增量为主）
+#   python bench_recv.py --events rec.jsonl    # 回放 LiveTranslateClient(record_events_path=...) 录下的真实事件
+#
+# 对比对象（都从 websocket 收到的原始 UTF-8 字节开始算）：
+#   legacy : 原 handle_server_messages 的做法（解码成 str + json.loads + if/elif + base64.b64decode）
+#   client : 直接跑 LiveTranslateClient._read_events（字节直通 + 音频增量快速路径 + 可选 orjson + 分发表），
+#            由假连接按顺序回放这些帧——客户端解码/分发路径的回退会直接反映在这里
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import time
+
+from livetranslate_client import LiveTranslateClient
+from wire_codec import JSON_BACKEND
+
+
+def synth_events(seconds: float) -> list:
+    """每 100ms：1 条 24k PCM16 音频增量（约 6.4KB base64），约每 300ms 一条文本增量，每 3s 一句结束。"""
+    out = []
+    for i in range(int(seconds * 10)):
+        pcm = os.urandom(4800)
+        out.append({"event_id": f"e{i}a", "type": "response.audio.delta", "response_id": "r",
+                    "item_id": "i", "output_index": 0, "content_index": 0,
+                    "delta": base64.b64encode(pcm).decode()})
+        if i % 3 == 0:
+            out.append({"event_id": f"e{i}t", "type": "response.audio_transcript.delta",
+                        "response_id": "r", "transcript": "hello "})
+        if i % 30 == 29:
+            out.append({"event_id": f"e{i}d", "type": "response.audio_transcript.done",
+                        "response_id": "r", "transcript": "hello hello hello."})
+            out.append({"event_id": f"e{i}r", "type": "response.done",
+                        "response": {"usage": {"input_tokens": 10, "output_tokens": 20}}})
+    return [json.dumps(e, separators=(",", ":")).encode("utf-8") for e in out]
+
+
+def legacy(messages, sink):
+    for raw in messages:
+        message = raw.decode("utf-8")
+        event = json.loads(message)
+        et = event.get("type")
+        if et == "error":
+            continue
+        if et == "response.audio_transcript.delta":
+            sink(event.get("transcript", ""))
+        elif et == "response.audio.delta":
+            b64 = event.get("delta")
+            if b64:
+                sink(base64.b64decode(b64))
+        elif et in ("response.audio_transcript.done", "response.text.done"):
+            sink(event.get("transcript") or event.get("text") or "")
+        elif et == "response.done":
+            sink(event.get("response", {}).get("usage", {}))
+
+
+class _Replayed(Exception):
+    """回放完毕，结束 _read_events。"""
+
+
+class ReplayWS:
+    """假的上游连接：recv() 依次返回录好的原始帧（不经过事件循环调度），放完抛 _Replayed。"""
+
+    def __init__(self, messages):
+        self._it = iter(messages)
+
+    async def recv(self, decode=None):
+        for message in self._it:
+            return message
+        raise _Replayed
+
+
+def client(messages, sink):
+    c = LiveTranslateClient("bench", audio_enabled=False)
+    c.on_audio(sink)
+    c.ws = ReplayWS(messages)
+    # 结句/用量的 print 也是真实路径的一部分，照跑，只是不刷屏
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.suppress(_Replayed):
+        asyncio.run(c._read_events(sink, sink))
+
+
+def bench(fn, messages, repeat: int) -> float:
+    sink = lambda x: None
+    t0 = time.process_time()
+    for _ in range(repeat):
+        fn(messages, sink)
+    return (time.process_time() - t0) / repeat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", help="录制的事件 JSONL（每行一条原始消息）")
+    ap.add_argument("--seconds", type=float, default=60.0, help="合成事件流的时长")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.events:
+        with open(args.events, "rb") as f:
+            messages = [line.rstrip(b"\r\n") for line in f if line.strip()]
+        audio_s = None
+    else:
+        messages = synth_events(args.seconds)
+        audio_s = args.seconds
+
+    total = sum(len(m) for m in messages)
+    print(f"{len(messages)} events, {total / 1e6:.1f} MB, JSON backend for non-audio events: {JSON_BACKEND}")
+    old = bench(legacy, messages, args.repeat)
+    new = bench(client, messages, args.repeat)
+    for label, cpu in (("legacy", old), ("client", new)):
+        line = f"  {label:<7} {cpu * 1000:8.2f} ms CPU  {len(messages) / cpu:>10,.0f} events/s  {total / cpu / 1e6:7.0f} MB/s"
+        if audio_s:
+            line += f"  {cpu * 1000 / audio_s:6.3f} ms CPU / TTS audio-s"
+        print(line)
+    print(f"  speedup {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench_resample.py — 重采样 CPU 开销对比（每秒音频耗费的 CPU 毫秒）
+# 用法：python bench_resample.py [--seconds 60]
+#
+# 对比对象：
+#   audioop-reset : 原采集循环的做法，每 100ms 一块、state 传 None
+#   audioop       : 同样的 audioop.ratecv，但 state 跨块保留
+#   polyphase     : resampler.PolyphaseResampler（NumPy 向量化）
+#   linear        : resampler.LinearResampler（纯 Python 兜底）
+
+import argparse
+import math
+import time
+from array import array
+
+from resampler import audioop, np, make_resampler
+
+CASES = [(44100, 16000), (48000, 16000), (24000, 44100), (24000, 48000)]
+
+
+def synth(rate: int, seconds: float) -> bytes:
+    """两路正弦叠加的测试信号。"""
+    n = int(rate * seconds)
+    pcm = array("h", (
+        int(6000 * math.sin(2 * math.pi * 440 * i / rate) + 3000 * math.sin(2 * math.pi * 1870 * i / rate))
+        for i in range(n)
+    ))
+    return pcm.tobytes()
+
+
+def chunks(pcm: bytes, rate: int, chunk_ms: int = 100):
+    step = rate * chunk_ms // 1000 * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+
+def run(label: str, fn, blocks, seconds: float):
+    t0 = time.process_time()
+    for b in blocks:
+        fn(b)
+    cpu = time.process_time() - t0
+    print(f"  {label:<14} {cpu * 1000 / seconds:8.3f} ms CPU / audio-s   ({seconds / max(cpu, 1e-9):8.0f}x realtime)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=30.0)
+    args = ap.parse_args()
+
+    for src, dst in CASES:
+        print(f"{src} -> {dst}")
+        blocks = chunks(synth(src, args.seconds), src)
+        if audioop is not None:
+            run("audioop-reset", lambda b: audioop.ratecv(b, 2, 1, src, dst, None), blocks, args.seconds)
+            run("audioop", make_resampler(src, dst, "audioop").process, blocks, args.seconds)
+        if np is not None:
+            run("polyphase", make_resampler(src, dst, "polyphase").process, blocks, args.seconds)
+        run("linear", make_resampler(src, dst, "linear").process, blocks, args.seconds)
+        print()
+
+
+if __name__ == "__main__":
+    main()
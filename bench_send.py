@@ -0,0 +1,59 @@
+# bench_send.py — 上行发送路径微基准（每核每秒可编码的帧数）
+# 用法：python bench_send.py [--seconds 2]
+#
+# 对比对象：
+#   legacy : 原 send_audio_chunk 的做法（dict + base64.b64encode().decode() + json.dumps + 毫秒 event_id）
+#   fast   : wire_codec.AudioAppendEncoder（预拼 JSON 外壳 + b2a_base64 + 自增 event_id）
+# 只测编码，不含网络；不同帧长下的每帧固定开销差异一目了然。
+
+import argparse
+import base64
+import json
+import os
+import time
+
+from wire_codec import AudioAppendEncoder
+
+RATE = 16000
+
+
+def legacy_encode(audio_data: bytes) -> str:
+    event = {
+        "event_id": f"event_{int(time.time() * 1000)}",
+        "type": "input_audio_buffer.append",
+        "audio": base64.b64encode(audio_data).decode(),
+    }
+    return json.dumps(event)
+
+
+def measure(fn, frame: bytes, seconds: float) -> float:
+    n = 0
+    t0 = time.process_time()
+    deadline = t0 + seconds
+    while True:
+        for _ in range(200):
+            fn(frame)
+        n += 200
+        now = time.process_time()
+        if now >= deadline:
+            return n / (now - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=2.0)
+    args = ap.parse_args()
+
+    enc = AudioAppendEncoder()
+    assert json.loads(enc.encode(b"\x01\x02"))["audio"] == base64.b64encode(b"\x01\x02").decode()
+
+    print(f"{'frame':>7} {'legacy fps':>12} {'fast fps':>12} {'speedup':>8} {'fast audio-s/s':>15}")
+    for frame_ms in (20, 50, 100, 200):
+        frame = os.urandom(RATE * frame_ms // 1000 * 2)
+        old = measure(legacy_encode, frame, args.seconds)
+        new = measure(enc.encode, frame, args.seconds)
+        print(f"{frame_ms:>5}ms {old:>12,.0f} {new:>12,.0f} {new / old:>7.2f}x {new * frame_ms / 1000:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
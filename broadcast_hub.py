@@ -0,0 +1,139 @@
+# broadcast_hub.py
+# -*- coding: utf-8 -*-
+# 会话广播：一人讲、多人听。每条转写事件只序列化一次、每块译音只解码一次，按引用分发给所有收听方；
+# 每个收听方一条有界队列，慢的收听方只丢自己的数据，不拖慢会话、内存有上限
+
+import asyncio
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class Subscriber:
+    """
+    一个收听方的发送队列，文本与译音分开限额：
+    - 文本（JSON 字符串）：积压超过 max_text 条时整体丢弃，改为下次先发一次快照（只丢中间几条会让前端拼错句子）；
+    - 译音（PCM 块）：积压超过 max_audio_bytes 时丢最旧的块（听众宁可跳过一段，也不要越听越落后）。
+    """
+
+    def __init__(self, lane: Optional[str], audio: bool = True, max_text: int = 512, max_audio_bytes: int = 96000):
+        self.lane = lane
+        self.audio = audio
+        self.max_text = max_text
+        self.max_audio_bytes = max_audio_bytes
+        self.text: "deque[str]" = deque()
+        self.pcm: "deque[bytes]" = deque()
+        self.pcm_bytes = 0
+        self.resync = False
+        self.closed = False
+        self.dropped_text = 0
+        self.dropped_audio_bytes = 0
+        self._wake = asyncio.Event()
+
+    def push_text(self, msg: str):
+        if self.resync:
+            self.dropped_text += 1  # 已经要发快照了，快照里会包含这条
+        elif len(self.text) >= self.max_text:
+            self.dropped_text += len(self.text) + 1
+            self.text.clear()
+            self.resync = True
+        else:
+            self.text.append(msg)
+        self._wake.set()
+
+    def push_audio(self, pcm: bytes):
+        if not self.audio:
+            return
+        self.pcm.append(pcm)
+        self.pcm_bytes += len(pcm)
+        while self.pcm_bytes > self.max_audio_bytes and len(self.pcm) > 1:
+            old = self.pcm.popleft()
+            self.pcm_bytes -= len(old)
+            self.dropped_audio_bytes += len(old)
+        self._wake.set()
+
+    def close(self):
+        self.closed = True
+        self._wake.set()
+
+    async def next(self) -> Optional[Tuple[bool, List[str], List[bytes]]]:
+        """等到有数据，一次取走全部积压：(是否需先发快照, 文本, 译音)。已关闭时返回 None。"""
+        while not (self.text or self.pcm or self.resync or self.closed):
+            self._wake.clear()
+            await self._wake.wait()
+        if self.closed:
+            return None
+        resync, self.resync = self.resync, False
+        text, self.text = list(self.text), deque()
+        pcm, self.pcm = list(self.pcm), deque()
+        self.pcm_bytes = 0
+        return resync, text, pcm
+
+
+class BroadcastHub:
+    """
+    一个会话的收听方登记表，按语言（主语言为 None）分组。
+    publish_*() 在事件循环内同步调用（转写回调、TTS 回调），只做入队，不做任何 I/O；
+    没有收听方的语言直接跳过，不产生序列化开销。
+    """
+
+    def __init__(self, max_text: int = 512, max_audio_ms: int = 2000, audio_rate: int = 24000):
+        self.max_text = max_text
+        self.max_audio_bytes = audio_rate * max_audio_ms // 1000 * 2
+        self._subs: Dict[Optional[str], Set[Subscriber]] = {}
+        self.closed = False
+        self.total = 0
+        self._dropped_text = 0          # 已离开的收听方累计的丢弃量
+        self._dropped_audio_bytes = 0
+
+    def subscribe(self, lane: Optional[str], audio: bool = True) -> Subscriber:
+        sub = Subscriber(lane, audio=audio, max_text=self.max_text, max_audio_bytes=self.max_audio_bytes)
+        if self.closed:
+            sub.close()
+            return sub
+        self._subs.setdefault(lane, set()).add(sub)
+        self.total += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        subs = self._subs.get(sub.lane)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subs[sub.lane]
+        self._dropped_text += sub.dropped_text
+        self._dropped_audio_bytes += sub.dropped_audio_bytes
+        sub.close()
+
+    def lanes(self) -> List[Optional[str]]:
+        """当前有收听方的语言。"""
+        return list(self._subs)
+
+    def publish_text(self, lane: Optional[str], msg: str):
+        for sub in self._subs.get(lane, ()):
+            sub.push_text(msg)
+
+    def publish_audio(self, lane: Optional[str], pcm: bytes):
+        for sub in self._subs.get(lane, ()):
+            sub.push_audio(pcm)
+
+    def close(self):
+        """会话被清理：关闭所有收听方，它们的发送循环随之结束。"""
+        self.closed = True
+        for subs in list(self._subs.values()):
+            for sub in list(subs):
+                self.unsubscribe(sub)
+
+    @property
+    def listeners(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    def stats(self) -> dict:
+        subs = [s for group in self._subs.values() for s in group]
+        return {
+            "listeners": len(subs),
+            "by_lang": {lane or "": len(group) for lane, group in self._subs.items()},
+            "total": self.total,
+            "dropped_text": self._dropped_text + sum(s.dropped_text for s in subs),
+            "dropped_audio_bytes": self._dropped_audio_bytes + sum(s.dropped_audio_bytes for s in subs),
+        }
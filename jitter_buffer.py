@@ -0,0 +1,198 @@
+# jitter_buffer.py
+# -*- coding: utf-8 -*-
+# TTS 播放的有界自适应抖动缓冲：限制“说话人 → 译音播出”的延迟上限，内存也随之有界
+
+import threading
+from collections import deque
+
+from vad import pcm16_rms
+
+
+class JitterBuffer:
+    """
+    生产者（收消息的事件循环）put() PCM16，消费者（播放线程/回调）read() 取数据。
+    - target_ms：期望的最大积压；超过后进入追赶：新到音频里的静音片段（slice_ms 粒度）直接丢掉，
+      相当于在停顿处做时间压缩，听感上几乎无损；
+    - max_ms   ：硬上限；仍超过时从最旧的音频开始丢，直到回到 target_ms；
+    - prime_ms ：从空缓冲起播前至少攒这么多，避免刚开口就断续。
+    统计：fill_ms（当前积压）、late（播放时数据没到、只能等/补静音的次数）、dropped_ms、compressed_ms。
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: int = 24000,
+        sample_width: int = 2,
+        target_ms: int = 300,
+        max_ms: int = 1500,
+        prime_ms: int = 60,
+        slice_ms: int = 10,
+        silence_rms: int = 300,
+    ):
+        self.rate = rate
+        self.sample_width = sample_width
+        self._bytes_per_ms = rate * sample_width / 1000
+        self.target_bytes = self._align(target_ms * self._bytes_per_ms)
+        self.max_bytes = self._align(max(max_ms, target_ms) * self._bytes_per_ms)
+        self.prime_bytes = self._align(prime_ms * self._bytes_per_ms)
+        self.slice_bytes = max(sample_width, self._align(slice_ms * self._bytes_per_ms))
+        self.silence_rms = silence_rms
+
+        self._chunks: "deque[bytes]" = deque()
+        self._head = 0      # 队首 chunk 已读出的字节数
+        self._size = 0      # 未读字节总数
+        self._primed = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.late = 0
+        self.dropped_bytes = 0
+        self.compressed_bytes = 0
+
+    def _align(self, n: float) -> int:
+        n = int(n)
+        return n - n % self.sample_width
+
+    # --------------------- Producer ---------------------
+
+    def put(self, pcm: bytes):
+        if not pcm:
+            return
+        with self._cond:
+            if self._closed:
+                return
+            if self._size + len(pcm) > self.target_bytes:
+                pcm = self._compress(pcm)
+            if pcm:
+                self._chunks.append(pcm)
+                self._size += len(pcm)
+            if self._size > self.max_bytes:
+                self._drop_oldest(self._size - self.target_bytes)
+            self._cond.notify()
+
+    def _compress(self, pcm: bytes) -> bytes:
+        """落后时丢掉新音频里的静音片段，直到积压回到 target 以内。"""
+        step = self.slice_bytes
+        over = self._size + len(pcm) - self.target_bytes
+        kept = []
+        for i in range(0, len(pcm), step):
+            piece = pcm[i:i + step]
+            if over > 0 and pcm16_rms(piece) < self.silence_rms:
+                over -= len(piece)
+                self.compressed_bytes += len(piece)
+                continue
+            kept.append(piece)
+        return b"".join(kept)
+
+    def _drop_oldest(self, nbytes: int):
+        nbytes = self._align(nbytes)
+        while nbytes > 0 and self._chunks:
+            head = self._chunks[0]
+            left = len(head) - self._head
+            if left <= nbytes:
+                self._chunks.popleft()
+                self._head = 0
+                taken = left
+            else:
+                self._head += nbytes
+                taken = nbytes
+            nbytes -= taken
+            self._size -= taken
+            self.dropped_bytes += taken
+
+    # --------------------- Consumer ---------------------
+
+    def _take(self, n: int) -> bytes:
+        parts = []
+        while n > 0 and self._chunks:
+            head = self._chunks[0]
+            piece = head[self._head:self._head + n]
+            parts.append(piece)
+            n -= len(piece)
+            self._head += len(piece)
+            if self._head >= len(head):
+                self._chunks.popleft()
+                self._head = 0
+        out = b"".join(parts)
+        self._size -= len(out)
+        return out
+
+    def _ready(self, nbytes: int) -> bool:
+        """读之前的起播/欠载判断（持锁调用）：False 表示还没攒够 prime，这次什么也不给。"""
+        if not self._primed and not self._closed:  # 关闭后不再等 prime，把剩余的放完
+            if self._size < min(self.prime_bytes, nbytes):
+                return False
+            self._primed = True
+        if self._size < nbytes:
+            self.late += 1
+            if self._size == 0:
+                self._primed = False  # 断流：下次从头攒够 prime 再播
+        return True
+
+    def read(self, nbytes: int) -> bytes:
+        """非阻塞：最多取 nbytes（不足时返回更短的数据，未起播时返回空）。"""
+        with self._cond:
+            if not self._ready(nbytes):
+                return b""
+            return self._take(self._align(nbytes))
+
+    def read_into(self, out) -> int:
+        """
+        非阻塞，语义同 read()：把最多 len(out) 字节直接拷进调用方预分配的缓冲（bytearray/memoryview），
+        返回写入的字节数。播放回调用它，每块不再拼接、分配中间 bytes。
+        """
+        with self._cond:
+            nbytes = self._align(len(out))
+            if not self._ready(nbytes):
+                return 0
+            pos = 0
+            while pos < nbytes and self._chunks:
+                head = self._chunks[0]
+                n = min(nbytes - pos, len(head) - self._head)
+                out[pos:pos + n] = memoryview(head)[self._head:self._head + n]
+                pos += n
+                self._head += n
+                if self._head >= len(head):
+                    self._chunks.popleft()
+                    self._head = 0
+            self._size -= pos
+            return pos
+
+    def wait_read(self, nbytes: int, timeout: float) -> bytes | None:
+        """
+        阻塞：等到够 nbytes（或超时）再取；超时只返回已有部分。
+        缓冲已关闭且没有剩余数据时返回 None。
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._size >= nbytes, timeout=timeout)
+            if self._closed and self._size == 0:
+                return None
+        return self.read(nbytes)
+
+    def clear(self):
+        with self._cond:
+            self._chunks.clear()
+            self._head = 0
+            self._size = 0
+            self._primed = False
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # --------------------- Stats ---------------------
+
+    @property
+    def fill_ms(self) -> float:
+        return self._size / self._bytes_per_ms
+
+    def stats(self) -> dict:
+        return {
+            "fill_ms": round(self.fill_ms, 1),
+            "target_ms": round(self.target_bytes / self._bytes_per_ms),
+            "max_ms": round(self.max_bytes / self._bytes_per_ms),
+            "late": self.late,
+            "dropped_ms": round(self.dropped_bytes / self._bytes_per_ms),
+            "compressed_ms": round(self.compressed_bytes / self._bytes_per_ms),
+        }
@@ -1,20 +1,73 @@
 # livetranslate_client.py
 # -*- coding: utf-8 -*-
 
+import os
 import time
+import random
 import base64
 import asyncio
 import json
-import queue
-import threading
 import traceback
 import contextlib
-import audioop  # Python 3.11 内置，用于重采样
+from collections import deque
 
-import pyaudio
 from websockets.asyncio.client import connect
 import websockets
 
+from vad import VoiceActivityGate, pcm16_rms
+from resampler import make_resampler
+from audio_capture import CaptureThread
+from wire_codec import AudioAppendEncoder, b64encode_pcm, decode_audio_delta, json_loads
+from jitter_buffer import JitterBuffer
+from audio_io import AudioSource, AudioSink, PyAudioSource, PyAudioSink, PA_INT16
+from uplink_sender import UplinkSender
+from metrics import ClientMetrics
+
+# Realtime WS endpoint（LT_API_URL 可指向本地 mock_realtime.py 做离线压测）
+API_URL = os.getenv("LT_API_URL") or (
+    "wss://dashscope-intl.aliyuncs.com/api-ws/v1/realtime"
+    "?model=qwen3-livetranslate-flash-realtime"
+)
+
+
+def build_session_config(target_language: str, voice: str | None, audio_enabled: bool) -> dict:
+    """session.update 的会话配置：输出类型/音色/目标语言等。"""
+    session = {
+        "modalities": ["text", "audio"] if audio_enabled else ["text"],
+        "input_audio_format": "pcm16",
+        "output_audio_format": "pcm16",
+        "translation": {"language": target_language},
+    }
+    if audio_enabled and voice:
+        session["voice"] = voice
+    return session
+
+
+async def open_upstream(api_key: str, session: dict, api_url: str = API_URL):
+    """建立 WebSocket 连接并发送会话配置，返回已就绪的连接（供直连与连接池共用）。"""
+    headers = [("Authorization", f"Bearer {api_key}")]
+    ws = await connect(api_url, additional_headers=headers)
+    try:
+        event = {
+            "event_id": f"event_{int(time.time() * 1000)}",
+            "type": "session.update",
+            "session": session,
+        }
+        await ws.send(json.dumps(event))
+    except Exception:
+        with contextlib.suppress(Exception):
+            await ws.close()
+        raise
+    return ws
+
+
+def _close_stream(stream):
+    """停流并关闭采集流（阻塞调用，在线程池里执行）。"""
+    with contextlib.suppress(Exception):
+        stream.stop_stream()
+    with contextlib.suppress(Exception):
+        stream.close()
+
 
 class LiveTranslateClient:
     """
@@ -33,9 +86,34 @@ class LiveTranslateClient:
         audio_enabled: bool = True,
         input_device_index: int | None = None,
         output_device_index: int | None = None,   # ★新增：明确指定TTS播放设备
+        source: AudioSource | None = None,        # 采集源；缺省为 input_device_index 对应的 PyAudio 设备
+        sink: AudioSink | None = None,            # 播放端；缺省为 output_device_index 对应的 PyAudio 设备
+        vad_rms_threshold: int | None = None,     # 为 None 时不做静音门控，逐帧全发
+        vad_silence_ms: int = 350,
+        max_utter_ms: int = 7000,
+        pre_roll_ms: int = 200,
+        end_silence_ms: int = 250,
+        pre_connect_buffer_ms: int = 10000,       # 连接建立前/断线重连期间先采集，最多缓存这么多音频
+        reconnect: bool = True,                   # 上行断开后自动重连
+        max_reconnect_attempts: int = 8,
+        reconnect_backoff_s: float = 0.5,         # 首次重试间隔，之后指数退避
+        reconnect_backoff_max_s: float = 15.0,
+        replay_buffer_ms: int = 5000,             # 断线前已发送但尚未出结果的音频，重连后补发
+        frame_ms: int = 100,                      # 每个上行帧的时长（20–200ms）：越短延迟越低、每帧开销占比越高
+        playback_target_ms: int = 300,            # TTS 播放积压目标：超过后在停顿处压缩追赶
+        playback_max_ms: int = 1500,              # TTS 播放积压硬上限：超过后丢最旧的音频
+        playback_block_ms: int = 20,              # 播放回调的块长（5–100ms）：越小输出延迟越低，过小时慢设备易欠载
+        send_queue_ms: int = 3000,                # 上行发送队列上限：上游/网络跟不上时最多积压这么多音频
+        send_drop_policy: str = "drop_oldest",    # 队列满时：drop_oldest 丢最旧（保实时）/ drop_newest 丢新帧
+        max_coalesce_ms: int = 500,               # 拥塞恢复时把积压帧合并成一条 append 的最大时长
+        record_events_path: str | None = None,    # 把收到的原始事件逐行录成 JSONL（供 bench_recv.py 回放）
     ):
         if not api_key:
             raise ValueError("API key cannot be empty.")
+        if not 20 <= frame_ms <= 200:
+            raise ValueError("frame_ms must be within 20–200.")
+        if not 5 <= playback_block_ms <= 100:
+            raise ValueError("playback_block_ms must be within 5–100.")
 
         # 基本配置
         self.api_key = api_key
@@ -43,116 +121,304 @@ class LiveTranslateClient:
         self.audio_enabled = audio_enabled
         self.voice = voice if audio_enabled else "Cherry"
 
-        # Realtime WS endpoint
-        self.api_url = (
-            "wss://dashscope-intl.aliyuncs.com/api-ws/v1/realtime"
-            "?model=qwen3-livetranslate-flash-realtime"
-        )
+        self.api_url = API_URL
 
         # 发送到模型的音频参数（固定 16k/mono/pcm16）
         self.input_rate = 16000
-        self.input_chunk = 1600  # 100ms
-        self.input_format = pyaudio.paInt16
+        self.input_chunk = self.input_rate * frame_ms // 1000  # 默认 1600 = 100ms
+        self.input_format = PA_INT16
         self.input_channels = 1
 
         # 本地播放（可选）
         self.output_rate = 24000
-        self.output_chunk = 2400
-        self.output_format = pyaudio.paInt16
+        self.output_chunk = self.output_rate * playback_block_ms // 1000  # 默认 480 = 20ms
+        self.output_format = PA_INT16
         self.output_channels = 1
 
         # 运行态
         self.is_connected = False
         self.ws = None
-        self.pyaudio_instance = pyaudio.PyAudio()
-        self.audio_playback_queue: "queue.Queue[bytes | None]" = queue.Queue()
-        self.audio_player_thread: threading.Thread | None = None
+        self._encoder = AudioAppendEncoder()  # 上行帧编码（预拼 JSON 外壳 + 单调递增 event_id）
+        # 上行发送队列：采集/推流只入队，后台任务看写缓冲发送，拥塞时合并或丢弃
+        self.uplink = UplinkSender(
+            self, max_queue_ms=send_queue_ms, max_coalesce_ms=max_coalesce_ms, policy=send_drop_policy
+        )
+        # TTS 抖动缓冲：积压有上限，译音与说话人的延迟保持在固定范围内
+        self.playback_buffer = JitterBuffer(
+            rate=self.output_rate,
+            target_ms=playback_target_ms,
+            max_ms=playback_max_ms,
+        )
+        self.player: AudioSink | None = None  # 正在播放的播放端（start_audio_player 后才有）
+
+        # 延迟/流量指标（server.py 会换成按会话登记的实例）
+        self.metrics = ClientMetrics()
+
+        # 下行事件分发：on()/on_audio() 注册的处理器
+        self._handlers: dict[str, list] = {}
+        self._audio_handlers: list = []
+        self._record = open(record_events_path, "ab") if record_events_path else None
 
         self.input_device_index = input_device_index
         self.output_device_index = output_device_index  # ★保存外放设备索引
+        # 采集/播放后端：用到时才构造缺省的 PyAudio 后端，纯文本/远程推流不会加载 PortAudio
+        self.source = source
+        self.sink = sink
+
+        # 静音门控（VAD）：只在设置了阈值时启用
+        self.vad_rms_threshold = vad_rms_threshold
+        self.vad_silence_ms = vad_silence_ms
+        self.max_utter_ms = max_utter_ms
+        self.pre_roll_ms = pre_roll_ms
+        self.end_silence_ms = end_silence_ms
+        self.vad_gate: VoiceActivityGate | None = self._make_vad_gate()
+        self.capture: CaptureThread | None = None  # 采集线程（含 overrun/underrun 统计）
+
+        # 连接建立前的采集缓冲：expect_connection() 后即可开始采集，连上后按序补发
+        self._connect_pending = False
+        self._pre_connect: "deque[bytes]" = deque(
+            maxlen=max(1, pre_connect_buffer_ms * self.input_rate // (1000 * self.input_chunk))
+        )
+
+        # 断线重连：指数退避 + 重放最近已发送的音频
+        self.reconnect = reconnect
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.reconnect_backoff_s = reconnect_backoff_s
+        self.reconnect_backoff_max_s = reconnect_backoff_max_s
+        self.replay_ack_margin_s = 1.5  # 结句时只丢弃早于 (现在 - 该余量) 的音频，留出上游处理延迟
+        self._replay: "deque[tuple[float, bytes]]" = deque(
+            maxlen=max(1, replay_buffer_ms * self.input_rate // (1000 * self.input_chunk))
+        )
+        self._closing = False
+        self.reconnects = 0
+        # 上行音频时间轴：服务端的 audio_start_ms/audio_end_ms 按本连接已发送的音频计，
+        # 记下 (帧末在连接内的毫秒, 采集时刻) 锚点，用 audio_time() 换算回采集时刻
+        self._sent_ms = 0.0
+        self._sent_marks: "deque[tuple[float, float]]" = deque(
+            maxlen=max(1, 120_000 * self.input_rate // (1000 * self.input_chunk))
+        )
+        self.on_connection_state = None  # 可选回调：on_connection_state("reconnecting"|"connected"|"lost")
+
+        # 多目标语言：其他语言的客户端不自己采集，共用本客户端采集/重采样/VAD 后的帧
+        self.followers: list["LiveTranslateClient"] = []
+
+    @property
+    def is_active(self) -> bool:
+        """已连接，或正在建立/恢复连接（采集与播放应继续）。"""
+        return self.is_connected or self._connect_pending
 
     # --------------------- Connection ---------------------
 
-    async def connect(self):
-        """建立 WebSocket 连接并发送会话配置。"""
-        headers = [("Authorization", f"Bearer {self.api_key}")]
+    @property
+    def pool_key(self) -> tuple:
+        """连接池的键：(目标语言, 音色, 输出模态)。"""
+        session = self.session_config()
+        return (self.target_language, session.get("voice"), tuple(session["modalities"]))
+
+    def session_config(self) -> dict:
+        return build_session_config(self.target_language, self.voice, self.audio_enabled)
+
+    def expect_connection(self):
+        """
+        标记“连接即将建立”：此后 start_microphone_streaming 可先于 connect 启动，
+        期间采集的音频进入预连接缓冲，连上后按序补发，不丢开头的话。
+        """
+        self._connect_pending = True
+
+    async def connect(self, ws=None):
+        """
+        建立 WebSocket 连接并发送会话配置。
+        ws：连接池里已连好、已配置的连接，直接接管，省掉握手。
+        """
         try:
-            self.ws = await connect(self.api_url, additional_headers=headers)
+            if ws is None:
+                ws = await open_upstream(self.api_key, self.session_config(), self.api_url)
+                print(f"[WS] Connected: {self.api_url}")
+            else:
+                print(f"[WS] Using pre-warmed connection: {self.pool_key}")
+            self.ws = ws
             self.is_connected = True
-            print(f"[WS] Connected: {self.api_url}")
-            await self.configure_session()
+            self._reset_audio_clock()
         except Exception as e:
             self.is_connected = False
             raise RuntimeError(f"连接失败: {e}") from e
+        finally:
+            self._connect_pending = False
+
+    def _notify_state(self, state: str):
+        if self.on_connection_state:
+            with contextlib.suppress(Exception):
+                self.on_connection_state(state)
+
+    async def _reconnect(self) -> bool:
+        """
+        断线后的重连监督：指数退避重试，成功后重新 session.update（open_upstream 内完成），
+        再把断线前尚未出结果的音频重放一遍。期间采集照常进行，新音频进预连接缓冲，重连后由采集循环补发。
+        """
+        self._connect_pending = True
+        self._notify_state("reconnecting")
+        delay = self.reconnect_backoff_s
+        for attempt in range(1, self.max_reconnect_attempts + 1):
+            if self._closing:
+                break
+            try:
+                ws = await open_upstream(self.api_key, self.session_config(), self.api_url)
+            except Exception as e:
+                print(f"[WS] Reconnect attempt {attempt}/{self.max_reconnect_attempts} failed: {e}")
+                await asyncio.sleep(delay * (0.5 + random.random() / 2))
+                delay = min(delay * 2, self.reconnect_backoff_max_s)
+                continue
+            replay = list(self._replay)
+            self._replay.clear()
+            self._reset_audio_clock()  # 新连接的音频毫秒从 0 起算，重放的帧也算在内
+            try:
+                for sent_at, frame in replay:
+                    await self._send_audio(ws, frame)
+                    self._mark_sent(frame, sent_at)
+            except Exception as e:
+                print(f"[WS] Replay after reconnect failed: {e}")
+                with contextlib.suppress(Exception):
+                    await ws.close()
+                continue
+            self.ws = ws
+            self.is_connected = True
+            self._connect_pending = False
+            self.reconnects += 1
+            print(f"[WS] Reconnected (attempt {attempt}), replayed {len(replay)} frames")
+            self._notify_state("connected")
+            return True
+        self._connect_pending = False
+        self._notify_state("lost")
+        return False
+
+    def _ack_replay(self):
+        """收到结句：较早的音频已经出了结果，不必在重连时重放。"""
+        horizon = time.monotonic() - self.replay_ack_margin_s
+        while self._replay and self._replay[0][0] < horizon:
+            self._replay.popleft()
 
     async def configure_session(self):
         """配置翻译会话：输出类型/音色/目标语言等。"""
-        session = {
-            "modalities": ["text", "audio"] if self.audio_enabled else ["text"],
-            "input_audio_format": "pcm16",
-            "output_audio_format": "pcm16",
-            "translation": {"language": self.target_language},
-        }
-        if self.audio_enabled and self.voice:
-            session["voice"] = self.voice
-
         event = {
-            "event_id": f"event_{int(time.time() * 1000)}",
+            "event_id": self._encoder.next_event_id(),
             "type": "session.update",
-            "session": session,
+            "session": self.session_config(),
         }
         await self.ws.send(json.dumps(event))
 
     # --------------------- Send ---------------------
 
-    async def send_audio_chunk(self, audio_data: bytes):
-        """发送一帧（~100ms）音频到服务端。"""
+    async def _send_audio(self, ws, audio_data: bytes, captured_at: float | None = None, b64: str | None = None):
+        message = self._encoder.encode_b64(b64) if b64 is not None else self._encoder.encode(audio_data)
+        await ws.send(message)
+        self.metrics.frame_sent(len(message), captured_at)
+
+    async def send_audio_chunk(
+        self, audio_data: bytes, captured_at: float | None = None, b64: str | None = None, stamp_bytes: int | None = None
+    ):
+        """
+        发送一帧（frame_ms，默认 100ms）音频到服务端；断线时转入预连接缓冲，等重连后补发。
+        captured_at 对应 audio_data 前 stamp_bytes 字节的末尾（缺省为整段末尾；合并发送时由 UplinkSender 给出）。
+        """
         if not self.is_connected or not self.ws:
+            if self._connect_pending:
+                self._pre_connect.append(audio_data)
             return
-        event = {
-            "event_id": f"event_{int(time.time() * 1000)}",
-            "type": "input_audio_buffer.append",
-            "audio": base64.b64encode(audio_data).decode(),
-        }
-        await self.ws.send(json.dumps(event))
+        try:
+            await self._send_audio(self.ws, audio_data, captured_at, b64)
+        except websockets.exceptions.ConnectionClosed:
+            # 接收侧会发现断线并负责重连；这一帧留给重连后补发
+            if self.reconnect and not self._closing:
+                self._pre_connect.append(audio_data)
+            return
+        self._mark_sent(audio_data, captured_at, stamp_bytes)
+        self._replay.append((time.monotonic(), audio_data))
+
+    def _reset_audio_clock(self):
+        self._sent_ms = 0.0
+        self._sent_marks.clear()
+
+    def _mark_sent(self, audio_data: bytes, captured_at: float | None, stamp_bytes: int | None = None):
+        if captured_at is not None:
+            stamped = len(audio_data) if stamp_bytes is None else stamp_bytes
+            self._sent_marks.append((self._sent_ms + stamped * 500 / self.input_rate, captured_at))
+        self._sent_ms += len(audio_data) * 500 / self.input_rate  # PCM16 mono
+
+    @property
+    def connection_audio_ms(self) -> float:
+        """本连接已发出的音频（毫秒）：服务端 audio_start_ms/audio_end_ms 时间轴上“现在”的位置。"""
+        return self._sent_ms
+
+    @property
+    def pending_audio_ms(self) -> float:
+        """预连接缓冲里还没发出的音频（毫秒），重连后由采集/推流循环补发。"""
+        return sum(len(f) for f in self._pre_connect) * 500 / self.input_rate
+
+    def audio_time(self, ms: float) -> float | None:
+        """
+        把本连接内的音频毫秒（服务端 speech_started/stopped 的 audio_start_ms/audio_end_ms）
+        换算成采集时刻（time.monotonic）；还没发过带采集时刻的帧时返回 None。
+        只有采集帧带锚点：VAD 补发的前置缓冲、预连接缓冲紧挨着后一个锚点，往回推；
+        VAD 关门补的静音紧跟前一个锚点，往后推。中间丢掉的静音因此不会把时间拉偏。
+        """
+        marks = self._sent_marks
+        if not marks:
+            return None
+        prev = nxt = None
+        for mark in reversed(marks):
+            if mark[0] < ms:
+                prev = mark
+                break
+            nxt = mark
+        gate = self.vad_gate
+        tail_ms = len(gate.end_silence) * 500 / self.input_rate if gate is not None and gate.end_silence else 0
+        pos, at = prev if nxt is None or (prev is not None and ms - prev[0] < tail_ms) else nxt
+        return at + (ms - pos) / 1000
+
+    def add_follower(self, client: "LiveTranslateClient"):
+        """
+        让 client（另一目标语言）共用本客户端的采集：start_microphone_streaming 每帧只采集/重采样/
+        base64 编码一次，再分别套上各连接自己的事件外壳发出。client 照常 connect/handle_server_messages。
+        """
+        self.followers.append(client)
 
-    # --------------------- Audio Out (TTS) ---------------------
+    async def feed_frames(self, frames, captured_at: float | None = None, raw=None, b64s=None):
+        """
+        投递一批已处理好的上行帧（不等网络）：未连上时进预连接缓冲，连上后进发送队列，由 UplinkSender 补发缓冲并发送。
+        raw 为本次采到的那一帧（带 captured_at 计延迟），b64s 为与 frames 对应的预编码负载（可缺省）。
+        """
+        if not self.is_connected:
+            # 连接还没就绪/断线中：先缓存（超出上限丢最旧的）；发送队列里没发出去的排在前面
+            if self.uplink.depth:
+                self._pre_connect.extend(self.uplink.take_all())
+            self._pre_connect.extend(frames)
+            return
+        for k, frame in enumerate(frames):
+            self.uplink.push(frame, captured_at if frame is raw else None, b64s[k] if b64s is not None else None)
 
-    def _audio_player_task(self):
-        # 独立线程播放返回的 TTS，定向到“真实扬声器/耳机”
-        with contextlib.suppress(Exception):
-            stream = self.pyaudio_instance.open(
-                format=self.output_format,
-                channels=self.output_channels,
-                rate=self.output_rate,
-                output=True,
-                output_device_index=self.output_device_index,  # ★关键：定向到实体外放
-                frames_per_buffer=self.output_chunk,
-            )
-        try:
-            while self.is_connected or not self.audio_playback_queue.empty():
-                try:
-                    chunk = self.audio_playback_queue.get(timeout=0.1)
-                except queue.Empty:
-                    continue
-                if chunk is None:
-                    break
-                with contextlib.suppress(Exception):
-                    stream.write(chunk)
-                self.audio_playback_queue.task_done()
-        finally:
-            with contextlib.suppress(Exception):
-                stream.stop_stream()
-                stream.close()
+    async def flush_pending(self):
+        """按序补发连接建立前/重连期间缓存的帧（调用方需保证已连接）。"""
+        while self._pre_connect and self.is_connected:
+            n = len(self._pre_connect)
+            await self.send_audio_chunk(self._pre_connect.popleft())
+            if len(self._pre_connect) >= n:
+                break  # 发送失败、帧已放回缓冲：等接收侧重连后再补
+
+    # --------------------- Audio Out (TTS) ---------------------
 
     def start_audio_player(self):
+        """启动播放端（缺省为“真实扬声器/耳机”的回调模式输出流）；TTS 到达前只输出静音。"""
         if not self.audio_enabled:
             return
-        if self.audio_player_thread is None or not self.audio_player_thread.is_alive():
-            self.audio_player_thread = threading.Thread(
-                target=self._audio_player_task, daemon=True
-            )
-            self.audio_player_thread.start()
+        if self.player is not None and self.player.active:
+            return
+        sink = self.sink or PyAudioSink(self.output_device_index)  # ★关键：定向到实体外放
+        try:
+            sink.start(self.playback_buffer, self.output_rate, self.output_channels, self.output_chunk)
+        except Exception as e:
+            print(f"[AUDIO] Output ({sink.name}) failed: {e}")
+            return
+        self.player = sink
 
     # --------------------- Receive ---------------------
 
@@ -161,105 +427,210 @@ class LiveTranslateClient:
         读取服务端事件：文本增量/音频增量/完成通知等。
         on_text_delta: 增量（适合实时刷UI）
         on_text_done : 结句（适合断行/下载脚本）
+        连接意外断开且开启了 reconnect 时，自动重连后继续读取。
         """
-        try:
-            async for message in self.ws:
-                event = json.loads(message)
-                et = event.get("type")
-
-                if et == "error":
-                    print(f"[WS][ERROR EVT] {message}")
-                    continue
-
-                # 增量文本 —— 翻译文本的逐字/逐短语
-                if et == "response.audio_transcript.delta":
-                    text = event.get("transcript", "")
-                    if text and on_text_delta:
-                        on_text_delta(text)
-
-                # 增量音频（TTS）
-                elif et == "response.audio.delta" and self.audio_enabled:
-                    b64 = event.get("delta")
-                    if b64:
-                        self.audio_playback_queue.put(base64.b64decode(b64))
-
-                # 句子完成
-                elif et in ("response.audio_transcript.done", "response.text.done"):
-                    text = event.get("transcript") or event.get("text") or ""
-                    if text:
-                        if on_text_done:
-                            on_text_done(text)
-                        print(f"[TRANS] {text}")
-
-                elif et == "response.done":
-                    usage = event.get("response", {}).get("usage", {})
-                    if usage:
-                        print(f"[USAGE] {json.dumps(usage, ensure_ascii=False)}")
-
-        except websockets.exceptions.ConnectionClosed as e:
-            print(f"[WS] Closed: {e}")
-            self.is_connected = False
-        except Exception as e:
-            print(f"[WS] Error: {e}")
-            traceback.print_exc()
+        while True:
+            try:
+                await self._read_events(on_text_delta, on_text_done)
+                print("[WS] Closed by server.")
+            except websockets.exceptions.ConnectionClosed as e:
+                print(f"[WS] Closed: {e}")
+            except Exception as e:
+                print(f"[WS] Error: {e}")
+                traceback.print_exc()
+                self.is_connected = False
+                return
             self.is_connected = False
+            if self._closing or not self.reconnect or not await self._reconnect():
+                return
 
-    # --------------------- Mic capture ---------------------
-
-    async def start_microphone_streaming(self):
+    def on(self, event_type: str, handler):
         """
-        从指定输入设备采集并推流：
-        - 设备采样率可能是44100/48000，统一重采样为16k再发送。
+        注册服务端事件处理器：handler(event: dict)。同一事件可注册多个，按注册顺序调用。
+        response.audio.delta 走快速路径不会构造 dict，请用 on_audio() 订阅解码后的 PCM。
         """
-        dev_index = self.input_device_index
-        dev_rate = None
+        self._handlers.setdefault(event_type, []).append(handler)
+        return handler
+
+    def on_audio(self, handler):
+        """注册 TTS 音频处理器：handler(pcm: bytes)，24k/mono/PCM16。"""
+        self._audio_handlers.append(handler)
+        return handler
+
+    def _dispatch_table(self, on_text_delta, on_text_done) -> dict:
+        """内置处理器 + on() 注册的处理器，按事件类型建表，避免逐条 if/elif。"""
+        table: dict[str, list] = {}
+
+        def add(et, fn):
+            table.setdefault(et, []).append(fn)
+
+        def on_error(event):
+            print(f"[WS][ERROR EVT] {json.dumps(event, ensure_ascii=False)}")
+
+        # 增量文本 —— 翻译文本的逐字/逐短语
+        def on_transcript_delta(event):
+            self.metrics.transcript_delta()
+            text = event.get("transcript", "")
+            if text and on_text_delta:
+                on_text_delta(text)
+
+        # 句子完成
+        def on_sentence_done(event):
+            self._ack_replay()
+            self.metrics.sentence_done()
+            text = event.get("transcript") or event.get("text") or ""
+            if text:
+                if on_text_done:
+                    on_text_done(text)
+                print(f"[TRANS] {text}")
+
+        def on_response_done(event):
+            self._ack_replay()
+            usage = event.get("response", {}).get("usage", {})
+            if usage:
+                self.metrics.usage(usage)
+                print(f"[USAGE] {json.dumps(usage, ensure_ascii=False)}")
+
+        add("error", on_error)
+        add("response.audio_transcript.delta", on_transcript_delta)
+        add("response.audio_transcript.done", on_sentence_done)
+        add("response.text.done", on_sentence_done)
+        add("response.done", on_response_done)
+        for et, fns in self._handlers.items():
+            for fn in fns:
+                add(et, fn)
+        return table
+
+    def _handle_audio(self, pcm: bytes):
+        # 增量音频（TTS）
+        self.metrics.audio_delta()
+        if self.audio_enabled:
+            self.playback_buffer.put(pcm)
+        for fn in self._audio_handlers:
+            fn(pcm)
+
+    async def _read_events(self, on_text_delta, on_text_done):
+        table = self._dispatch_table(on_text_delta, on_text_done)
+        ws = self.ws
+        record = self._record
+        while True:
+            # decode=False：文本帧也按原始 UTF-8 字节返回，省掉大块 base64 的解码与拷贝
+            message = await ws.recv(decode=False)
+            if isinstance(message, str):
+                message = message.encode("utf-8")
+            self.metrics.bytes_down(len(message))
+            if record is not None:
+                record.write(message + b"\n")
+
+            pcm = decode_audio_delta(message)
+            if pcm is not None:
+                self._handle_audio(pcm)
+                continue
+
+            event = json_loads(message)
+            et = event.get("type")
+            if et == "response.audio.delta":
+                # 快速路径没接住（非紧凑格式）时的兜底
+                b64 = event.get("delta")
+                if b64:
+                    self._handle_audio(base64.b64decode(b64))
+                continue
+            for fn in table.get(et, ()):
+                fn(event)
 
-        if dev_index is not None:
-            with contextlib.suppress(Exception):
-                info = self.pyaudio_instance.get_device_info_by_index(dev_index)
-                dev_rate = int(info.get("defaultSampleRate", 44100))
+    # --------------------- Mic capture ---------------------
 
-        if not dev_rate:
-            dev_rate = 44100
+    def _make_vad_gate(self) -> VoiceActivityGate | None:
+        if not self.vad_rms_threshold:
+            return None
+        return VoiceActivityGate(
+            sample_rate=self.input_rate,
+            frame_ms=self.input_chunk * 1000 // self.input_rate,
+            rms_threshold=self.vad_rms_threshold,
+            silence_ms=self.vad_silence_ms,
+            max_utter_ms=self.max_utter_ms,
+            pre_roll_ms=self.pre_roll_ms,
+            end_silence_ms=self.end_silence_ms,
+        )
 
-        frames_per_buffer_dev = max(1, int(self.input_chunk * dev_rate // self.input_rate))
+    async def ingest_frame(self, raw: bytes, captured_at: float | None = None):
+        """
+        送入一帧已是 16k/mono/PCM16、长度为 input_chunk 的音频：VAD 门控后发给本客户端及各跟随客户端。
+        本机采集与 server.py 的远程推流入口（/translate/ingest）都走这里。
+        """
+        gate = self.vad_gate
+        frames = [raw] if gate is None else gate.process(raw)
+        targets = [self] if not self.followers else [c for c in (self, *self.followers) if c.is_active]
+        if gate is not None:
+            voiced = gate.active
+        else:
+            voiced = pcm16_rms(raw) >= self.metrics.speech_rms if self.followers else None
+        # 多目标时每帧只做一次 base64，各连接只拼 JSON 外壳
+        b64s = [b64encode_pcm(f) for f in frames] if len(targets) > 1 else None
+        for c in targets:
+            c.metrics.frame_captured(raw, voiced=voiced)
+            await c.feed_frames(frames, captured_at, raw, b64s)
 
-        stream = self.pyaudio_instance.open(
-            format=self.input_format,
-            channels=self.input_channels,
-            rate=dev_rate,
-            input=True,
-            input_device_index=dev_index,
-            frames_per_buffer=frames_per_buffer_dev,
-        )
-        print(f"Mic/Virtual Source is ON. DeviceRate={dev_rate} -> SendRate={self.input_rate}")
+    async def start_microphone_streaming(self):
+        """
+        从指定输入设备采集并推流：
+        - 设备采样率可能是44100/48000，统一重采样为16k再发送；
+        - 设置了 vad_rms_threshold 时，静音段在编码前就被丢弃；
+        - 读设备在专用线程里完成，经预分配环形缓冲交给事件循环，每帧唤醒一次；
+        - 发送交给 UplinkSender 的后台任务，上游再慢也不会拖住采集；
+        - 开流/关流（PortAudio 初始化、设备打开）在线程池里做，不卡事件循环上的其他会话。
+        """
+        loop = asyncio.get_running_loop()
+        source = self.source or PyAudioSource(self.input_device_index)
+        stream = await loop.run_in_executor(None, source.open, self.input_chunk * 1000 // self.input_rate)
+        dev_rate = source.rate
+        frames_per_buffer_dev = source.frames_per_buffer
+        # 有状态重采样器：整个采集过程复用同一个，块边界连续
+        resampler = make_resampler(dev_rate, self.input_rate)
+        print(f"Mic/Virtual Source is ON ({source.name}). DeviceRate={dev_rate} -> SendRate={self.input_rate} ({resampler.name})")
+        gate = self.vad_gate
+
+        self.capture = capture = CaptureThread(stream, frames_per_buffer_dev, channels=1, rate=dev_rate)
+        frame_buf = bytearray(capture.frame_bytes)  # 复用的帧缓冲，读帧不再分配
+        capture.start()
 
         try:
-            loop = asyncio.get_event_loop()
-            while self.is_connected:
-                raw = await loop.run_in_executor(None, stream.read, frames_per_buffer_dev)
-                if dev_rate != self.input_rate:
-                    raw, _ = audioop.ratecv(raw, 2, 1, dev_rate, self.input_rate, None)
-                await self.send_audio_chunk(raw)
+            while self.is_active or any(c.is_active for c in self.followers):
+                view = await capture.read_into(frame_buf)
+                if view is None:
+                    print("[CAPTURE] capture thread stopped")
+                    break
+                await self.ingest_frame(resampler.process(view), capture.last_frame_at)
         finally:
+            # 先让采集线程退出（最多阻塞一帧；能被打断的源如 TCP 立即返回），再关流
+            interrupt = getattr(stream, "interrupt", None)
             with contextlib.suppress(Exception):
-                stream.stop_stream()
-                stream.close()
+                await loop.run_in_executor(None, lambda: capture.stop(interrupt=interrupt))
+            await loop.run_in_executor(None, _close_stream, stream)
+            print(f"[CAPTURE] {capture.stats()}")
+            if gate is not None:
+                print(f"[VAD] frames in={gate.frames_in} sent={gate.frames_sent} dropped={gate.frames_dropped}")
 
     # --------------------- Close ---------------------
 
     async def close(self):
         """优雅关闭。"""
+        self._closing = True
         self.is_connected = False
+        self._connect_pending = False
+        self.uplink.close()
         if self.ws:
             with contextlib.suppress(Exception):
                 await self.ws.close()
             print("[WS] Closed.")
-        if self.audio_player_thread:
-            self.audio_playback_queue.put(None)
+        if self.player is not None:
+            self.playback_buffer.close()
+            player, self.player = self.player, None
+            # 放完剩余译音（最多 1s）再关流；等待放在线程池里，不卡事件循环
             with contextlib.suppress(Exception):
-                self.audio_player_thread.join(timeout=1)
-            print("[AUDIO] Player stopped.")
-        with contextlib.suppress(Exception):
-            self.pyaudio_instance.terminate()
-        print("[AUDIO] PyAudio terminated.")
+                await asyncio.get_running_loop().run_in_executor(None, player.stop, 1.0)
+            print(f"[AUDIO] Player stopped. {player.stats()}")
+        if self._record is not None:
+            with contextlib.suppress(Exception):
+                self._record.close()
+            self._record = None
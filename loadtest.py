@@ -0,0 +1,416 @@
+# loadtest.py — 多会话并发压测：N 个会话按实时节奏推合成语音，上游为本地 mock_realtime.py
+# 用法：
+#   python loadtest.py --sessions 50 --duration 60             # 自动拉起 mock + server.py（均为子进程）
+#   python loadtest.py --sessions 200 --ramp-s 30 --server ws://127.0.0.1:8000 --json result.json
+#   python loadtest.py --mode client --sessions 200 --url ws://127.0.0.1:8765   # 只测客户端部分
+#
+# --mode server（默认）：压的是实际运行的服务。每个会话是 /translate/ingest 的一条推流连接，走线上同一条路径：
+#   SessionManager → VAD → 上行队列（UplinkSender）→ 上游 → 转写/BroadcastHub → 推流方收到的 JSON 事件与译音。
+#   延迟从推流方视角计（本端说话开始 → 首条 delta / 首块译音 / done）；CPU、内存另报 server 进程的。
+#   capture→send 发生在服务内部，看 server 的 /metrics（livetranslate_capture_to_send_seconds）。
+# --mode client：N 个 LiveTranslateClient 在本进程直连 mock，只测客户端部分（推流 + 收事件 + 抖动缓冲 + 模拟播放），
+#   不经过 server.py / SessionManager / BroadcastHub / UplinkSender，不代表服务整体的并发能力。
+# 周期性输出：在线会话数、上/下行吞吐、延迟分位数、CPU、内存；
+# 调大 --sessions，看 first_text 的 p95 何时开始上涨（client 模式另看 capture→send p99 何时超过一帧），即为该机器的上限。
+
+import os
+import sys
+import json
+import math
+import time
+import socket
+import asyncio
+import argparse
+import contextlib
+import subprocess
+from array import array
+
+from websockets.asyncio.client import connect
+
+from livetranslate_client import LiveTranslateClient
+from metrics import ClientMetrics, Histogram, METRIC_DEFS
+from wire_codec import json_loads
+
+RATE = 16000
+
+
+def log(msg: str):
+    print(msg, file=sys.__stdout__, flush=True)  # 客户端自身的打印在压测时被静音，报告走原始 stdout
+
+
+# --------------------- Synthetic speech ---------------------
+
+def synth_cycle(frame_ms: int, talk_ms: int = 2400, pause_ms: int = 600) -> list:
+    """一轮“说话 + 停顿”的 PCM16 帧：调幅的谐波（RMS 约 3000）+ 静音。所有会话共用，按不同相位起播。"""
+    n_talk = RATE * talk_ms // 1000
+    samples = array("h", bytes(2 * RATE * (talk_ms + pause_ms) // 1000))
+    for i in range(n_talk):
+        t = i / RATE
+        env = 0.6 + 0.4 * math.sin(2 * math.pi * 3 * t)
+        v = env * (math.sin(2 * math.pi * 180 * t) + 0.5 * math.sin(2 * math.pi * 360 * t))
+        samples[i] = int(3500 * v)
+    pcm = samples.tobytes()
+    step = RATE * frame_ms // 1000 * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+
+# --------------------- Resource usage ---------------------
+
+def rss_mb() -> float | None:
+    with contextlib.suppress(Exception):
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    with contextlib.suppress(Exception):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux 为 KB；这是峰值
+    return None
+
+
+def proc_usage(pid: int) -> tuple:
+    """子进程（server.py）的 (累计 CPU 秒, RSS MB)；取不到为 None。"""
+    with contextlib.suppress(Exception):
+        import psutil
+        p = psutil.Process(pid)
+        t = p.cpu_times()
+        return t.user + t.system, p.memory_info().rss / 1e6
+    with contextlib.suppress(Exception):
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        tick = os.sysconf("SC_CLK_TCK")
+        return (int(fields[11]) + int(fields[12])) / tick, int(fields[21]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    return None, None
+
+
+# --------------------- Session ---------------------
+
+class LoadSession:
+    def __init__(self, idx: int, args, frames: list):
+        self.idx = idx
+        self.args = args
+        self.frames = frames
+        self.client: LiveTranslateClient | None = None
+        self.metrics = ClientMetrics(session=str(idx))
+        self.connected = False
+        self.error: str | None = None
+
+    async def _consume_playback(self, client: LiveTranslateClient):
+        """模拟播放线程：按输出块的实时节奏从抖动缓冲取数。"""
+        nbytes = client.output_chunk * 2
+        period = client.output_chunk / client.output_rate
+        while client.is_active:
+            client.playback_buffer.read(nbytes)
+            await asyncio.sleep(period)
+
+    async def run(self, stop: asyncio.Event):
+        args = self.args
+        client = self.client = LiveTranslateClient(
+            "loadtest", target_language="en", voice="Cherry", audio_enabled=not args.text_only,
+            frame_ms=args.frame_ms, vad_rms_threshold=args.vad_rms or None, reconnect=False,
+        )
+        client.api_url = args.url
+        client.metrics = self.metrics
+        gate = client._make_vad_gate()
+        tasks = []
+        try:
+            await client.connect()
+            self.connected = True
+            tasks.append(asyncio.create_task(client.handle_server_messages()))
+            tasks.append(asyncio.create_task(self._consume_playback(client)))
+            frame_s = args.frame_ms / 1000
+            i = self.idx * 7  # 各会话错开相位
+            next_t = time.monotonic()
+            while not stop.is_set() and client.is_connected:
+                frame = self.frames[i % len(self.frames)]
+                i += 1
+                out = [frame] if gate is None else gate.process(frame)
+                self.metrics.frame_captured(frame, voiced=gate.active if gate is not None else None)
+                for f in out:
+                    # captured_at = 这帧按实时节奏“应当被采到”的时刻：capture→send 即调度落后量
+                    await client.send_audio_chunk(f, next_t if f is frame else None)
+                next_t += frame_s
+                delay = next_t - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.connected = False
+            await client.close()
+            for t in tasks:
+                t.cancel()
+            for t in tasks:
+                with contextlib.suppress(BaseException):
+                    await t
+
+
+class IngestSession:
+    """
+    经 server.py 的 /translate/ingest 跑一个会话：按实时节奏推 PCM，收会话广播的下行（JSON 事件 + 译音二进制）。
+    指标沿用 ClientMetrics 的钩子，只是从推流方这一端喂：说话开始 = 本端推出首个有声帧的时刻。
+    """
+
+    def __init__(self, idx: int, args, frames: list):
+        self.idx = idx
+        self.args = args
+        self.frames = frames
+        self.client = None  # 客户端在 server 进程里
+        self.metrics = ClientMetrics(session=str(idx))
+        self.connected = False
+        self.error: str | None = None
+
+    async def _recv(self, ws):
+        m = self.metrics
+        async for msg in ws:
+            m.bytes_down(len(msg))
+            if isinstance(msg, bytes):
+                m.audio_delta()
+                continue
+            event = json_loads(msg)
+            if event.get("side") != "dst":
+                continue
+            if event.get("type") == "delta":
+                m.transcript_delta()
+            elif event.get("type") == "done":
+                m.sentence_done()
+
+    async def run(self, stop: asyncio.Event):
+        args = self.args
+        url = (f"{args.server}/translate/ingest?session_id=load{self.idx}&target=en&rate={RATE}&channels=1"
+               f"&tts={'false' if args.text_only else 'true'}")
+        try:
+            async with connect(url, max_size=None, compression=None) as ws:
+                ready = json_loads(await ws.recv())
+                if ready.get("type") != "ready":
+                    raise RuntimeError(ready.get("message") or str(ready))
+                self.connected = True
+                recv = asyncio.create_task(self._recv(ws))
+                try:
+                    frame_s = args.frame_ms / 1000
+                    i = self.idx * 7  # 各会话错开相位
+                    next_t = time.monotonic()
+                    while not stop.is_set() and not recv.done():
+                        frame = self.frames[i % len(self.frames)]
+                        i += 1
+                        self.metrics.frame_captured(frame, now=next_t)
+                        await ws.send(frame)
+                        self.metrics.frame_sent(len(frame))
+                        next_t += frame_s
+                        delay = next_t - time.monotonic()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    with contextlib.suppress(Exception):
+                        await ws.send(json.dumps({"type": "stop"}))
+                finally:
+                    recv.cancel()
+                    with contextlib.suppress(BaseException):
+                        await recv
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.connected = False
+
+
+# --------------------- Report ---------------------
+
+def aggregate(sessions: list) -> dict:
+    hists = {name: Histogram(buckets) for name, kind, _, buckets in METRIC_DEFS if kind == "histogram"}
+    counters = {"frames_sent_total": 0, "bytes_up_total": 0, "bytes_down_total": 0, "sentences_total": 0}
+    late = dropped = 0
+    for s in sessions:
+        for name, h in s.metrics.hist.items():
+            hists[name].merge(h)
+        for name in counters:
+            counters[name] += s.metrics.counters[name]
+        if s.client is not None:
+            late += s.client.playback_buffer.late
+            dropped += s.client.playback_buffer.dropped_bytes
+    return {"hist": hists, "counters": counters, "playback_late": late, "playback_dropped_bytes": dropped}
+
+
+def _q(h: Histogram) -> dict:
+    return {f"p{int(q * 100)}": (round(v * 1000, 1) if (v := h.quantile(q)) is not None else None)
+            for q in (0.5, 0.95, 0.99)}
+
+
+def snapshot(sessions: list, prev: dict | None, dt: float, cpu_dt: float,
+             server_cpu_dt: float | None = None, server_rss: float | None = None) -> dict:
+    agg = aggregate(sessions)
+    c = agg["counters"]
+    p = prev["counters"] if prev else {k: 0 for k in c}
+    return {
+        "sessions": len(sessions),
+        "connected": sum(1 for s in sessions if s.connected),
+        "errors": sum(1 for s in sessions if s.error),
+        "frames_per_s": round((c["frames_sent_total"] - p["frames_sent_total"]) / dt, 1),
+        "up_mbps": round((c["bytes_up_total"] - p["bytes_up_total"]) * 8 / dt / 1e6, 2),
+        "down_mbps": round((c["bytes_down_total"] - p["bytes_down_total"]) * 8 / dt / 1e6, 2),
+        "sentences": c["sentences_total"],
+        "cpu_pct": round(cpu_dt / dt * 100, 1),
+        "rss_mb": round(m, 1) if (m := rss_mb()) is not None else None,
+        "server_cpu_pct": round(server_cpu_dt / dt * 100, 1) if server_cpu_dt is not None else None,
+        "server_rss_mb": round(server_rss, 1) if server_rss is not None else None,
+        "playback_late": agg["playback_late"],
+        "latency_ms": {name.replace("_seconds", ""): _q(h) for name, h in agg["hist"].items()},
+        "counters": c,
+    }
+
+
+def format_line(snap: dict) -> str:
+    lat = snap["latency_ms"]
+    line = (
+        f"[LOAD] sess={snap['connected']}/{snap['sessions']} err={snap['errors']} "
+        f"fps={snap['frames_per_s']} up={snap['up_mbps']}Mb/s down={snap['down_mbps']}Mb/s "
+        f"cpu={snap['cpu_pct']}% rss={snap['rss_mb']}MB "
+    )
+    if snap["server_cpu_pct"] is not None:
+        line += f"server_cpu={snap['server_cpu_pct']}% server_rss={snap['server_rss_mb']}MB "
+    if lat["capture_to_send"]["p99"] is not None:  # server 模式在服务内部，不在这里
+        line += f"cap→send p99={lat['capture_to_send']['p99']}ms "
+    return line + (
+        f"first_text p50/p95={lat['speech_to_first_text']['p50']}/{lat['speech_to_first_text']['p95']}ms "
+        f"first_audio p95={lat['speech_to_first_audio']['p95']}ms late={snap['playback_late']}"
+    )
+
+
+# --------------------- Mock process ---------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_port(proc: subprocess.Popen, port: int, name: str, timeout: float = 10) -> subprocess.Popen:
+    for _ in range(int(timeout * 10)):
+        with contextlib.suppress(OSError):
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc
+        if proc.poll() is not None:
+            break
+        await asyncio.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{name} did not start")
+
+
+async def spawn_mock(args) -> subprocess.Popen:
+    port = _free_port()
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.Popen([
+        sys.executable, os.path.join(here, "mock_realtime.py"), "--port", str(port),
+        "--latency-ms", str(args.latency_ms), "--tts-rate", str(args.tts_rate), "--report-s", "3600",
+    ])
+    args.url = f"ws://127.0.0.1:{port}"
+    return await _wait_port(proc, port, "mock_realtime.py")
+
+
+async def spawn_server(args) -> subprocess.Popen:
+    """以子进程拉起 server.py（上游指向 mock），CPU/内存单独统计，不与压测端混在一起。"""
+    port = _free_port()
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {
+        **os.environ,
+        "LT_API_URL": args.url,
+        "DASHSCOPE_API_KEY": os.getenv("DASHSCOPE_API_KEY") or "loadtest",
+        "LT_MAX_SESSIONS": str(args.sessions + 8),
+        "LT_TRANSCRIPT_DIR": "",  # 压测不落盘
+        "LT_FRAME_MS": str(args.frame_ms),
+        "LT_VAD_RMS_THRESHOLD": str(args.vad_rms),
+    }
+    out = None if args.verbose else subprocess.DEVNULL
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=here, env=env, stdout=out, stderr=out,
+    )
+    args.server = f"ws://127.0.0.1:{port}"
+    return await _wait_port(proc, port, "server.py", timeout=30)
+
+
+# --------------------- Main ---------------------
+
+async def run(args) -> dict:
+    via_server = args.mode == "server"
+    mock = await spawn_mock(args) if not args.url and not (via_server and args.server) else None
+    server = await spawn_server(args) if via_server and not args.server else None
+    target = args.server if via_server else args.url
+    log(f"[LOAD] {args.mode} mode, target {target}, {args.sessions} sessions, "
+        f"ramp {args.ramp_s}s, duration {args.duration}s")
+    frames = synth_cycle(args.frame_ms)
+    stop = asyncio.Event()
+    session_cls = IngestSession if via_server else LoadSession
+    sessions = [session_cls(i, args, frames) for i in range(args.sessions)]
+    started: list = []
+    tasks: list = []
+
+    async def ramp():
+        for s in sessions:
+            started.append(s)
+            tasks.append(asyncio.create_task(s.run(stop)))
+            await asyncio.sleep(args.ramp_s / max(1, args.sessions))
+
+    ramp_task = asyncio.create_task(ramp())
+    t_start = time.monotonic()
+    t_last, cpu_last, prev = t_start, time.process_time(), None
+    srv_cpu0 = srv_cpu_last = proc_usage(server.pid)[0] if server else None
+    history = []
+    try:
+        while time.monotonic() - t_start < args.ramp_s + args.duration:
+            await asyncio.sleep(args.report_s)
+            now, cpu = time.monotonic(), time.process_time()
+            srv_cpu, srv_rss = proc_usage(server.pid) if server else (None, None)
+            srv_dt = srv_cpu - srv_cpu_last if srv_cpu is not None and srv_cpu_last is not None else None
+            snap = snapshot(started, prev, now - t_last, cpu - cpu_last, srv_dt, srv_rss)
+            log(format_line(snap))
+            history.append({"t": round(now - t_start, 1), **{k: v for k, v in snap.items() if k != "counters"}})
+            t_last, cpu_last, prev, srv_cpu_last = now, cpu, snap, srv_cpu
+    finally:
+        stop.set()
+        ramp_task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        srv_cpu, srv_rss = proc_usage(server.pid) if server else (None, None)
+        for proc in (server, mock):
+            if proc is None:
+                continue
+            proc.terminate()
+            with contextlib.suppress(Exception):
+                proc.wait(timeout=5)
+
+    srv_dt = srv_cpu - srv_cpu0 if srv_cpu is not None and srv_cpu0 is not None else None
+    final = snapshot(started, None, time.monotonic() - t_start, time.process_time(), srv_dt, srv_rss)
+    errors = sorted({s.error for s in sessions if s.error})
+    log(f"[LOAD] total: sentences={final['sentences']} errors={final['errors']} "
+        f"latency_ms={json.dumps(final['latency_ms'])}")
+    for e in errors[:5]:
+        log(f"[LOAD] error: {e}")
+    return {"args": vars(args), "final": final, "history": history}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="多会话并发压测（配合 mock_realtime.py）")
+    ap.add_argument("--mode", choices=("server", "client"), default="server",
+                    help="server：经 server.py 的 /translate/ingest 压整个服务；client：只压 LiveTranslateClient")
+    ap.add_argument("--server", help="server 模式下已在运行的服务地址（如 ws://127.0.0.1:8000）；不给则自动拉起")
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--duration", type=float, default=60, help="全部会话启动后持续的秒数")
+    ap.add_argument("--ramp-s", type=float, default=10, help="在多少秒内逐个启动会话")
+    ap.add_argument("--url", help="已在运行的 mock 地址；不给则自动拉起 mock_realtime.py（--server 时由该服务自己连上游）")
+    ap.add_argument("--latency-ms", type=float, default=400, help="自动拉起 mock 时的回复延迟")
+    ap.add_argument("--tts-rate", type=int, default=24000, help="自动拉起 mock 时的 TTS 采样率")
+    ap.add_argument("--frame-ms", type=int, default=100)
+    ap.add_argument("--vad-rms", type=int, default=0, help="VAD 阈值（server 模式设给自动拉起的服务）；0 = 不做门控")
+    ap.add_argument("--text-only", action="store_true", help="只要文本，不要 TTS")
+    ap.add_argument("--report-s", type=float, default=5)
+    ap.add_argument("--json", help="把逐期报告与最终结果写入该文件")
+    ap.add_argument("--verbose", action="store_true", help="保留客户端自身的打印")
+    args = ap.parse_args()
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        result = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
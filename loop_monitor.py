@@ -0,0 +1,176 @@
+# loop_monitor.py
+# -*- coding: utf-8 -*-
+# 事件循环卡顿监测 + 按需剖析：发送、接收、界面轮询共用一个事件循环，任何同步调用卡住它都会拖慢所有会话
+
+import io
+import os
+import sys
+import marshal
+import time
+import asyncio
+import cProfile
+import pstats
+import threading
+import traceback
+from collections import Counter, deque
+from typing import List, Optional
+
+from metrics import Histogram
+
+# 卡顿时长桶（秒）
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LoopMonitor:
+    """
+    两部分配合：
+    - 事件循环里的心跳协程：每 interval 醒一次，醒晚了多少即为这一轮的循环延迟，记入直方图；
+    - 看门狗线程：心跳超过 threshold 没有更新时，抓一次事件循环线程“此刻”的调用栈——也就是卡住循环的那段代码。
+    心跳恢复后把这次卡顿（时长 + 栈）记入最近 keep 条。看门狗只读心跳时间戳，不碰事件循环。
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, keep: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.hist = Histogram(LAG_BUCKETS)
+        self.stalls: "deque[dict]" = deque(maxlen=keep)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._caught: Optional[tuple] = None  # 看门狗抓到的 (心跳时间戳, 栈)
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """在事件循环里调用。"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _tick(self):
+        while True:
+            beat = self._beat
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - beat - self.interval)
+            self._beat = now
+            self.hist.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                caught, self._caught = self._caught, None
+                stack = caught[1] if caught is not None and caught[0] == beat else None
+                self.stall_count += 1
+                self.stalls.append({
+                    "at": time.time() - lag,
+                    "lag_ms": round(lag * 1000, 1),
+                    "stack": stack,  # None：卡顿太短，看门狗没来得及抓
+                })
+                where = stack[-1].strip().splitlines()[0] if stack else "?"
+                print(f"[LOOP] stalled {lag * 1000:.0f}ms at {where}")
+
+    def _watch(self):
+        period = max(0.005, self.threshold / 4)
+        while not self._stop.wait(period):
+            beat = self._beat
+            if time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            if self._caught is not None and self._caught[0] == beat:
+                continue  # 这次卡顿已经抓过了
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._caught = (beat, traceback.format_stack(frame))
+
+    def stats(self) -> dict:
+        q = {f"p{int(p * 100)}": (round(v * 1000, 1) if (v := self.hist.quantile(p)) is not None else None)
+             for p in (0.5, 0.99)}
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": q,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stall_count,
+        }
+
+
+# --------------------- Profiling ---------------------
+
+_profile_lock = threading.Lock()  # cProfile 与采样剖析同一时间只跑一个
+
+
+class ProfilerBusy(RuntimeError):
+    """已有一次剖析在进行。"""
+
+
+async def profile_loop(seconds: float) -> cProfile.Profile:
+    """
+    在事件循环线程上开 cProfile 跑 seconds 秒：期间循环里执行的所有协程与回调（所有会话的收发、接口处理）都会被记录。
+    采集线程与播放回调不在其中，它们用 sample_threads()。
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            prof.disable()
+    finally:
+        _profile_lock.release()
+    return prof
+
+
+def profile_text(prof: cProfile.Profile, sort: str = "cumulative", limit: int = 80) -> str:
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def profile_bytes(prof: cProfile.Profile) -> bytes:
+    """pstats 二进制格式（可用 python -m pstats / snakeviz 打开）。"""
+    prof.create_stats()
+    return marshal.dumps(prof.stats)
+
+
+def _folded(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_threads(seconds: float, hz: int = 100) -> str:
+    """
+    采样剖析：每秒 hz 次抓所有线程的调用栈，输出折叠栈格式（“线程;帧;帧 次数”，可直接喂给 flamegraph.pl / speedscope）。
+    开销与被测代码无关，适合长时间、线上使用。阻塞调用，事件循环里请放进 executor。
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        me = threading.get_ident()
+        counts: Counter = Counter()
+        period = 1.0 / hz
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid != me:
+                    counts[f"{names.get(tid, tid)};{_folded(frame)}"] += 1
+            time.sleep(period)
+    finally:
+        _profile_lock.release()
+    lines: List[str] = [f"{stack} {n}" for stack, n in counts.most_common()]
+    return "\n".join(lines) + "\n"
@@ -5,8 +5,8 @@
 import os
 import asyncio
 import websockets
-import pyaudio
 
+from audio_devices import DEVICES
 from livetranslate_client import LiveTranslateClient
 
 
@@ -23,49 +23,24 @@ def print_banner():
 
 
 def pick_cable_output_index(keywords=("CABLE Output", "VB-Audio", "Virtual Cable")) -> int | None:
-    pa = pyaudio.PyAudio()
-    try:
-        found = None
-        for i in range(pa.get_device_count()):
-            info = pa.get_device_info_by_index(i)
-            if int(info.get("maxInputChannels", 0)) > 0:
-                name = info.get("name", "")
-                if "cable" in name.lower() and "output" in name.lower():
-                    found = i
-                    break
-                if any(k.lower() in name.lower() for k in keywords):
-                    found = i
-        if found is not None:
-            print(f"[PickIn ] {found} {pa.get_device_info_by_index(found).get('name')}")
-        else:
-            print("[PickIn ] 未找到 CABLE Output，请检查虚拟线是否安装/启用")
-        return found
-    finally:
-        pa.terminate()
+    found = DEVICES.find("input", [("cable", "output")], fallback=keywords)
+    if found is not None:
+        print(f"[PickIn ] {found} {DEVICES.info(found).get('name')}")
+    else:
+        print("[PickIn ] 未找到 CABLE Output，请检查虚拟线是否安装/启用")
+    return found
 
 
 def pick_speaker_index(keywords=("Speakers", "Headphones", "Realtek", "耳机", "扬声器")) -> int | None:
     """
     选择一个“真实扬声器/耳机”用于播放 TTS，避免把TTS回灌到虚拟线。
     """
-    pa = pyaudio.PyAudio()
-    try:
-        cand = None
-        for i in range(pa.get_device_count()):
-            info = pa.get_device_info_by_index(i)
-            if int(info.get("maxOutputChannels", 0)) > 0:
-                name = info.get("name", "")
-                if "cable" in name.lower():
-                    continue  # 避免把输出设成虚拟线
-                if any(k.lower() in name.lower() for k in keywords):
-                    cand = i
-                    print(f"[PickOut] {i} {name}")
-                    break
-        if cand is None:
-            print("[PickOut] 未找到明显的实体扬声器，TTS 将走系统默认输出设备")
-        return cand
-    finally:
-        pa.terminate()
+    cand = DEVICES.find("output", keywords, exclude=["cable"])  # 避免把输出设成虚拟线
+    if cand is not None:
+        print(f"[PickOut] {cand} {DEVICES.info(cand).get('name')}")
+    else:
+        print("[PickOut] 未找到明显的实体扬声器，TTS 将走系统默认输出设备")
+    return cand
 
 
 def get_user_config():
@@ -134,8 +109,9 @@ async def main():
         audio_enabled=audio_enabled,
         input_device_index=in_idx,       # 采集 CABLE Output
         output_device_index=out_idx,     # 播放真实扬声器，避免回路
-        # 如需微调可传：vad_rms_threshold=1200, vad_silence_ms=350, max_utter_ms=7000,
-        #               pre_roll_ms=200, end_silence_ms=250
+        # 静音门控：静音段不上传；按需微调
+        vad_rms_threshold=1200, vad_silence_ms=350, max_utter_ms=7000,
+        pre_roll_ms=200, end_silence_ms=250,
     )
 
     def on_text(t: str):
@@ -151,7 +127,7 @@ async def main():
         print("-" * 60 + "\n")
 
         tasks = [
-            asyncio.create_task(client.handle_server_messages(on_text_received=on_text)),
+            asyncio.create_task(client.handle_server_messages(on_text_delta=on_text)),
             asyncio.create_task(client.start_microphone_streaming()),
         ]
         await asyncio.gather(*tasks)
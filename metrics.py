@@ -0,0 +1,211 @@
+# metrics.py
+# -*- coding: utf-8 -*-
+# 轻量指标：按会话的延迟直方图 + 计数器，输出 Prometheus 文本格式（不依赖 prometheus_client）
+
+import time
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from vad import pcm16_rms
+
+PREFIX = "livetranslate_"
+
+# 延迟桶（秒）：采集→发送在毫秒级，端到端在百毫秒到数秒
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+E2E_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0)
+
+# (名称, 类型, 说明, 桶)
+METRIC_DEFS = (
+    ("capture_to_send_seconds", "histogram", "Delay from a frame being captured to its append being sent upstream.", FAST_BUCKETS),
+    ("speech_to_first_text_seconds", "histogram", "Speech onset to first response.audio_transcript.delta.", E2E_BUCKETS),
+    ("speech_to_first_audio_seconds", "histogram", "Speech onset to first TTS audio byte.", E2E_BUCKETS),
+    ("speech_to_sentence_done_seconds", "histogram", "Speech onset to the finished sentence (transcript done).", E2E_BUCKETS),
+    ("frames_sent_total", "counter", "Audio frames sent upstream.", None),
+    ("bytes_up_total", "counter", "Bytes sent upstream (encoded messages).", None),
+    ("bytes_down_total", "counter", "Bytes received from upstream.", None),
+    ("sentences_total", "counter", "Finished sentences.", None),
+    ("usage_tokens_total", "counter", "Token usage reported in response.done, by kind.", None),
+)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一格是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        """累加同一组桶的另一个直方图（汇总多个会话用）。"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶内线性插值估算分位数（与 Prometheus histogram_quantile 相同的近似）。"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        acc, lo = 0, 0.0
+        for i, c in enumerate(self.counts):
+            if i == len(self.buckets):
+                return self.buckets[-1]  # 落在 +Inf 桶：只能报最大的有限边界
+            hi = self.buckets[i]
+            if c and acc + c >= rank:
+                return lo + (hi - lo) * (rank - acc) / c
+            acc += c
+            lo = hi
+        return self.buckets[-1]
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        out, acc = [], 0
+        sep = "," if labels else ""
+        for le, c in zip(self.buckets + (float("inf"),), self.counts):
+            acc += c
+            le_s = "+Inf" if le == float("inf") else repr(le)
+            out.append(f'{name}_bucket{{{labels}{sep}le="{le_s}"}} {acc}')
+        lb = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{lb} {self.sum}")
+        out.append(f"{name}_count{lb} {self.count}")
+        return out
+
+
+def _labels(**kv) -> str:
+    return ",".join(f'{k}="{_escape(str(v))}"' for k, v in kv.items() if v is not None)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class ClientMetrics:
+    """
+    一个会话（一个 LiveTranslateClient）的指标。所有钩子都在事件循环里同步调用，开销是几次加法。
+    “说话开始”取首个能量超过 speech_rms 的帧（启用 VAD 时即开门时刻）；
+    每句结束后清零，下一次有声帧开始新的一轮计时。
+    """
+
+    def __init__(self, session: str = "", speech_rms: int = 500):
+        self.session = session
+        self.speech_rms = speech_rms
+        self.hist: Dict[str, Histogram] = {
+            name: Histogram(buckets) for name, kind, _, buckets in METRIC_DEFS if kind == "histogram"
+        }
+        self.counters: Dict[str, float] = {
+            name: 0 for name, kind, _, _ in METRIC_DEFS if kind == "counter" and name != "usage_tokens_total"
+        }
+        self.tokens: Dict[str, int] = {}
+        self._speech_at: Optional[float] = None
+        self._first_text = False
+        self._first_audio = False
+
+    @property
+    def speech_onset(self) -> Optional[float]:
+        """当前这句话的开始时刻（time.monotonic）；句子结束后为 None。"""
+        return self._speech_at
+
+    # --------------------- Hooks（上行） ---------------------
+
+    def frame_captured(self, pcm, voiced: Optional[bool] = None, now: Optional[float] = None):
+        """每个采集帧调用一次；voiced 为 None 时按能量自行判断。"""
+        if self._speech_at is not None:
+            return
+        if voiced is None:
+            voiced = pcm16_rms(pcm) >= self.speech_rms
+        if voiced:
+            self._speech_at = now if now is not None else time.monotonic()
+            self._first_text = self._first_audio = False
+
+    def frame_sent(self, nbytes: int, captured_at: Optional[float] = None):
+        self.counters["frames_sent_total"] += 1
+        self.counters["bytes_up_total"] += nbytes
+        if captured_at is not None:
+            self.hist["capture_to_send_seconds"].observe(time.monotonic() - captured_at)
+
+    # --------------------- Hooks（下行） ---------------------
+
+    def bytes_down(self, nbytes: int):
+        self.counters["bytes_down_total"] += nbytes
+
+    def transcript_delta(self):
+        if self._speech_at is not None and not self._first_text:
+            self._first_text = True
+            self.hist["speech_to_first_text_seconds"].observe(time.monotonic() - self._speech_at)
+
+    def audio_delta(self):
+        if self._speech_at is not None and not self._first_audio:
+            self._first_audio = True
+            self.hist["speech_to_first_audio_seconds"].observe(time.monotonic() - self._speech_at)
+
+    def sentence_done(self):
+        self.counters["sentences_total"] += 1
+        if self._speech_at is not None:
+            self.hist["speech_to_sentence_done_seconds"].observe(time.monotonic() - self._speech_at)
+        self._speech_at = None
+
+    def usage(self, usage: dict):
+        for k, v in usage.items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                self.tokens[k] = self.tokens.get(k, 0) + v
+
+    # --------------------- Export ---------------------
+
+    def samples(self, name: str, kind: str) -> Iterable[str]:
+        full = PREFIX + name
+        if kind == "histogram":
+            return self.hist[name].samples(full, _labels(session=self.session))
+        if name == "usage_tokens_total":
+            return [f"{full}{{{_labels(session=self.session, kind=k)}}} {v}" for k, v in self.tokens.items()]
+        return [f"{full}{{{_labels(session=self.session)}}} {self.counters[name]}"]
+
+
+class MetricsRegistry:
+    """进程内所有会话的指标；会话清理时一并移除，内存不随历史会话增长。"""
+
+    def __init__(self):
+        self._sessions: Dict[str, ClientMetrics] = {}
+        self._lock = threading.Lock()
+
+    def session(self, session_id: str) -> ClientMetrics:
+        with self._lock:
+            m = self._sessions.get(session_id)
+            if m is None:
+                m = self._sessions[session_id] = ClientMetrics(session_id)
+            return m
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def render(self, extra: Iterable[Tuple[str, str, str, List[Tuple[dict, float]]]] = ()) -> str:
+        """
+        输出 Prometheus 文本格式。extra 追加即时量：(名称, 类型, 说明, [(标签, 值), ...])；
+        类型为 histogram 时第四项直接给一个 Histogram。
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+        lines: List[str] = []
+        for name, kind, help_, _ in METRIC_DEFS:
+            lines.append(f"# HELP {PREFIX}{name} {help_}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for m in sessions:
+                lines.extend(m.samples(name, kind))
+        for name, kind, help_, samples in extra:
+            lines.append(f"# HELP {PREFIX}{name} {help_}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            if isinstance(samples, Histogram):
+                lines.extend(samples.samples(f"{PREFIX}{name}", ""))
+                continue
+            for labels, value in samples:
+                lbl = _labels(**labels)
+                lines.append(f"{PREFIX}{name}{{{lbl}}} {value}" if lbl else f"{PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
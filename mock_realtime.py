@@ -0,0 +1,187 @@
+# mock_realtime.py — 本地替身：模拟 qwen3-livetranslate 实时接口的 WebSocket 服务端（离线压测用，不产生费用）
+# 用法：
+#   python mock_realtime.py --port 8765 --latency-ms 400 --tts-rate 24000
+#   set LT_API_URL=ws://127.0.0.1:8765   # 然后照常运行 server.py / main.py / loadtest.py
+#
+# 行为：
+#   - session.update           -> 记下输出模态，回 session.updated
+#   - input_audio_buffer.append -> 能量 VAD 切句（模拟服务端 VAD）：超过 --vad-rms 开始一句，
+#                                  连续 --silence-ms 静音或句长达到 --utter-ms 结束；
+#                                  对应发 input_audio_buffer.speech_started / speech_stopped（带 audio_start_ms/audio_end_ms）
+#   - 每句在 --latency-ms（± --jitter-ms）后开始回：
+#       response.audio_transcript.delta × --words，夹着 response.audio.delta（--tts-rate 采样率的 PCM16，
+#       总时长 = 句长 × --tts-ratio，按 --tts-speed 倍实时节奏下发），
+#       然后 response.audio_transcript.done、response.done（带 usage）
+# 同一连接内的回复按句排队，不会交叠；事件用紧凑 JSON，与线上格式一致（客户端会走音频快速路径）。
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from binascii import a2b_base64, b2a_base64
+
+from websockets.asyncio.server import serve
+
+from vad import pcm16_rms
+from wire_codec import json_loads
+
+_ids = itertools.count(1)
+
+
+def _dumps(event: dict) -> str:
+    return json.dumps(event, separators=(",", ":"), ensure_ascii=False)
+
+
+class MockSession:
+    """一条连接的状态：收到的音频时长、待回复的句子队列。"""
+
+    def __init__(self, ws, args, stats: dict):
+        self.ws = ws
+        self.args = args
+        self.stats = stats
+        self.audio_enabled = True
+        self.received_ms = 0.0
+        self.utter_start = None
+        self.silent_ms = 0.0
+        self.pending: "asyncio.Queue[tuple[float, float]]" = asyncio.Queue()
+        self._audio_b64 = {}  # TTS 块时长 -> 预先编码好的 base64 负载
+
+    async def send(self, event: dict):
+        event.setdefault("event_id", f"mock_{next(_ids)}")
+        msg = _dumps(event)
+        self.stats["events_out"] += 1
+        self.stats["bytes_out"] += len(msg)
+        await self.ws.send(msg)
+
+    def _tts_chunk(self, ms: int) -> str:
+        b64 = self._audio_b64.get(ms)
+        if b64 is None:
+            pcm = os.urandom(self.args.tts_rate * ms // 1000 * 2)
+            b64 = self._audio_b64[ms] = b2a_base64(pcm, newline=False).decode("ascii")
+        return b64
+
+    # --------------------- Uplink ---------------------
+
+    async def on_append(self, event: dict):
+        pcm = a2b_base64(event.get("audio") or "")
+        ms = len(pcm) / 32  # 16k/mono/PCM16：每毫秒 32 字节
+        voiced = pcm16_rms(pcm) >= self.args.vad_rms
+        if self.utter_start is None:
+            if voiced:
+                self.utter_start = self.received_ms
+                self.silent_ms = 0.0
+                await self.send({"type": "input_audio_buffer.speech_started",
+                                 "audio_start_ms": int(self.received_ms)})
+            self.received_ms += ms
+            return
+        self.received_ms += ms
+        self.silent_ms = 0.0 if voiced else self.silent_ms + ms
+        if self.silent_ms >= self.args.silence_ms or self.received_ms - self.utter_start >= self.args.utter_ms:
+            end_ms = self.received_ms - self.silent_ms
+            await self.send({"type": "input_audio_buffer.speech_stopped", "audio_end_ms": int(end_ms)})
+            self.pending.put_nowait((self.utter_start, end_ms))
+            self.utter_start = None
+
+    async def reader(self):
+        async for message in self.ws:
+            self.stats["events_in"] += 1
+            self.stats["bytes_in"] += len(message)
+            event = json_loads(message)
+            et = event.get("type")
+            if et == "input_audio_buffer.append":
+                await self.on_append(event)
+            elif et == "session.update":
+                session = event.get("session") or {}
+                self.audio_enabled = "audio" in (session.get("modalities") or ["text", "audio"])
+                await self.send({"type": "session.updated", "session": session})
+
+    # --------------------- Downlink ---------------------
+
+    async def responder(self):
+        args = self.args
+        while True:
+            start_ms, end_ms = await self.pending.get()
+            delay = max(0.0, args.latency_ms + random.uniform(-args.jitter_ms, args.jitter_ms)) / 1000
+            await asyncio.sleep(delay)
+            rid = f"resp_{next(_ids)}"
+            tts_ms = int((end_ms - start_ms) * args.tts_ratio) if self.audio_enabled else 0
+            n_chunks = max(1, tts_ms // args.tts_chunk_ms) if tts_ms else 0
+            words = [f"w{i}" for i in range(args.words)]
+            steps = max(len(words), n_chunks)
+            for i in range(steps):
+                if i < len(words):
+                    await self.send({"type": "response.audio_transcript.delta", "response_id": rid,
+                                     "transcript": words[i] + " "})
+                if i < n_chunks:
+                    await self.send({"type": "response.audio.delta", "response_id": rid, "item_id": rid,
+                                     "output_index": 0, "content_index": 0,
+                                     "delta": self._tts_chunk(args.tts_chunk_ms)})
+                    if args.tts_speed > 0:
+                        await asyncio.sleep(args.tts_chunk_ms / 1000 / args.tts_speed)
+            await self.send({"type": "response.audio_transcript.done", "response_id": rid,
+                             "transcript": " ".join(words) + "."})
+            await self.send({"type": "response.done", "response": {
+                "id": rid, "status": "completed",
+                "usage": {"input_tokens": int(end_ms - start_ms) // 40, "output_tokens": args.words},
+            }})
+            self.stats["responses"] += 1
+
+
+async def run(args):
+    stats = {"connections": 0, "active": 0, "events_in": 0, "events_out": 0,
+             "bytes_in": 0, "bytes_out": 0, "responses": 0}
+
+    async def handler(ws):
+        stats["connections"] += 1
+        stats["active"] += 1
+        sess = MockSession(ws, args, stats)
+        responder = asyncio.create_task(sess.responder())
+        try:
+            await sess.reader()
+        except Exception:
+            pass
+        finally:
+            responder.cancel()
+            stats["active"] -= 1
+
+    async with serve(handler, args.host, args.port, max_size=None, compression=None):
+        print(f"[MOCK] listening on ws://{args.host}:{args.port}")
+        t0, last = time.monotonic(), dict(stats)
+        while True:
+            await asyncio.sleep(args.report_s)
+            dt = time.monotonic() - t0
+            t0 = time.monotonic()
+            print(f"[MOCK] active={stats['active']} conns={stats['connections']} "
+                  f"in={(stats['bytes_in'] - last['bytes_in']) / dt / 1e6:.2f}MB/s "
+                  f"out={(stats['bytes_out'] - last['bytes_out']) / dt / 1e6:.2f}MB/s "
+                  f"responses={stats['responses']}")
+            last = dict(stats)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="本地实时同传接口替身")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=400, help="句末到开始回复的延迟")
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--vad-rms", type=int, default=500, help="切句的能量阈值")
+    ap.add_argument("--silence-ms", type=float, default=500, help="连续静音多久算一句结束")
+    ap.add_argument("--utter-ms", type=float, default=8000, help="最长一句，超过强制切句")
+    ap.add_argument("--words", type=int, default=8, help="每句的文本增量条数")
+    ap.add_argument("--tts-rate", type=int, default=24000, help="TTS 采样率（PCM16 单声道，决定下行码率）")
+    ap.add_argument("--tts-ratio", type=float, default=1.0, help="TTS 时长 / 原句时长")
+    ap.add_argument("--tts-chunk-ms", type=int, default=100)
+    ap.add_argument("--tts-speed", type=float, default=2.0, help="TTS 下发节奏（倍实时）；0 = 一次发完")
+    ap.add_argument("--report-s", type=float, default=10)
+    args = ap.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
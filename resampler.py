@@ -0,0 +1,193 @@
+# resampler.py
+# -*- coding: utf-8 -*-
+# 流式重采样（单声道 PCM16）：跨块保持状态，避免每块重置带来的边缘杂音和滤波器重复预热
+
+import math
+from array import array
+from typing import Optional
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+try:
+    import audioop  # Python 3.13 起已移除
+except ImportError:
+    audioop = None
+
+
+class Resampler:
+    """
+    重采样器接口：process() 输入任意长度的 PCM16 字节，返回已可输出的 PCM16 字节；
+    内部保留跨块状态，所以必须按时间顺序喂同一路音频。
+    """
+
+    name = "base"
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+
+    def process(self, pcm: bytes) -> bytes:
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class PassthroughResampler(Resampler):
+    name = "passthrough"
+
+    def process(self, pcm: bytes) -> bytes:
+        # 输入可能是复用的帧缓冲（memoryview），下游会缓存帧，这里必须拷成 bytes；本来就是 bytes 时不拷贝
+        return bytes(pcm)
+
+
+class AudioopResampler(Resampler):
+    """audioop.ratecv，但把 state 留到下一块（原来每块传 None）。"""
+
+    name = "audioop"
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        if audioop is None:
+            raise RuntimeError("audioop is not available on this Python")
+        super().__init__(src_rate, dst_rate)
+        self._state = None
+
+    def process(self, pcm: bytes) -> bytes:
+        out, self._state = audioop.ratecv(pcm, 2, 1, self.src_rate, self.dst_rate, self._state)
+        return out
+
+    def reset(self):
+        self._state = None
+
+
+class LinearResampler(Resampler):
+    """纯 Python 线性插值兜底（没有 numpy 也没有 audioop 时使用），保留小数相位与上一样本。"""
+
+    name = "linear"
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        super().__init__(src_rate, dst_rate)
+        self.reset()
+
+    def reset(self):
+        # 位置用整数表示（单位 1/dst_rate 个输入样本），避免浮点累积误差；-dst_rate 对应 _prev
+        self._pos = 0
+        self._prev = 0
+
+    def process(self, pcm: bytes) -> bytes:
+        x = array("h")
+        x.frombytes(pcm[: len(pcm) // 2 * 2])
+        n = len(x)
+        out = array("h")
+        pos, prev, step, den = self._pos, self._prev, self.src_rate, self.dst_rate
+        end = (n - 1) * den
+        while pos < end:
+            i, rem = divmod(pos, den)
+            a = prev if i < 0 else x[i]
+            b = x[i + 1]
+            out.append(a + ((b - a) * rem + den // 2) // den)
+            pos += step
+        if n:
+            self._prev = x[-1]
+            self._pos = pos - n * den
+        return out.tobytes()
+
+
+class PolyphaseResampler(Resampler):
+    """
+    NumPy 向量化的有理数倍率多相 FIR 重采样（L/M = dst/src 约分后）：
+    Kaiser 窗 sinc 低通，按相位拆成 L 组子滤波器；每块一次性算出全部输出样本，
+    输入历史与小数相位跨块保留，块边界处与整段一次性处理结果一致。
+    """
+
+    name = "polyphase"
+
+    def __init__(self, src_rate: int, dst_rate: int, *, zero_crossings: int = 8, rolloff: float = 0.9, beta: float = 8.0):
+        if np is None:
+            raise RuntimeError("numpy is not installed")
+        super().__init__(src_rate, dst_rate)
+        g = math.gcd(src_rate, dst_rate)
+        self.up = L = dst_rate // g
+        self.down = M = src_rate // g
+
+        n_taps = 2 * zero_crossings * max(L, M) + 1
+        fc = 0.5 * rolloff / max(L, M)  # 以上采样后的采样率为 1
+        k = np.arange(n_taps) - (n_taps - 1) / 2
+        h = 2 * fc * np.sinc(2 * fc * k) * np.kaiser(n_taps, beta)
+        h *= L / h.sum()  # 补偿插零带来的 1/L 增益
+
+        self.taps_per_phase = T = -(-n_taps // L)
+        h = np.concatenate([h, np.zeros(T * L - n_taps)])
+        # 相位 p 的子滤波器为 h[p + i*L]，与 x[j0 - i] 相乘（i = 0..T-1）
+        # 窗口按时间正序排列，所以每个相位的系数反过来存
+        self._bank_rev = h.reshape(T, L).T[:, ::-1].copy()
+        self.reset()
+
+    def reset(self):
+        self._buf = np.zeros(self.taps_per_phase - 1, dtype=np.float64)
+        self._t = (self.taps_per_phase - 1) * self.up  # 下一输出样本在上采样域中的位置（相对 _buf[0]）
+
+    def process(self, pcm: bytes) -> bytes:
+        x = np.frombuffer(pcm[: len(pcm) // 2 * 2], dtype="<i2")
+        if not len(x):
+            return b""
+        buf = np.concatenate([self._buf, x])
+        L, M = self.up, self.down
+        last = (len(buf) - 1) * L  # 最后一个可用输入样本对应的位置
+        if self._t > last:
+            count = 0
+        else:
+            count = (last - self._t) // M + 1
+        if count:
+            # 相位以 L 个输出为周期重复：同一相位的输出在输入上等距（步长 M），
+            # 用滑动窗口视图（不拷贝）取出对应窗口后一次矩阵-向量乘
+            windows = sliding_window_view(buf, self.taps_per_phase)
+            y = np.empty(count)
+            for r in range(min(L, count)):
+                t = self._t + r * M
+                j0, p = divmod(t, L)
+                n = (count - r + L - 1) // L
+                start = j0 - self.taps_per_phase + 1
+                y[r::L] = windows[start:start + (n - 1) * M + 1:M] @ self._bank_rev[p]
+            out = np.clip(np.rint(y), -32768, 32767).astype("<i2").tobytes()
+            self._t += M * count
+        else:
+            out = b""
+        # 只保留下一输出还会用到的历史
+        keep_from = max(0, self._t // L - (self.taps_per_phase - 1))
+        self._buf = buf[keep_from:]
+        self._t -= keep_from * L
+        return out
+
+
+def to_mono(pcm: bytes, channels: int) -> bytes:
+    """交错的多声道 PCM16 转单声道：双声道有 audioop 时取平均，否则取第一声道；单声道原样返回（不拷贝）。"""
+    if channels == 1:
+        return pcm
+    if audioop is not None and channels == 2:
+        return audioop.tomono(pcm, 2, 0.5, 0.5)
+    samples = array("h")
+    samples.frombytes(pcm[: len(pcm) // (2 * channels) * 2 * channels])
+    return samples[0::channels].tobytes()
+
+
+def make_resampler(src_rate: int, dst_rate: int, prefer: Optional[str] = None) -> Resampler:
+    """
+    选择可用的最佳实现：polyphase（有 numpy，且约分后的倍率不太离谱）> audioop（3.12 及以前）> linear。
+    prefer 可强制指定 "polyphase" / "audioop" / "linear"。
+    """
+    if src_rate == dst_rate:
+        return PassthroughResampler(src_rate, dst_rate)
+    impls = {"polyphase": PolyphaseResampler, "audioop": AudioopResampler, "linear": LinearResampler}
+    if prefer:
+        return impls[prefer](src_rate, dst_rate)
+    g = math.gcd(src_rate, dst_rate)
+    if np is not None and max(src_rate, dst_rate) // g <= 1000:
+        return PolyphaseResampler(src_rate, dst_rate)
+    if audioop is not None:
+        return AudioopResampler(src_rate, dst_rate)
+    return LinearResampler(src_rate, dst_rate)
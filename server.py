@@ -1,23 +1,40 @@
 # -*- coding: utf-8 -*-
 # server.py — LiveTranslate Web (稳定版，加入“开始→自动切虚拟麦 / 停止→恢复扬声器、麦克风”)
-import os, asyncio, contextlib, subprocess, tempfile
+import os, time, asyncio, contextlib, subprocess, tempfile, json, functools, hmac
 from typing import Optional, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
-import pyaudio
 import uvicorn
-from fastapi import FastAPI, HTTPException, Body
-from fastapi.responses import HTMLResponse, PlainTextResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Body, Request, WebSocket
+from fastapi.responses import HTMLResponse, PlainTextResponse, JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from livetranslate_client import LiveTranslateClient
+from session_manager import (
+    SessionManager, SessionState, SessionLimitError, SessionBusyError, SessionIdError, lane_view,
+    IDLE, STARTING, STOPPING, FAILED,
+)
+from broadcast_hub import Subscriber
+from upstream_pool import UpstreamPool, parse_pool_keys
+from metrics import REGISTRY
+from audio_devices import DEVICES
+from subtitle_export import EXPORTERS, MEDIA_TYPES, gzip_stream
+from resampler import make_resampler, to_mono
+from loop_monitor import LoopMonitor, ProfilerBusy, profile_loop, profile_text, profile_bytes, sample_threads
+from audio_io import make_source, make_sink
 
 # === [AUDIO AUTO SWITCH] imports & state BEGIN ===
 # 方案B：优先使用你项目中的 coreaudio_switch（纯 comtypes/CoreAudio，不依赖 NirCmd/SVV）
 # 若没有该模块，请把我之前给你的 coreaudio_switch.py 放到同目录；或按需在此文件内嵌。
-from coreaudio_switch import (
-    get_default_playback_id, set_default_playback, find_playback_id_by_substring,
-    get_default_capture_id,  set_default_capture,  find_capture_id_by_substring,
-)
+# 延迟导入：只有本机会话真正要切换默认设备时才加载（comtypes 仅 Windows 可用，Linux/无声卡部署不受影响）
+@functools.lru_cache(maxsize=None)
+def _coreaudio():
+    try:
+        import coreaudio_switch
+    except Exception as e:
+        print(f"[AUDIO] coreaudio_switch 不可用，跳过系统默认设备切换：{e}")
+        return None
+    return coreaudio_switch
 
 # 用一个全局槽位保存“开始时”的默认设备，停止时恢复
 _AUDIO_RESTORE = {
@@ -25,6 +42,7 @@ _AUDIO_RESTORE = {
     "play_name": None,
     "cap_id":  None,  # 默认录音(麦克风) ID
     "cap_name": None,
+    "owed": False,    # 已记下启动前的默认设备、尚未恢复；只在 DEVICE_WORKER 里读写（并发停止时只恢复一次）
 }
 # === [AUDIO AUTO SWITCH] imports & state END ===
 
@@ -41,53 +59,30 @@ app.add_middleware(
 # utils: 设备枚举（与你当前可用逻辑一致）
 # ---------------------------
 def _pyaudio_info(idx: int) -> Optional[dict]:
-    pa = pyaudio.PyAudio()
-    try:
-        return pa.get_device_info_by_index(idx)
-    finally:
-        pa.terminate()
+    return DEVICES.info(idx)
 
 def pick_cable_output_index() -> Optional[int]:
     """找到作为“虚拟麦克风”的 CABLE Output（录音设备）。"""
-    pa = pyaudio.PyAudio()
-    try:
-        found = None
-        for i in range(pa.get_device_count()):
-            info = pa.get_device_info_by_index(i)
-            if int(info.get("maxInputChannels", 0)) > 0:
-                name = (info.get("name") or "").lower()
-                # 兼容不同命名：CABLE Output / CABLE Output 16ch 等
-                if "cable" in name and "output" in name:
-                    found = i
-                    break
-        if found is not None:
-            print(f"[PickIn ] {found} {pa.get_device_info_by_index(found).get('name')}")
-        else:
-            print("[PickIn ] 未找到 CABLE Output，请检查 VB-Audio Virtual Cable 安装/启用")
-        return found
-    finally:
-        pa.terminate()
+    # 兼容不同命名：CABLE Output / CABLE Output 16ch 等
+    found = DEVICES.find("input", [("cable", "output")])
+    if found is not None:
+        print(f"[PickIn ] {found} {DEVICES.info(found).get('name')}")
+    else:
+        print("[PickIn ] 未找到 CABLE Output，请检查 VB-Audio Virtual Cable 安装/启用")
+    return found
 
 def pick_speaker_index() -> Optional[int]:
     """找到看起来像实体扬声器/耳机的播放设备，用于TTS直接播放（避开CABLE）。"""
-    pa = pyaudio.PyAudio()
-    try:
-        cand = None
-        for i in range(pa.get_device_count()):
-            info = pa.get_device_info_by_index(i)
-            if int(info.get("maxOutputChannels", 0)) > 0:
-                name = (info.get("name") or "").lower()
-                if "cable" in name:
-                    continue
-                if any(k in name for k in ["speaker", "扬声器", "headphone", "耳机", "realtek", "bt", "bluetooth"]):
-                    cand = i
-                    print(f"[PickOut] {i} {info.get('name')}")
-                    break
-        if cand is None:
-            print("[PickOut] 未找到明显的实体扬声器，TTS 将走系统默认输出设备")
-        return cand
-    finally:
-        pa.terminate()
+    cand = DEVICES.find(
+        "output",
+        ["speaker", "扬声器", "headphone", "耳机", "realtek", "bt", "bluetooth"],
+        exclude=["cable"],
+    )
+    if cand is not None:
+        print(f"[PickOut] {cand} {DEVICES.info(cand).get('name')}")
+    else:
+        print("[PickOut] 未找到明显的实体扬声器，TTS 将走系统默认输出设备")
+    return cand
 
 def device_name_by_index(idx: Optional[int]) -> Optional[str]:
     if idx is None:
@@ -151,22 +146,39 @@ def switch_default_to_cable_input() -> Optional[str]:
     return None
 
 # ---------------------------
-# Session
+# Sessions
 # ---------------------------
-class SessionState:
-    def __init__(self):
-        self.running: bool = False
-        self.client: Optional[LiveTranslateClient] = None
-        self.worker: Optional[asyncio.Task] = None
-        self.src_buf: List[str] = []
-        self.dst_buf: List[str] = []
-        self.restore_playback_name: Optional[str] = None  # 兼容旧逻辑；当前不再使用
+MANAGER = SessionManager()
+# 事件循环卡顿监测：醒晚超过 LT_LOOP_STALL_MS 记一次卡顿（带卡住时的调用栈）
+LOOP_MONITOR = LoopMonitor(threshold=float(os.getenv("LT_LOOP_STALL_MS", "100")) / 1000)
 
-    def reset(self):
-        self.src_buf.clear()
-        self.dst_buf.clear()
+@app.on_event("startup")
+async def _on_startup():
+    MANAGER.start_reaper()
+    LOOP_MONITOR.start()
+    # 预热上行连接：LT_POOL_KEYS 例如 "en:Cherry,ja:Cherry"；LT_POOL_SIZE=0 关闭
+    api_key = os.getenv("DASHSCOPE_API_KEY", "").strip()
+    if api_key and int(os.getenv("LT_POOL_SIZE", "1")) > 0:
+        MANAGER.pool = UpstreamPool(api_key)
+        MANAGER.pool.warm(parse_pool_keys(os.getenv("LT_POOL_KEYS", "en:Cherry")))
 
-SESS = SessionState()
+@app.on_event("shutdown")
+async def _on_shutdown():
+    LOOP_MONITOR.stop()
+    await MANAGER.shutdown()
+    DEVICE_WORKER.shutdown(wait=False)
+
+def _get_session(session_id: Optional[str]) -> Optional[SessionState]:
+    try:
+        return MANAGER.get(session_id)
+    except SessionIdError as e:
+        raise HTTPException(400, str(e))
+
+def _session_or_404(session_id: Optional[str]) -> SessionState:
+    sess = _get_session(session_id)
+    if sess is None:
+        raise HTTPException(404, "session not found")
+    return sess
 
 # ---------------------------
 # UI（保留你现有的）
@@ -229,16 +241,16 @@ def index():
   <div class="row">
     <div style="flex:1">
       <div class="box" id="srcBox"></div>
-      <div class="footer"><a class="dl" href="/translate/script?type=src" target="_blank">Download source</a></div>
+      <div class="footer"><a class="dl" id="dlSrc" href="/translate/script?type=src" target="_blank">Download source</a></div>
     </div>
     <div style="flex:1">
       <div class="box" id="dstBox"></div>
-      <div class="footer"><a class="dl" href="/translate/script?type=dst" target="_blank">Download translation</a></div>
+      <div class="footer"><a class="dl" id="dlDst" href="/translate/script?type=dst" target="_blank">Download translation</a></div>
     </div>
   </div>
 
 <script>
-let timer=null;
+let es=null, partial={src:null,dst:null}, sid=localStorage.getItem('lt_sid');
 function login(){
   fetch('/auth/login',{method:'POST',headers:{'Content-Type':'application/json'},
     body:JSON.stringify({email:document.getElementById('email').value, password:document.getElementById('pwd').value})
@@ -248,27 +260,86 @@ function start(){
   const target=document.getElementById('target').value;
   const voice=document.getElementById('voice').value;
   fetch('/translate/start',{method:'POST',headers:{'Content-Type':'application/json'},
-    body:JSON.stringify({target,voice})
+    body:JSON.stringify({target,voice,session_id:sid||undefined})
   }).then(r=>r.json()).then(j=>{
     document.getElementById('msg').innerText=j.message||'';
-    if(!timer){ timer=setInterval(poll,600); }
+    if(j.session_id && j.session_id!==sid){ useSession(j.session_id); }
+    else if(j.session_id && !es){ subscribe(); }
   });
 }
 function stopit(){
-  fetch('/translate/stop',{method:'POST'}).then(r=>r.json()).then(j=>{
+  if(!sid){ return; }
+  fetch('/translate/stop?session_id='+encodeURIComponent(sid),{method:'POST'}).then(r=>r.json()).then(j=>{
     document.getElementById('msg').innerText=j.message||'';
-    if(timer){ clearInterval(timer); timer=null; }
-    poll();
   });
 }
-function poll(){
-  fetch('/translate/status').then(r=>r.json()).then(j=>{
-    document.getElementById('status').innerText=j.running?'Running':'Idle';
-    document.getElementById('srcBox').innerText=j.src||'';
-    document.getElementById('dstBox').innerText=j.dst||'';
+function phaseText(j){
+  // start/stop 立即返回，设备切换与收尾在后台进行，进度经 state 事件推来
+  if(j.phase==='starting'){ return 'Starting…'; }
+  if(j.phase==='stopping'){ return 'Stopping…'; }
+  if(j.phase==='failed'){ return 'Failed: '+(j.detail||''); }
+  return j.running?'Running':'Idle';
+}
+function box(side){ return document.getElementById(side==='src'?'srcBox':'dstBox'); }
+function follow(el, fn){
+  const atEnd = el.scrollTop + el.clientHeight >= el.scrollHeight - 4;
+  fn();
+  if(atEnd){ el.scrollTop = el.scrollHeight; }
+}
+function setText(side, text){
+  const el=box(side); el.textContent=text||''; partial[side]=null;
+  el.scrollTop=el.scrollHeight;
+}
+function onDelta(side, text){
+  const el=box(side);
+  follow(el, ()=>{
+    if(!partial[side]){ partial[side]=document.createTextNode(''); el.appendChild(partial[side]); }
+    partial[side].appendData(text);
+  });
+}
+function onDone(side, text){
+  const el=box(side);
+  follow(el, ()=>{
+    // 结句替换当前未完成的增量行，避免同一句显示两遍
+    if(partial[side]){ partial[side].remove(); partial[side]=null; }
+    el.appendChild(document.createTextNode(text+'\\n'));
   });
 }
-setInterval(poll,1500);
+function useSession(id){
+  sid=id; localStorage.setItem('lt_sid', id);
+  const q='&session_id='+encodeURIComponent(id);
+  document.getElementById('dlSrc').href='/translate/script?type=src'+q;
+  document.getElementById('dlDst').href='/translate/script?type=dst'+q;
+  subscribe();
+}
+function subscribe(){
+  // EventSource 断线会自动重连，并带上 Last-Event-ID 从断点续传
+  if(es){ es.close(); }
+  es=new EventSource('/translate/stream?session_id='+encodeURIComponent(sid));
+  es.onerror=()=>{
+    // 会话已被清理（404）时 EventSource 不再重连，等下次 Start 再订阅
+    if(es && es.readyState===2){ es=null; }
+  };
+  es.addEventListener('closed', e=>{ es.close(); es=null; });
+  es.addEventListener('snapshot', e=>{
+    const j=JSON.parse(e.data);
+    document.getElementById('status').innerText=phaseText(j);
+    setText('src', j.src); setText('dst', j.dst);
+    if(j.src_partial){ onDelta('src', j.src_partial); }
+    if(j.dst_partial){ onDelta('dst', j.dst_partial); }
+  });
+  es.addEventListener('state', e=>{
+    document.getElementById('status').innerText=phaseText(JSON.parse(e.data));
+  });
+  es.addEventListener('upstream', e=>{
+    const st=JSON.parse(e.data).state;
+    document.getElementById('status').innerText = st==='reconnecting'?'Reconnecting…':(st==='lost'?'Disconnected':'Running');
+  });
+  es.addEventListener('reset', e=>{ setText('src',''); setText('dst',''); });
+  es.addEventListener('delta', e=>{ const j=JSON.parse(e.data); onDelta(j.side, j.text); });
+  es.addEventListener('done',  e=>{ const j=JSON.parse(e.data); onDone(j.side, j.text); });
+}
+if(sid){ useSession(sid); }
 </script>
 </body></html>
 """
@@ -282,139 +353,715 @@ def auth_login(payload: dict = Body(...)):
     email = payload.get("email", "")
     return {"ok": True, "message": f"Logged in: {email}"}
 
+def _no_audio(e: Exception) -> JSONResponse:
+    # 无声卡/未装 PyAudio 的部署（纯远程推流）：设备接口报 503，不是 500
+    return JSONResponse({"ok": False, "message": f"audio devices unavailable: {e}", "devices": []}, status_code=503)
+
+@app.get("/devices")
+def devices():
+    try:
+        found = DEVICES.devices()
+    except (ImportError, OSError) as e:
+        return _no_audio(e)
+    return {
+        "ok": True,
+        "stats": DEVICES.stats(),
+        "devices": [
+            {"index": i, "name": d.get("name"), "inputs": d.get("maxInputChannels"),
+             "outputs": d.get("maxOutputChannels"), "rate": d.get("defaultSampleRate")}
+            for i, d in enumerate(found)
+        ],
+    }
+
+@app.post("/devices/refresh")
+def devices_refresh():
+    """插拔设备后手动重扫；有会话在采集/播放时推迟到它们结束。"""
+    try:
+        done = DEVICES.refresh()
+    except (ImportError, OSError) as e:
+        return _no_audio(e)
+    return {"ok": True, "refreshed": done, "stats": DEVICES.stats()}
+
+@app.get("/translate/sessions")
+def translate_sessions():
+    return {
+        "ok": True,
+        "running": MANAGER.running_count(),
+        "max_sessions": MANAGER.max_sessions,
+        "pool": MANAGER.pool.stats() if MANAGER.pool else None,
+        "sessions": [s.info() for s in MANAGER.sessions.values()],
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus 文本格式：按会话的延迟直方图/计数器 + 会话、连接池、采集/播放缓冲的即时量。"""
+    running = [s for s in MANAGER.sessions.values() if s.running and s.client]
+    extra = [
+        ("sessions_running", "gauge", "Sessions currently running.", [({}, MANAGER.running_count())]),
+        ("capture_overruns_total", "counter", "Capture frames dropped because the ring buffer was full.",
+         [({"session": s.id}, s.client.capture.stats()["overruns"]) for s in running if s.client.capture]),
+        ("capture_underruns_total", "counter", "Capture reads that timed out waiting for the device.",
+         [({"session": s.id}, s.client.capture.stats()["underruns"]) for s in running if s.client.capture]),
+        ("playback_fill_ms", "gauge", "TTS audio queued in the jitter buffer.",
+         [({"session": s.id}, s.client.playback_buffer.stats()["fill_ms"]) for s in running]),
+        ("playback_late_total", "counter", "Playback reads that found the jitter buffer short.",
+         [({"session": s.id}, s.client.playback_buffer.stats()["late"]) for s in running]),
+        ("playback_dropped_ms_total", "counter", "TTS audio dropped to keep latency bounded.",
+         [({"session": s.id}, s.client.playback_buffer.stats()["dropped_ms"]) for s in running]),
+        ("playback_underruns_total", "counter", "Output callbacks padded with silence because TTS had not arrived.",
+         [({"session": s.id}, s.client.player.stats().get("underruns", 0)) for s in running if s.client.player]),
+        ("uplink_queue_ms", "gauge", "Audio waiting in the uplink send queue.",
+         [({"session": s.id}, s.client.uplink.stats()["depth_ms"]) for s in running]),
+        ("uplink_dropped_ms_total", "counter", "Uplink audio dropped by the send queue policy under congestion.",
+         [({"session": s.id}, s.client.uplink.stats()["dropped_ms"]) for s in running]),
+        ("uplink_coalesced_total", "counter", "Uplink frames merged into a previous append under congestion.",
+         [({"session": s.id}, s.client.uplink.coalesced) for s in running]),
+    ]
+    hubs = [(s.id, s.hub.stats()) for s in MANAGER.sessions.values() if s.hub.total]
+    extra += [
+        ("listeners", "gauge", "WebSocket listeners subscribed to a session broadcast.",
+         [({"session": sid}, st["listeners"]) for sid, st in hubs]),
+        ("broadcast_dropped_text_total", "counter", "Transcript messages dropped for slow listeners (replaced by a snapshot).",
+         [({"session": sid}, st["dropped_text"]) for sid, st in hubs]),
+        ("broadcast_dropped_audio_bytes_total", "counter", "TTS bytes dropped for slow listeners.",
+         [({"session": sid}, st["dropped_audio_bytes"]) for sid, st in hubs]),
+        ("event_loop_lag_seconds", "histogram", "How late the event loop woke up for a periodic tick.", LOOP_MONITOR.hist),
+        ("event_loop_stalls_total", "counter", "Event loop stalls longer than the stall threshold.",
+         [({}, LOOP_MONITOR.stall_count)]),
+    ]
+    if MANAGER.pool:
+        st = MANAGER.pool.stats()
+        extra.append(("pool_acquires_total", "counter", "Upstream pool acquisitions by result.",
+                      [({"result": "hit"}, st["hits"]), ({"result": "miss"}, st["misses"])]))
+    return PlainTextResponse(REGISTRY.render(extra), media_type="text/plain; version=0.0.4")
+
 @app.get("/translate/status")
-def translate_status():
+def translate_status(since: Optional[int] = None, session_id: Optional[str] = None, lang: Optional[str] = None):
+    """
+    不带 since：兼容旧格式，返回全文（含未完成句）。
+    带 since：只返回编号 >= since 的已完成句子和当前未完成句，next 作为下次的 since。
+    不带 session_id 时取最近启动的会话；还没有任何会话时返回空。
+    """
+    sess = _get_session(session_id)
+    if sess is None:
+        if session_id:
+            raise HTTPException(404, "session not found")
+        return {"ok": True, "running": False, "src": "", "dst": "", "message": "Live Translate server up"}
+    dst = sess.store("dst", lang)
+    if dst is None:
+        raise HTTPException(404, f"language {lang} not in session")
+    if since is None:
+        return {
+            "ok": True,
+            "session_id": sess.id,
+            "running": sess.running,
+            "phase": sess.phase,
+            "src": sess.src.text() + sess.src.partial,
+            "dst": dst.text() + dst.partial,
+            "message": "Live Translate server up",
+        }
     return {
         "ok": True,
-        "running": SESS.running,
-        "src": "".join(SESS.src_buf),
-        "dst": "".join(SESS.dst_buf),
+        "session_id": sess.id,
+        "running": sess.running,
+        "phase": sess.phase,
+        "since": since,
+        "src": {"segments": sess.src.since(since), "partial": sess.src.partial, "next": len(sess.src)},
+        "dst": {"segments": dst.since(since), "partial": dst.partial, "next": len(dst)},
         "message": "Live Translate server up",
     }
 
+def _sse(seq: int, kind: str, data: dict) -> bytes:
+    body = json.dumps(data, ensure_ascii=False)
+    return f"id: {seq}\nevent: {kind}\ndata: {body}\n\n".encode("utf-8")
+
+@app.get("/translate/stream")
+async def translate_stream(
+    request: Request, since: Optional[int] = None, session_id: Optional[str] = None, lang: Optional[str] = None,
+):
+    """
+    SSE 推送：只下发新的增量/结句，开销与会话时长无关。
+    续传序号取 ?since=，否则取浏览器自动带上的 Last-Event-ID；都没有则先发一次快照。
+    lang：多目标语言会话里要看的语言（缺省为主语言）。
+    """
+    sess = _session_or_404(session_id)
+    if sess.store("dst", lang) is None:
+        raise HTTPException(404, f"language {lang} not in session")
+    lane = sess.lane_of(lang)
+    feed = sess.feed
+    if since is None:
+        with contextlib.suppress(TypeError, ValueError):
+            since = int(request.headers.get("last-event-id"))
+
+    async def gen():
+        cursor = since
+        backlog = None if cursor is None else feed.since(cursor)
+        if backlog is None:
+            # 首次连接或断线太久：发一次全量快照，之后只发增量
+            cursor = feed.seq
+            yield _sse(cursor, "snapshot", sess.snapshot(lang))
+            backlog = []
+        while True:
+            for seq, kind, data in backlog:
+                view = lane_view(kind, data, lane)
+                if view is not None:
+                    yield _sse(seq, kind, view)
+                cursor = seq
+            if feed.closed or await request.is_disconnected():
+                break
+            await feed.wait(cursor, timeout=15)
+            backlog = feed.since(cursor)
+            if backlog is None:
+                # 订阅方太慢，窗口已滑过：补一次快照
+                cursor = feed.seq
+                yield _sse(cursor, "snapshot", sess.snapshot(lang))
+                backlog = []
+            elif not backlog:
+                yield b": keepalive\n\n"
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/translate/script")
-def translate_script(type: str = "dst"):
+def translate_script(
+    type: str = "dst",
+    start: int = 0,
+    end: Optional[int] = None,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    session_id: Optional[str] = None,
+    format: str = "txt",
+    gzip: bool = False,
+    lang: Optional[str] = None,
+):
+    """
+    下载脚本。默认返回全部已完成句子；
+    - start/end：按句编号取 [start, end)；
+    - offset/limit：按字符偏移续传（例如断点续下），优先于 start/end，仅 txt；
+    - format：txt | srt | vtt | jsonl（后三种带每句相对采集开始的时间戳）；
+    - gzip=1：以 .gz 文件下载；
+    - lang：多目标语言会话里要下载的译文语言（缺省为主语言）。
+    除 offset 续传外都是分批流式输出，导出多小时的转写也不会先拼成一个大字符串。
+    """
     if type not in ("src", "dst"):
         raise HTTPException(400, "type must be src|dst")
-    text = "".join(SESS.src_buf if type == "src" else SESS.dst_buf)
-    return PlainTextResponse(text, media_type="text/plain; charset=utf-8")
+    if format not in EXPORTERS:
+        raise HTTPException(400, "format must be " + "|".join(EXPORTERS))
+    sess = _session_or_404(session_id)
+    store = sess.store(type, lang)
+    if store is None:
+        raise HTTPException(404, f"language {lang} not in session")
+    headers = {"X-Transcript-Segments": str(len(store)), "X-Transcript-Length": str(store.length)}
+    if offset is not None:
+        if format != "txt":
+            raise HTTPException(400, "offset/limit only apply to format=txt")
+        return PlainTextResponse(
+            store.text_from_offset(offset, limit), media_type=MEDIA_TYPES["txt"], headers=headers,
+        )
 
-@app.post("/translate/start")
-async def translate_start(payload: dict = Body(...)):
-    if SESS.running:
-        return JSONResponse({"ok": False, "message": "Session already running"}, status_code=409)
+    body = EXPORTERS[format](store, start, end)
+    media_type = MEDIA_TYPES[format]
+    lane = sess.lane_of(lang) if type == "dst" else None
+    filename = f"{sess.id}.{type}.{format}" if lane is None else f"{sess.id}.{type}.{lane}.{format}"
+    if gzip:
+        body = gzip_stream(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+    if gzip or format != "txt":
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(body, media_type=media_type, headers=headers)
 
-    api_key = os.getenv("DASHSCOPE_API_KEY", "").strip()
-    if not api_key:
-        raise HTTPException(400, "DASHSCOPE_API_KEY 未设置")
+def _parse_targets(target: Optional[str], targets) -> Tuple[str, List[str]]:
+    """
+    多目标语言：targets=["en","ja","ko"]（或逗号分隔），第一个（或 target）为主语言，其余共用同一路采集。
+    返回 (主语言, 其他语言)，其他语言数受 LT_MAX_TARGETS 限制。
+    """
+    targets = targets or []
+    if isinstance(targets, str):
+        targets = targets.split(",")
+    targets = [t.strip() for t in targets if t and t.strip()]
+    target = (target or (targets[0] if targets else "en")).strip()
+    extra = [t for t in dict.fromkeys(targets) if t != target][: max(0, int(os.getenv("LT_MAX_TARGETS", "6")) - 1)]
+    return target, extra
 
-    target = (payload.get("target") or "en").strip()
-    voice  = (payload.get("voice")  or "Cherry").strip()
+# 设备操作专用线程：拾取设备、记住/切换/恢复系统默认设备都在这里串行执行——
+# 不占事件循环（一个会话切设备时其他会话照常收发），单线程保证切换与恢复按提交顺序生效
+DEVICE_WORKER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-device")
 
+def _switch_audio_for_start(first_session: bool) -> Tuple[int, Optional[int]]:
+    """
+    本机会话：拾取 PyAudio 输入（CABLE Output）/输出（扬声器）索引；
+    第一个本机会话还要记住当前默认设备并把默认录音设备切到虚拟麦克风（Stop 时恢复）。
+    阻塞调用，在 DEVICE_WORKER 里执行；失败抛 RuntimeError，由 _start_session 转为 failed。
+    """
     # === [AUDIO AUTO SWITCH] Start: 自动切到虚拟麦克风，仅此，不动扬声器 ===
+    # 0) 供“同传逻辑”使用：拾取 PyAudio 输入/输出索引（保持你当前可用的做法）
     try:
-        # 0) 供“同传逻辑”使用：拾取 PyAudio 输入/输出索引（保持你当前可用的做法）
         in_idx  = pick_cable_output_index()  # 作为麦克风采集的“CABLE Output”
         out_idx = pick_speaker_index()       # TTS 直出实体扬声器
-        if in_idx is None:
-            raise HTTPException(500, "未找到 CABLE Output（虚拟麦克风）。")
+    except Exception as e:
+        raise RuntimeError(f"音频初始化失败：{e}") from e
+    if in_idx is None:
+        raise RuntimeError("未找到 CABLE Output（虚拟麦克风）。")
 
+    ca = _coreaudio()
+    if not first_session or ca is None:
+        return in_idx, out_idx
+    try:
         # 1) 记住当前默认的录音/播放设备，Stop 时恢复
-        _AUDIO_RESTORE["cap_id"],  _AUDIO_RESTORE["cap_name"]  = get_default_capture_id()
-        _AUDIO_RESTORE["play_id"], _AUDIO_RESTORE["play_name"] = get_default_playback_id()
+        _AUDIO_RESTORE["cap_id"],  _AUDIO_RESTORE["cap_name"]  = ca.get_default_capture_id()
+        _AUDIO_RESTORE["play_id"], _AUDIO_RESTORE["play_name"] = ca.get_default_playback_id()
         print(f"[AUDIO] Will restore Mic: {_AUDIO_RESTORE['cap_name'] or _AUDIO_RESTORE['cap_id']}")
         print(f"[AUDIO] Will restore Spk: {_AUDIO_RESTORE['play_name'] or _AUDIO_RESTORE['play_id']}")
+        _AUDIO_RESTORE["owed"] = True  # 记下了才欠一次恢复；之前失败则不会拿旧记录去“恢复”
 
         # 2) 将“默认录音设备(麦克风)”切到 VB-Cable 的 Output（虚拟麦克风）
-        target_mic = find_capture_id_by_substring([
+        target_mic = ca.find_capture_id_by_substring([
             "cable output (vb-audio virtual cable)", "vb-audio virtual", "cable output"
         ])
         if target_mic:
             dev_id, dev_name = target_mic
-            ok = set_default_capture(dev_id)
+            ok = ca.set_default_capture(dev_id)
             print(f"[AUDIO] Default CAPTURE switched to: {dev_name} -> {ok}")
         else:
             print("[AUDIO] 未找到虚拟麦克风(CABLE Output)，跳过切换（不影响同传主流程）")
     except Exception as e:
         print(f"[AUDIO] Auto mic switch failed: {e}")
-        # 保底：若 in_idx 未定义，明确失败
-        try:
-            in_idx
-        except NameError:
-            raise HTTPException(500, f"音频初始化失败：{e}")
-
-    # ——以下同传逻辑保持不动——
-    SESS.reset()
-    client = LiveTranslateClient(
-        api_key=api_key,
-        target_language=target,
-        voice=voice,
-        audio_enabled=True,
-        input_device_index=in_idx,
-        output_device_index=out_idx,  # TTS 直出扬声器
-    )
-    SESS.client = client
-    SESS.running = True
-
-    def on_delta(t: str):
-        SESS.dst_buf.append(t)
-
-    def on_done(t: str):
-        SESS.dst_buf.append(t + "\n")
-
-    async def runner():
-        try:
-            await client.connect()
-            client.start_audio_player()
-            t1 = asyncio.create_task(client.handle_server_messages(on_text_delta=on_delta, on_text_done=on_done))
-            t2 = asyncio.create_task(client.start_microphone_streaming())
-            await asyncio.gather(t1, t2)
-        except asyncio.CancelledError:
-            pass
-        except Exception as e:
-            print("[RUNNER] error:", e)
-        finally:
-            with contextlib.suppress(Exception):
-                await client.close()
-            SESS.running = False
-            SESS.client = None
-            SESS.worker = None
-    SESS.worker = asyncio.create_task(runner())
-    return {"ok": True, "message": f"Started: target={target}, voice={voice}"}
-
-@app.post("/translate/stop")
-async def translate_stop():
-    # 停止同传
-    if SESS.worker:
-        SESS.worker.cancel()
-        with contextlib.suppress(Exception):
-            await asyncio.wait_for(SESS.worker, timeout=2)
-    with contextlib.suppress(Exception):
-        if SESS.client:
-            await SESS.client.close()
-    SESS.running = False
-    SESS.client = None
-    SESS.worker = None
+    return in_idx, out_idx
 
+def _restore_audio_defaults():
+    """
+    最后一个本机会话停止后恢复启动前的默认设备（扬声器 & 麦克风）。阻塞调用，在 DEVICE_WORKER 里执行：
+    与切换在同一线程排队，即便启动被取消、切换晚于停止请求才执行完，这里也能看到它记下的设备。
+    """
     # === [AUDIO AUTO SWITCH] Stop: 恢复默认设备（扬声器 & 麦克风） ===
+    if not _AUDIO_RESTORE["owed"]:
+        return
+    _AUDIO_RESTORE["owed"] = False
+    ca = _coreaudio()
+    if ca is None:
+        return
     try:
         # 先恢复扬声器（你的重点需求）
         if _AUDIO_RESTORE.get("play_id"):
-            ok = set_default_playback(_AUDIO_RESTORE["play_id"])
+            ok = ca.set_default_playback(_AUDIO_RESTORE["play_id"])
             print(f"[AUDIO] Restore Speaker -> {_AUDIO_RESTORE['play_name'] or _AUDIO_RESTORE['play_id']}: {ok}")
         else:
             print("[AUDIO] 没有记录到启动前的扬声器，跳过")
 
         # 再恢复麦克风（避免系统残留在虚拟麦）
         if _AUDIO_RESTORE.get("cap_id"):
-            ok2 = set_default_capture(_AUDIO_RESTORE["cap_id"])
+            ok2 = ca.set_default_capture(_AUDIO_RESTORE["cap_id"])
             print(f"[AUDIO] Restore Mic -> {_AUDIO_RESTORE['cap_name'] or _AUDIO_RESTORE['cap_id']}: {ok2}")
         else:
             print("[AUDIO] 没有记录到启动前的麦克风，跳过")
     except Exception as e:
         print(f"[AUDIO] Restore failed: {e}")
 
-    return {"ok": True, "message": "Stopped and restored audio defaults."}
+def _pick_lane_outputs(extra: List[str], tts_outputs: dict) -> dict:
+    """其他语言的播放设备（名称关键字 -> 索引）；阻塞调用，在 DEVICE_WORKER 里执行。"""
+    outs = {}
+    for lang in extra:
+        if not tts_outputs.get(lang):
+            continue
+        outs[lang] = DEVICES.find("output", [tts_outputs[lang]])
+        if outs[lang] is None:
+            print(f"[PickOut] {lang}: 未找到播放设备 {tts_outputs[lang]!r}，该语言只出文本")
+    return outs
+
+async def _start_session(sess: SessionState, api_key: str, payload: dict,
+                         target: str, extra: List[str], voice: str, first_session: bool):
+    """后台启动：拾取/切换设备（DEVICE_WORKER）→ 建客户端 → sess.start()；失败时会话转为 failed。"""
+    loop = asyncio.get_running_loop()
+    try:
+        # 无声卡部署：LT_AUDIO_SOURCE / LT_AUDIO_SINK（如 "tcp:10.0.0.5:9000"——主动连到推流/播放端监听的地址、
+        # "wav:in.wav"、"tone"、"null"）
+        # 取代设备拾取，也不切换系统默认设备
+        source_spec = os.getenv("LT_AUDIO_SOURCE", "").strip()
+        sink_spec = os.getenv("LT_AUDIO_SINK", "").strip()
+        try:
+            source = make_source(source_spec) if source_spec else None
+            sink = make_sink(sink_spec) if sink_spec else None
+        except ValueError as e:
+            raise RuntimeError(f"音频后端配置错误：{e}") from e
+        if source is not None:
+            in_idx, out_idx = None, None
+        else:
+            in_idx, out_idx = await loop.run_in_executor(DEVICE_WORKER, _switch_audio_for_start, first_session)
+        # 其他语言：只连上游，不另开采集；tts_outputs 给了播放设备（名称关键字）的语言才要译音
+        lane_outs = await loop.run_in_executor(DEVICE_WORKER, _pick_lane_outputs, extra, payload.get("tts_outputs") or {})
+
+        # ——以下同传逻辑保持不动——
+        client = LiveTranslateClient(
+            api_key=api_key,
+            target_language=target,
+            voice=voice,
+            audio_enabled=True,
+            input_device_index=in_idx,
+            output_device_index=out_idx,  # TTS 直出扬声器
+            # 静音门控阈值：LT_VAD_RMS_THRESHOLD 未设置时逐帧全发（与旧行为一致）
+            vad_rms_threshold=int(os.getenv("LT_VAD_RMS_THRESHOLD", "0")) or None,
+            frame_ms=int(os.getenv("LT_FRAME_MS", "100")),
+            playback_block_ms=int(os.getenv("LT_PLAYBACK_BLOCK_MS", "20")),
+            send_drop_policy=os.getenv("LT_SEND_DROP_POLICY", "drop_oldest"),
+            source=source,
+            sink=sink,
+        )
+        voices = payload.get("voices") or {}
+        followers = [
+            LiveTranslateClient(
+                api_key=api_key,
+                target_language=lang,
+                voice=voices.get(lang) or voice,
+                audio_enabled=lane_outs.get(lang) is not None,
+                output_device_index=lane_outs.get(lang),
+                playback_block_ms=int(os.getenv("LT_PLAYBACK_BLOCK_MS", "20")),
+            )
+            for lang in extra
+        ]
+        sess.start(client, pool=MANAGER.pool, followers=followers, fresh=bool(payload.get("fresh")))
+        print(f"[SESS] Started {sess.id}: target={','.join(sess.targets)}, voice={voice}")
+    except asyncio.CancelledError:
+        raise  # 启动途中被 stop/remove 取消，由它们收尾
+    except RuntimeError as e:
+        print(f"[SESS] Start {sess.id} failed: {e}")
+        sess.set_phase(FAILED, str(e))
+    except Exception as e:
+        print(f"[SESS] Start {sess.id} failed: {e}")
+        sess.set_phase(FAILED, f"启动失败：{e}")
+    finally:
+        if sess.transition is asyncio.current_task():
+            sess.transition = None
+
+async def _stop_session(sess: SessionState, starting: Optional[asyncio.Task]):
+    """后台停止：取消未完成的启动 → 停会话（等 worker 与各连接收尾）→ 最后一个本机会话时恢复默认设备（DEVICE_WORKER）。"""
+    if starting is not None and not starting.done():
+        starting.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await starting
+    try:
+        await sess.stop()
+        # 系统默认设备是全局的：还有其他本机会话在用（或正在启动）时不恢复
+        if sess.local_audio and MANAGER.running_count(local_only=True) == 0:
+            sess.set_phase(STOPPING, "restoring audio defaults")
+            await asyncio.get_running_loop().run_in_executor(DEVICE_WORKER, _restore_audio_defaults)
+    except Exception as e:
+        print(f"[SESS] Stop {sess.id} failed: {e}")
+    finally:
+        if sess.transition is asyncio.current_task():
+            sess.transition = None
+        if sess.phase == STOPPING:
+            sess.set_phase(IDLE)
+
+async def _stop_removed(sess: SessionState):
+    """删除、闲置清理、进程退出时的停止：与 /translate/stop 相同，最后一个本机会话要恢复系统默认设备。"""
+    starting = sess.transition
+    sess.set_phase(STOPPING, "stopping session")
+    await _stop_session(sess, starting)
+
+MANAGER.stopper = _stop_removed
+
+@app.post("/translate/start")
+async def translate_start(payload: dict = Body(...)):
+    """
+    立即返回（phase=starting）：设备拾取/切换与建连在后台进行，进度与结果经 /translate/stream 的 state 事件、
+    /translate/status 与 /translate/sessions 的 phase/detail 查看（running → 启动成功，failed → 看 detail）。
+    同一 session_id 再次启动时接着追加转写；payload 带 "fresh": true 时先把旧转写归档，从空开始。
+    """
+    api_key = os.getenv("DASHSCOPE_API_KEY", "").strip()
+    if not api_key:
+        raise HTTPException(400, "DASHSCOPE_API_KEY 未设置")
+
+    try:
+        sess = MANAGER.acquire((payload.get("session_id") or "").strip() or None)
+    except SessionIdError as e:
+        return JSONResponse({"ok": False, "message": str(e)}, status_code=400)
+    except SessionBusyError as e:
+        return JSONResponse({"ok": False, "message": str(e)}, status_code=409)
+    except SessionLimitError as e:
+        return JSONResponse({"ok": False, "message": str(e)}, status_code=429)
+
+    target, extra = _parse_targets(payload.get("target"), payload.get("targets"))
+    voice  = (payload.get("voice")  or "Cherry").strip()
+    # 系统默认设备是全局的：只由第一个本机会话切换，最后一个本机会话停止时恢复（远程推流会话不算）
+    # 在进入 starting 之前同步算好，并发的 start 不会都认为自己是第一个
+    first_session = MANAGER.running_count(local_only=True) == 0
+    sess.voice = voice
+    sess.local_audio = True
+    sess.set_phase(STARTING, "picking audio devices")
+    sess.transition = asyncio.create_task(_start_session(sess, api_key, payload, target, extra, voice, first_session))
+    targets = [target, *extra]
+    return {
+        "ok": True,
+        "session_id": sess.id,
+        "phase": sess.phase,
+        "targets": targets,
+        "message": f"Starting: session={sess.id}, target={','.join(targets)}, voice={voice}",
+    }
+
+@app.post("/translate/stop")
+async def translate_stop(session_id: Optional[str] = None):
+    """立即返回（phase=stopping）：会话收尾与默认设备恢复在后台进行，完成后 phase 转为 idle。"""
+    sess = _session_or_404(session_id)
+    if sess.phase == STOPPING:
+        return {"ok": True, "session_id": sess.id, "phase": sess.phase, "message": f"{sess.id} is already stopping."}
+    starting = sess.transition
+    sess.set_phase(STOPPING, "stopping session")
+    sess.transition = asyncio.create_task(_stop_session(sess, starting))
+    return {"ok": True, "session_id": sess.id, "phase": sess.phase, "message": f"Stopping {sess.id}."}
+
+@app.delete("/translate/session/{session_id}")
+async def translate_session_delete(session_id: str):
+    """停止并彻底清理一个会话（转写与事件流一并释放；落盘的转写归档，之后同一 id 从空开始）。"""
+    try:
+        removed = await MANAGER.remove(session_id, archive=True)
+    except SessionIdError as e:
+        raise HTTPException(400, str(e))
+    if not removed:
+        raise HTTPException(404, "session not found")
+    return {"ok": True, "session_id": session_id, "message": f"Removed {session_id}"}
+
+# ---------------------------
+# Debug: loop lag / profiling
+# ---------------------------
+def _require_debug(request: Request):
+    # 默认关闭（服务监听 0.0.0.0，剖析结果含调用栈）：LT_DEBUG_ENDPOINTS=1 开启；
+    # 再设 LT_DEBUG_TOKEN 时，请求须带 X-Debug-Token 头（或 ?token=）
+    if os.getenv("LT_DEBUG_ENDPOINTS", "0") != "1":
+        raise HTTPException(404, "debug endpoints disabled")
+    token = os.getenv("LT_DEBUG_TOKEN", "")
+    given = request.headers.get("x-debug-token") or request.query_params.get("token") or ""
+    if token and not hmac.compare_digest(given, token):
+        raise HTTPException(403, "invalid debug token")
+
+@app.get("/debug/loop")
+def debug_loop(request: Request, limit: int = 20):
+    """事件循环延迟统计 + 最近的卡顿（时长与卡住时的调用栈）。"""
+    _require_debug(request)
+    stalls = list(LOOP_MONITOR.stalls)[-max(0, limit):] if limit > 0 else []
+    return {**LOOP_MONITOR.stats(), "recent": stalls[::-1]}
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 10, mode: str = "cprofile", format: str = "text",
+                        sort: str = "cumulative", hz: int = 100):
+    """
+    对运行中的进程剖析 seconds 秒后下载结果（所有会话共用一个进程与事件循环）：
+    - mode=cprofile：事件循环线程上的确定性剖析，format=text（pstats 报表）或 pstats（二进制，snakeviz 可打开）；
+    - mode=sample：所有线程（含采集/播放）按 hz 采样，输出折叠栈（flamegraph.pl / speedscope）。
+    同一时间只允许一次剖析。
+    """
+    _require_debug(request)
+    if not 0 < seconds <= 300:
+        raise HTTPException(400, "seconds must be within (0, 300]")
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    try:
+        if mode == "cprofile":
+            if format not in ("text", "pstats"):
+                raise HTTPException(400, "format must be text or pstats")
+            prof = await profile_loop(seconds)
+            if format == "text":
+                return PlainTextResponse(profile_text(prof, sort=sort))
+            return Response(profile_bytes(prof), media_type="application/octet-stream",
+                            headers={"Content-Disposition": f'attachment; filename="loop-{stamp}.pstats"'})
+        if mode == "sample":
+            folded = await asyncio.get_running_loop().run_in_executor(
+                None, sample_threads, seconds, max(1, min(hz, 1000))
+            )
+            return PlainTextResponse(folded, headers={
+                "Content-Disposition": f'attachment; filename="threads-{stamp}.folded"'})
+    except ProfilerBusy as e:
+        raise HTTPException(409, str(e))
+    raise HTTPException(400, "mode must be cprofile or sample")
+
+# ---------------------------
+# WebSocket: listen / ingest
+# ---------------------------
+async def _pump_subscriber(ws: WebSocket, sess: SessionState, sub: Subscriber, lang: Optional[str]):
+    """把广播队列发给一个 WebSocket：先发快照，之后文本为 JSON 文本消息、译音为二进制消息；落后太多时补快照。"""
+    async def snapshot():
+        await ws.send_text(json.dumps({"type": "snapshot", "seq": sess.feed.seq, **sess.snapshot(lang)},
+                                      ensure_ascii=False))
+
+    await snapshot()
+    while True:
+        batch = await sub.next()
+        if batch is None:
+            return
+        resync, texts, pcms = batch
+        if resync:
+            await snapshot()
+        for msg in texts:
+            await ws.send_text(msg)
+        for pcm in pcms:
+            await ws.send_bytes(pcm)
+
+async def _until_disconnect(ws: WebSocket):
+    while (await ws.receive())["type"] != "websocket.disconnect":
+        pass
+
+@app.websocket("/translate/listen")
+async def translate_listen(ws: WebSocket, session_id: Optional[str] = None, lang: Optional[str] = None,
+                           audio: bool = True):
+    """
+    收听一个会话（一人讲、多人听）：消息格式同 /translate/ingest 的下行。
+    每条事件在会话侧只序列化一次；每个收听方的队列有界，跟不上时丢自己的译音、文本改发快照，不影响会话与其他人。
+    """
+    sess = None
+    with contextlib.suppress(SessionIdError):
+        sess = MANAGER.get(session_id)
+    if sess is None or sess.store("dst", lang) is None:
+        await ws.close(code=1008, reason="session or language not found")
+        return
+    await ws.accept()
+    sub = sess.hub.subscribe(sess.lane_of(lang), audio=audio)
+    tasks = [asyncio.create_task(_pump_subscriber(ws, sess, sub, lang)), asyncio.create_task(_until_disconnect(ws))]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        sess.hub.unsubscribe(sub)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        with contextlib.suppress(Exception):
+            await ws.close()
+
+@app.websocket("/translate/ingest")
+async def translate_ingest(
+    ws: WebSocket,
+    session_id: Optional[str] = None,
+    target: Optional[str] = None,
+    targets: Optional[str] = None,
+    voice: str = "Cherry",
+    rate: int = 16000,
+    channels: int = 1,
+    tts: bool = True,
+    lang: Optional[str] = None,
+    fresh: bool = False,
+):
+    """
+    远程推流：瘦客户端只管采集与播放，翻译会话跑在服务端，不碰本机声卡。
+    上行：二进制消息 = PCM16LE 交错音频，采样率/声道数取 ?rate=&channels=，长度任意（服务端重采样到 16k 并切帧）；
+          文本消息 {"type":"stop"} 结束会话。
+    下行：文本消息 = JSON 事件，type 为 ready / snapshot / delta / done / upstream / state / reset / error，
+          其余字段与 /translate/stream 相同（另带 seq）；二进制消息 = 译音 PCM16LE 24k/mono（tts=false 时不下发）。
+    targets / lang：与 /translate/start、/translate/stream 相同；下发哪种语言的文本与译音由 lang 决定（缺省主语言）。
+    fresh：同 /translate/start，缺省接着已有转写追加。
+    下行走会话广播（与 /translate/listen 同一条路径），推流方自己也只是一个收听方。
+    """
+    api_key = os.getenv("DASHSCOPE_API_KEY", "").strip()
+    if not api_key:
+        await ws.close(code=1011, reason="DASHSCOPE_API_KEY 未设置")
+        return
+    if not (8000 <= rate <= 192000 and 1 <= channels <= 8):
+        await ws.close(code=1003, reason="unsupported audio format")
+        return
+    await ws.accept()
+
+    target, extra = _parse_targets(target, targets)
+    lang = None if not lang or lang == target else lang
+    if lang is not None and lang not in extra:
+        await ws.send_json({"type": "error", "message": f"language {lang} not in session"})
+        await ws.close(code=1008)
+        return
+    try:
+        sess = MANAGER.acquire((session_id or "").strip() or None)
+    except SessionIdError as e:
+        await ws.send_json({"type": "error", "message": str(e)})
+        await ws.close(code=1008)
+        return
+    except (SessionBusyError, SessionLimitError) as e:
+        await ws.send_json({"type": "error", "message": str(e)})
+        await ws.close(code=1013)
+        return
+
+    sub = None
+    tasks: list = []
+    # acquire 之后的一切都在 try 里：推流方刚 accept 就断开、或 start 时转写落盘出错，会话也会被停掉，
+    # 不会留下一个没人管的上行连接（清理任务跳过运行中的会话）
+    try:
+        client = LiveTranslateClient(
+            api_key=api_key,
+            target_language=target,
+            voice=voice,
+            audio_enabled=tts and lang is None,
+            vad_rms_threshold=int(os.getenv("LT_VAD_RMS_THRESHOLD", "0")) or None,
+            frame_ms=int(os.getenv("LT_FRAME_MS", "100")),
+        )
+        followers = [
+            LiveTranslateClient(api_key=api_key, target_language=l, voice=voice, audio_enabled=tts and l == lang)
+            for l in extra
+        ]
+        sess.voice = voice
+        sess.start(client, pool=MANAGER.pool, followers=followers, local_audio=False, fresh=fresh)
+        worker = sess.worker
+        sub = sess.hub.subscribe(sess.lane_of(lang), audio=tts)
+
+        async def pump_uplink():
+            resampler = make_resampler(rate, client.input_rate)
+            frame_bytes = client.input_chunk * 2
+            block = 2 * channels  # 一个采样帧（各声道一个 PCM16）
+            pending = bytearray()
+            carry = bytearray()  # 上一条消息末尾不满一个采样帧的字节，接到下一条前面，不让后续采样错位
+            while True:
+                msg = await ws.receive()
+                if msg["type"] == "websocket.disconnect":
+                    return
+                data = msg.get("bytes")
+                if data is None:
+                    with contextlib.suppress(ValueError, TypeError, AttributeError):
+                        if json.loads(msg.get("text") or "{}").get("type") == "stop":
+                            return
+                    continue
+                if carry or len(data) % block:
+                    carry += data
+                    cut = len(carry) - len(carry) % block
+                    data = bytes(carry[:cut])
+                    del carry[:cut]
+                    if not data:
+                        continue
+                now = time.monotonic()
+                pcm = resampler.process(to_mono(data, channels))
+                if not pending and len(pcm) == frame_bytes:
+                    await client.ingest_frame(pcm, now)  # 恰好一帧（客户端按 16k/帧长发送时）：不拷贝直送
+                    continue
+                pending += pcm
+                while len(pending) >= frame_bytes:
+                    frame = bytes(pending[:frame_bytes])
+                    del pending[:frame_bytes]
+                    await client.ingest_frame(frame, now)
+
+        async def pump_uplink_guarded():
+            try:
+                await pump_uplink()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 上行处理出错：告诉推流方再结束会话，而不是无声无息地断掉
+                print(f"[INGEST] session={sess.id} uplink error: {e!r}")
+                with contextlib.suppress(Exception):
+                    await ws.send_json({"type": "error", "message": f"uplink error: {e}"})
+
+        await ws.send_text(json.dumps({
+            "type": "ready", "session_id": sess.id, "targets": sess.targets, "lang": lang or target,
+            "input_rate": rate, "channels": channels, "tts_rate": client.output_rate if tts else None,
+        }, ensure_ascii=False))
+        print(f"[INGEST] session={sess.id} targets={','.join(sess.targets)} rate={rate} channels={channels}")
+        tasks = [asyncio.create_task(pump_uplink_guarded()), asyncio.create_task(_pump_subscriber(ws, sess, sub, lang))]
+        # 推流方断开/发 stop，或会话自己结束（上游断开且重连失败）
+        await asyncio.wait([*tasks, worker], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if sub is not None:
+            sess.hub.unsubscribe(sub)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await sess.stop()
+        with contextlib.suppress(Exception):
+            await ws.close()
+        print(f"[INGEST] session={sess.id} closed")
 
 # ---------------------------
 # Entrypoint
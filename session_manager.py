@@ -0,0 +1,568 @@
+# session_manager.py
+# -*- coding: utf-8 -*-
+# 多会话管理：每个会话独立的 LiveTranslateClient / 转写存储 / 事件流 / 后台任务
+
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import contextlib
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from livetranslate_client import LiveTranslateClient
+from transcript_store import SegmentStore, DiskSegmentStore
+from upstream_pool import UpstreamPool
+from metrics import REGISTRY
+from broadcast_hub import BroadcastHub
+
+
+class SessionLimitError(RuntimeError):
+    """并发会话数已达上限。"""
+
+
+class SessionIdError(ValueError):
+    """session_id 不合法：它直接用作转写文件名，只接受 1–48 位字母、数字、_、-，不做改写。"""
+
+
+_SESSION_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,48}")
+
+
+def check_session_id(session_id: str) -> str:
+    if not _SESSION_ID_RE.fullmatch(session_id):
+        raise SessionIdError(f"invalid session_id {session_id[:64]!r}: expected 1-48 of [A-Za-z0-9_-]")
+    return session_id
+
+
+class SessionBusyError(RuntimeError):
+    """同一 session_id 的会话仍在运行（或正在启动/停止）。"""
+
+
+# 会话阶段：idle → starting → running → stopping → idle；启动失败为 failed（可再次启动）。
+# starting/stopping 期间设备拾取、切换与收尾在后台进行，进度经 "state" 事件与 info()/snapshot() 可见
+IDLE, STARTING, RUNNING, STOPPING, FAILED = "idle", "starting", "running", "stopping", "failed"
+
+
+# ---------------------------
+# Transcript feed（SSE 推送）
+# ---------------------------
+class TranscriptFeed:
+    """
+    转写事件流：给每个增量/结句事件编号，保留最近 maxlen 条供断线续传。
+    - publish() 在事件循环内同步调用（on_delta/on_done 回调）；
+    - 订阅方按序号拉取 since 之后的事件，拉不到（已被挤出窗口）时改发快照。
+    序号在会话内单调递增，不随 Stop/Start 重置，所以旧连接的 Last-Event-ID 不会误命中新一轮。
+    """
+
+    def __init__(self, maxlen: int = 4096):
+        self.seq = 0
+        self.closed = False
+        self.events: "deque[Tuple[int, str, dict]]" = deque(maxlen=maxlen)
+        self.listeners: list = []  # 同步回调 fn(seq, kind, data)，例如广播到 WebSocket 收听方
+        self._wake = asyncio.Event()
+
+    def publish(self, kind: str, data: dict) -> int:
+        self.seq += 1
+        self.events.append((self.seq, kind, data))
+        for fn in self.listeners:
+            fn(self.seq, kind, data)
+        # 唤醒当前所有等待者，再换一个新的 Event 给下一轮
+        self._wake.set()
+        self._wake = asyncio.Event()
+        return self.seq
+
+    def close(self):
+        """会话被清理：发一个 closed 事件，订阅方收到后结束推送。"""
+        if not self.closed:
+            self.publish("closed", {})
+            self.closed = True
+
+    def since(self, seq: int) -> Optional[List[Tuple[int, str, dict]]]:
+        """返回 seq 之后的事件；seq 早于窗口起点时返回 None（需要快照）。"""
+        if seq >= self.seq:
+            return []
+        if not self.events or seq + 1 < self.events[0][0]:
+            return None
+        start = seq + 1 - self.events[0][0]
+        return [self.events[i] for i in range(start, len(self.events))]
+
+    async def wait(self, seq: int, timeout: float):
+        """等待直到有序号大于 seq 的事件，或超时。"""
+        if self.seq > seq:
+            return
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._wake.wait(), timeout)
+
+
+# ---------------------------
+# Session
+def lane_view(kind: str, data: dict, lane: Optional[str]) -> Optional[dict]:
+    """
+    按语言过滤事件：主语言（lane=None）只看不带 lang 的事件；其他语言只看自己的 dst 事件
+    （去掉 lang 字段，前端照常显示在译文框）加上与语言无关的事件。返回 None 表示跳过。
+    """
+    lang = data.get("lang")
+    if lane is None:
+        return data if lang is None else None
+    if lang == lane:
+        return {k: v for k, v in data.items() if k != "lang"}
+    if lang is None and not (kind in ("delta", "done", "upstream") and data.get("side", "dst") == "dst"):
+        return data
+    return None
+
+
+# ---------------------------
+class SessionState:
+    def __init__(self, session_id: str, transcript_dir: Optional[str] = None):
+        self.id = session_id
+        self.running: bool = False
+        self.client: Optional[LiveTranslateClient] = None
+        self.worker: Optional[asyncio.Task] = None
+        # 给了目录就落盘（内存只留尾部，重启可恢复），否则纯内存
+        self.transcript_dir = transcript_dir
+        self.src = self._make_store("src")
+        self.dst = self._make_store("dst")
+        # 多目标语言：主语言用 dst/client，其余语言各自一份转写和一个跟随客户端（共用主客户端的采集）
+        self.lanes: Dict[str, SegmentStore] = {}
+        self.lane_clients: Dict[str, LiveTranslateClient] = {}
+        self.feed = TranscriptFeed()
+        # 多人收听：事件按语言各序列化一次，分发给 /translate/listen 的所有连接
+        self.hub = BroadcastHub()
+        self.feed.listeners.append(self._broadcast)
+        self.target: Optional[str] = None
+        self.voice: Optional[str] = None
+        self.created_at = time.time()
+        self.last_active = self.created_at
+        self.capture_t0 = time.monotonic()  # 本轮采集开始；句子时间戳都相对它
+        # 语言（主语言为 None） -> 当前句 (开始, 是否取自服务端 VAD)
+        self._seg_start: Dict[Optional[str], Tuple[float, bool]] = {}
+        # 语言 -> 服务端 speech_started / speech_stopped 换算出的 (开始队列, 结束队列)，秒，相对采集开始
+        self._speech: Dict[Optional[str], Tuple[deque, deque]] = {}
+        self.local_audio = True  # False = 远程推流会话：音频来自 /translate/ingest，不占本机声卡
+        self.phase = IDLE
+        self.phase_detail: Optional[str] = None  # 当前阶段的进度说明 / 失败原因
+        self.transition: Optional[asyncio.Task] = None  # 进行中的后台启动或停止
+
+    def _make_store(self, name: str) -> SegmentStore:
+        if self.transcript_dir:
+            return DiskSegmentStore(self.transcript_dir, f"{self.id}.{name}")
+        return SegmentStore()
+
+    def lane_of(self, lang: Optional[str]) -> Optional[str]:
+        """主语言归一成 None。"""
+        return None if lang is None or lang == self.target else lang
+
+    def store(self, side: str, lang: Optional[str] = None) -> Optional[SegmentStore]:
+        """side=src|dst；lang 为其他目标语言时返回该语言的转写，未知语言返回 None。"""
+        if side == "src":
+            return self.src
+        lane = self.lane_of(lang)
+        return self.dst if lane is None else self.lanes.get(lane)
+
+    @property
+    def targets(self) -> List[str]:
+        return ([self.target] if self.target else []) + list(self.lanes)
+
+    def snapshot(self, lang: Optional[str] = None) -> dict:
+        dst = self.store("dst", lang) or self.dst
+        return {
+            "session_id": self.id,
+            "running": self.running,
+            "phase": self.phase, "detail": self.phase_detail,
+            "src": self.src.text(), "src_partial": self.src.partial,
+            "dst": dst.text(), "dst_partial": dst.partial,
+        }
+
+    def info(self) -> dict:
+        return {
+            "session_id": self.id,
+            "running": self.running,
+            "phase": self.phase,
+            "detail": self.phase_detail,
+            "target": self.target,
+            "targets": self.targets,
+            "voice": self.voice,
+            "remote": not self.local_audio,
+            "listeners": self.hub.listeners,
+            "segments": len(self.dst),
+            "lane_segments": {lang: len(store) for lang, store in self.lanes.items()},
+            "capture": self.client.capture.stats() if self.client and self.client.capture else None,
+            "playback": self.client.playback_buffer.stats() if self.client else None,
+            "player": self.client.player.stats() if self.client and self.client.player else None,
+            "uplink": self.client.uplink.stats() if self.client else None,
+            "created_at": self.created_at,
+            "last_active": self.last_active,
+        }
+
+    def touch(self):
+        self.last_active = time.time()
+
+    @property
+    def busy(self) -> bool:
+        """占着会话槽位：启动中、运行中或停止中（这期间不能再次 start）。"""
+        return self.phase in (STARTING, RUNNING, STOPPING)
+
+    def set_phase(self, phase: str, detail: Optional[str] = None):
+        self.phase = phase
+        self.phase_detail = detail
+        self.touch()
+        self.feed.publish("state", {"running": self.running, "phase": phase, "detail": detail})
+
+    def close_stores(self):
+        for store in (self.src, self.dst, *self.lanes.values()):
+            if isinstance(store, DiskSegmentStore):
+                with contextlib.suppress(Exception):
+                    store.close()
+
+    def reset(self):
+        """清空转写：落盘的会话把现有日志归档（<name>.<时间>.log），再从空开始。只在明确要求时调用。"""
+        for store in (self.src, self.dst, *self.lanes.values()):
+            store.clear()
+        self.feed.publish("reset", {})
+
+    @property
+    def elapsed(self) -> float:
+        """已有转写覆盖到的时间（秒）：同一会话再次启动时，新句子的时间戳接在它后面。"""
+        return max(store.last_end for store in (self.src, self.dst, *self.lanes.values()))
+
+    # --------------------- Run / Stop ---------------------
+
+    def _speech_time(self, lang: Optional[str] = None) -> float:
+        """服务端没给断句位置时的兜底开始（秒，相对采集开始）：客户端记录的说话起点，没有时取现在。"""
+        client = self.client if lang is None else self.lane_clients.get(lang)
+        onset = client.metrics.speech_onset if client else None
+        return (onset if onset is not None else time.monotonic()) - self.capture_t0
+
+    def _track_speech(self, client: LiveTranslateClient, lang: Optional[str] = None):
+        """
+        订阅服务端 VAD 的 speech_started / speech_stopped：audio_start_ms/audio_end_ms 是这段话在上行音频里的位置，
+        由 client.audio_time() 换回采集时刻。句子时间戳取它们，而不是译文到达的时刻（那会晚一个翻译延迟）。
+        """
+        starts, ends = self._speech[lang] = (deque(maxlen=64), deque(maxlen=64))
+
+        def mark(queue: deque, key: str):
+            def handler(event: dict):
+                ms = event.get(key)
+                at = client.audio_time(ms) if isinstance(ms, (int, float)) else None
+                if at is not None:
+                    queue.append(at - self.capture_t0)
+            return handler
+
+        client.on("input_audio_buffer.speech_started", mark(starts, "audio_start_ms"))
+        client.on("input_audio_buffer.speech_stopped", mark(ends, "audio_end_ms"))
+
+    def _begin_segment(self, lang: Optional[str]):
+        if lang in self._seg_start:
+            return
+        starts, ends = self._speech.get(lang) or ((), ())
+        if starts:
+            start = starts.popleft()
+            # 没出译文的语音段（噪声等）留下的结束点早于这句开始，丢掉，免得错位
+            while ends and ends[0] < start:
+                ends.popleft()
+            self._seg_start[lang] = (start, True)
+        else:
+            self._seg_start[lang] = (self._speech_time(lang), False)
+
+    def _event(self, lang: Optional[str], **data) -> dict:
+        # 主语言的事件不带 lang，与单语言时代的前端保持一致
+        if lang is not None:
+            data["lang"] = lang
+        return data
+
+    def on_delta(self, t: str, lang: Optional[str] = None):
+        self._begin_segment(lang)
+        self.store("dst", lang).add_delta(t)
+        self.feed.publish("delta", self._event(lang, side="dst", text=t))
+
+    def on_done(self, t: str, lang: Optional[str] = None):
+        self._begin_segment(lang)
+        start, aligned = self._seg_start.pop(lang)
+        ends = self._speech[lang][1] if aligned else None
+        end = ends.popleft() if ends else time.monotonic() - self.capture_t0
+        seq = self.store("dst", lang).commit(t, start=start, end=max(start, end))
+        self.last_active = time.time()
+        self.feed.publish("done", self._event(lang, side="dst", text=t, seg=seq))
+
+    def _broadcast(self, seq: int, kind: str, data: dict):
+        for lane in self.hub.lanes():
+            view = lane_view(kind, data, lane)
+            if view is not None:
+                self.hub.publish_text(lane, json.dumps({"type": kind, "seq": seq, **view}, ensure_ascii=False))
+
+    def on_upstream_state(self, state: str, lang: Optional[str] = None):
+        """上行连接状态变化（reconnecting/connected/lost），推给前端。"""
+        self.feed.publish("upstream", self._event(lang, state=state))
+
+    def start(
+        self,
+        client: LiveTranslateClient,
+        pool: Optional[UpstreamPool] = None,
+        followers: Iterable[LiveTranslateClient] = (),
+        local_audio: bool = True,
+        fresh: bool = False,
+    ):
+        """
+        绑定 client 并在后台跑：连接 → 收消息 + 推流，结束时自行清理。
+        followers：其他目标语言的客户端，共用 client 的采集，各自一条上行连接、一份转写。
+        local_audio=False：不开本机采集与播放，音频由调用方经 client.ingest_frame() 送入（远程推流）。
+        fresh=False：同一会话停止后再启动时接着追加转写（时间戳接在已有的后面）；True 时先 reset() 归档旧转写。
+        """
+        self.target = client.target_language
+        self.lane_clients = {}
+        for f in followers:
+            lang = f.target_language
+            if lang == self.target or lang in self.lane_clients:
+                continue
+            if lang not in self.lanes:
+                self.lanes[lang] = self._make_store(f"dst.{lang}")
+            self.lane_clients[lang] = f
+        # 这一轮不再翻译的语言：去掉它的转写（磁盘日志留在原处），否则 targets/status/stream 还会列出死语言
+        for lang in [lang for lang in self.lanes if lang not in self.lane_clients]:
+            store = self.lanes.pop(lang)
+            if isinstance(store, DiskSegmentStore):
+                with contextlib.suppress(Exception):
+                    store.close()
+            REGISTRY.drop(f"{self.id}:{lang}")
+        if fresh:
+            self.reset()
+        self.capture_t0 = time.monotonic() - self.elapsed
+        self._seg_start = {}
+        self._speech = {}
+        self._track_speech(client)
+        for lang, f in self.lane_clients.items():
+            self._track_speech(f, lang)
+        self.client = client
+        self.local_audio = local_audio
+        client.on_connection_state = self.on_upstream_state
+        client.metrics = REGISTRY.session(self.id)
+        client.on_audio(lambda pcm: self.hub.publish_audio(None, pcm))
+        for lang, f in self.lane_clients.items():
+            f.on_connection_state = lambda state, lang=lang: self.on_upstream_state(state, lang)
+            f.metrics = REGISTRY.session(f"{self.id}:{lang}")
+            f.on_audio(lambda pcm, lang=lang: self.hub.publish_audio(lang, pcm))
+            client.add_follower(f)
+        self.running = True
+        self.set_phase(RUNNING)
+        self.worker = asyncio.create_task(self._runner(client, pool))
+
+    async def _run_lane(self, lang: str, client: LiveTranslateClient, pool: Optional[UpstreamPool]):
+        """一个跟随语言：只连接、收消息、（可选）播放；失败只影响这一种语言。"""
+        try:
+            ws = await pool.acquire(client.pool_key) if pool else None
+            await client.connect(ws=ws)
+            await self._start_output(client)
+            await client.handle_server_messages(
+                on_text_delta=lambda t: self.on_delta(t, lang),
+                on_text_done=lambda t: self.on_done(t, lang),
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[RUNNER:{self.id}:{lang}] error:", e)
+        finally:
+            with contextlib.suppress(Exception):
+                await client.close()
+
+    async def _runner(self, client: LiveTranslateClient, pool: Optional[UpstreamPool]):
+        tasks: List[asyncio.Task] = []
+        lanes = dict(self.lane_clients)
+        try:
+            # 先开采集（连上之前的音频进预连接缓冲），再取预热连接；取不到才冷连接
+            client.expect_connection()
+            for f in lanes.values():
+                f.expect_connection()
+            if self.local_audio:
+                tasks.append(asyncio.create_task(client.start_microphone_streaming()))
+            for lang, f in lanes.items():
+                tasks.append(asyncio.create_task(self._run_lane(lang, f, pool)))
+            ws = await pool.acquire(client.pool_key) if pool else None
+            await client.connect(ws=ws)
+            await self._start_output(client)
+            tasks.append(asyncio.create_task(
+                client.handle_server_messages(on_text_delta=self.on_delta, on_text_done=self.on_done)
+            ))
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[RUNNER:{self.id}] error:", e)
+        finally:
+            for t in tasks:
+                t.cancel()
+            for c in (client, *lanes.values()):
+                with contextlib.suppress(Exception):
+                    await c.close()
+            self._mark_stopped()
+
+    async def _start_output(self, client: LiveTranslateClient):
+        if self.local_audio:
+            # 打开输出设备（PortAudio 初始化/开流）可能要几百毫秒，放进线程池，不卡其他会话
+            await asyncio.get_running_loop().run_in_executor(None, client.start_audio_player)
+        else:
+            client.playback_buffer.close()  # 译音交给 on_audio() 的订阅方，本机不缓冲也不播放
+
+    def _mark_stopped(self):
+        was_running = self.running
+        self.running = False
+        self.client = None
+        self.lane_clients = {}
+        self.worker = None
+        self.touch()
+        if was_running:
+            # 由 /translate/stop 发起时还要恢复设备，阶段保持 stopping，收尾后再转 idle
+            self.set_phase(STOPPING if self.phase == STOPPING else IDLE)
+
+    async def stop(self, timeout: float = 2):
+        if self.worker:
+            self.worker.cancel()
+            # 用 wait 而不是 wait_for：worker 还没跑就被取消时，wait_for 会把它的 CancelledError 抛给调用方
+            await asyncio.wait([self.worker], timeout=timeout)
+        for c in (self.client, *self.lane_clients.values()):
+            if c is not None:
+                with contextlib.suppress(Exception):
+                    await c.close()
+        self._mark_stopped()
+
+
+# ---------------------------
+# Manager
+# ---------------------------
+class SessionManager:
+    """
+    会话注册表：
+    - max_sessions：同时运行的会话上限（LT_MAX_SESSIONS，默认 32）；
+    - idle_ttl：已停止的会话保留多久（秒）后清理，期间仍可查看/下载转写（LT_SESSION_IDLE_TTL，默认 3600）；
+    - transcript_dir：转写日志目录（LT_TRANSCRIPT_DIR，默认 transcripts，设为空串则只存内存）。
+      会话被清理或进程重启后，按 session_id 访问时从磁盘恢复为已停止的会话。
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+        pool: Optional[UpstreamPool] = None,
+        transcript_dir: Optional[str] = None,
+    ):
+        self.max_sessions = max_sessions or int(os.getenv("LT_MAX_SESSIONS", "32"))
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.getenv("LT_SESSION_IDLE_TTL", "3600"))
+        self.pool = pool  # 预热上行连接池（可选），由 start() 传给各会话
+        self.transcript_dir = (
+            transcript_dir if transcript_dir is not None else os.getenv("LT_TRANSCRIPT_DIR", "transcripts")
+        )
+        self.sessions: Dict[str, SessionState] = {}
+        self.latest_id: Optional[str] = None
+        self._reaper: Optional[asyncio.Task] = None
+        # remove()/reap_idle()/shutdown() 停会话的方式：server.py 换成“停止 + 恢复系统默认设备”，与 /translate/stop 同一条路径
+        self.stopper: Callable[[SessionState], Awaitable[None]] = self._stop
+
+    @staticmethod
+    async def _stop(sess: SessionState):
+        if sess.transition is not None and not sess.transition.done():
+            sess.transition.cancel()  # 还在启动中
+        await sess.stop()
+
+    def running_count(self, local_only: bool = False) -> int:
+        """
+        运行中（含正在启动）的会话数；local_only 时只算占用本机声卡的（不含远程推流会话）。
+        已停下、只剩设备恢复的 stopping 会话不算：此时再启动的会话会重新记住并切换默认设备。
+        """
+        return sum(
+            1 for s in self.sessions.values()
+            if (s.running or s.phase == STARTING) and (s.local_audio or not local_only)
+        )
+
+    def get(self, session_id: Optional[str] = None) -> Optional[SessionState]:
+        """按 id 取会话；不给 id 时取最近一次启动的会话（兼容单会话时代的调用方）。"""
+        if session_id:
+            check_session_id(session_id)
+        sid = session_id or self.latest_id
+        if not sid:
+            return None
+        sess = self.sessions.get(sid)
+        if sess is None and session_id:
+            sess = self._restore(session_id)
+        return sess
+
+    def _new_session(self, session_id: str) -> SessionState:
+        sess = SessionState(session_id, self.transcript_dir or None)
+        self.sessions[sess.id] = sess
+        return sess
+
+    def _restore(self, session_id: str) -> Optional[SessionState]:
+        """磁盘上有该会话的转写日志时，恢复成一个已停止的会话（可查看/下载/续用）。"""
+        if not self.transcript_dir:
+            return None
+        if not DiskSegmentStore.exists(self.transcript_dir, f"{session_id}.dst"):
+            return None
+        print(f"[SESS] Restored {session_id} from {self.transcript_dir}")
+        return self._new_session(session_id)
+
+    def acquire(self, session_id: Optional[str] = None) -> SessionState:
+        """
+        为一次 start 取得会话槽位：已存在且已停止则复用（保留同一事件流），否则新建。
+        """
+        sess = self.get(session_id) if session_id else None
+        if sess and sess.busy:
+            raise SessionBusyError(f"Session {sess.id} is {sess.phase}")
+        if self.running_count() >= self.max_sessions:
+            raise SessionLimitError(f"Too many running sessions (max {self.max_sessions})")
+        if sess is None:
+            sess = self._new_session(session_id or uuid.uuid4().hex[:12])
+        self.latest_id = sess.id
+        return sess
+
+    async def remove(self, session_id: str, archive: bool = False) -> bool:
+        """
+        停止并从内存里去掉会话。落盘的转写默认保留（之后按 session_id 访问会恢复）；
+        archive=True（显式删除）时先归档，之后同一 id 从空开始。
+        """
+        if archive:
+            self.get(session_id)  # 校验 id；已被清理出内存、只剩磁盘转写的会话先恢复，才能归档
+        sess = self.sessions.pop(session_id, None)
+        if sess is None:
+            return False
+        pending = sess.transition
+        if sess.phase == STOPPING and pending is not None and pending is not asyncio.current_task() and not pending.done():
+            await asyncio.wait([pending])  # 进行中的停止（含设备恢复）：等它做完，不能取消
+        else:
+            await self.stopper(sess)
+        if archive:
+            with contextlib.suppress(OSError):
+                sess.reset()
+        sess.feed.close()
+        sess.hub.close()
+        sess.close_stores()
+        REGISTRY.drop(session_id)
+        for lang in sess.lanes:
+            REGISTRY.drop(f"{session_id}:{lang}")
+        if self.latest_id == session_id:
+            self.latest_id = next(reversed(self.sessions), None)
+        print(f"[SESS] Removed {session_id}")
+        return True
+
+    async def reap_idle(self):
+        now = time.time()
+        for sid, sess in list(self.sessions.items()):
+            if not sess.busy and now - sess.last_active > self.idle_ttl:
+                await self.remove(sid)
+
+    async def _reap_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            with contextlib.suppress(Exception):
+                await self.reap_idle()
+
+    def start_reaper(self, interval: float = 60):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop(interval))
+
+    async def shutdown(self):
+        if self._reaper:
+            self._reaper.cancel()
+        for sid in list(self.sessions):
+            await self.remove(sid)
+        if self.pool:
+            await self.pool.close()
@@ -0,0 +1,86 @@
+# subtitle_export.py
+# -*- coding: utf-8 -*-
+# 转写导出：TXT / SRT / WebVTT / JSONL，按批生成，可选 gzip；导出多小时的转写也是边读边发、内存恒定
+
+import json
+import zlib
+from typing import Iterator, Optional
+
+from transcript_store import SegmentStore
+
+BATCH = 256  # 每批取多少句（磁盘存储一次 mmap 读）
+
+MEDIA_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "srt": "application/x-subrip; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+def _ts(seconds: float, sep: str) -> str:
+    ms = int(round(max(0.0, seconds) * 1000))
+    h, ms = divmod(ms, 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}"
+
+
+def _vtt_text(text: str) -> str:
+    """WebVTT 的提示文本里 & < > 要转义（顺带让 "-->" 变成 "--&gt;"）；句内换行存储时已去掉。"""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _batches(store: SegmentStore, start: int, end: Optional[int]):
+    """按批取 (首句编号, 文本列表, 时间列表)；end 在开始时定下，导出期间新结句不会混进来。"""
+    total = len(store)
+    end = total if end is None else max(0, min(end, total))
+    for i in range(max(0, start), end, BATCH):
+        j = min(i + BATCH, end)
+        yield i, store.slice(i, j), store.timing(i, j)
+
+
+def export_txt(store: SegmentStore, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    total = len(store)
+    end = total if end is None else max(0, min(end, total))
+    for i in range(max(0, start), end, BATCH):
+        yield store.text_bytes(i, min(i + BATCH, end))
+
+
+def export_srt(store: SegmentStore, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    for i, texts, times in _batches(store, start, end):
+        yield "".join(
+            f"{i + k + 1}\n{_ts(a, ',')} --> {_ts(b, ',')}\n{text}\n\n"
+            for k, (text, (a, b)) in enumerate(zip(texts, times))
+        ).encode("utf-8")
+
+
+def export_vtt(store: SegmentStore, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    yield b"WEBVTT\n\n"
+    for i, texts, times in _batches(store, start, end):
+        yield "".join(
+            f"{i + k + 1}\n{_ts(a, '.')} --> {_ts(b, '.')}\n{_vtt_text(text)}\n\n"
+            for k, (text, (a, b)) in enumerate(zip(texts, times))
+        ).encode("utf-8")
+
+
+def export_jsonl(store: SegmentStore, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    for i, texts, times in _batches(store, start, end):
+        yield "".join(
+            json.dumps({"index": i + k, "start": round(a, 3), "end": round(b, 3), "text": text},
+                       ensure_ascii=False) + "\n"
+            for k, (text, (a, b)) in enumerate(zip(texts, times))
+        ).encode("utf-8")
+
+
+EXPORTERS = {"txt": export_txt, "srt": export_srt, "vtt": export_vtt, "jsonl": export_jsonl}
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """把字节流逐块压成 gzip 格式（wbits=31），不先攒整份。"""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = z.compress(chunk)
+        if data:
+            yield data
+    yield z.flush()
@@ -0,0 +1,405 @@
+# transcript_store.py
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import mmap
+import struct
+from bisect import bisect_right
+from collections import deque
+from typing import List, Optional, Tuple
+
+
+def _one_line(text: str) -> str:
+    """句内换行替换为空格：每句一行，TXT/SRT/VTT 导出不会被句内空行提前断开，内存与磁盘存储也存同样的文本。"""
+    return text.replace("\r", " ").replace("\n", " ")
+
+
+class SegmentStore:
+    """
+    按句编号的转写存储：
+    - 已完成的句子按顺序编号（0,1,2,...），不可变；
+    - 增量（delta）只累积在“当前未完成句”里，结句时整体替换，不再重复存两遍；
+    - offsets[i] 为第 i 句在全文（每句以换行结尾）中的起始字符偏移，offsets[-1] 为总长；
+    - times[i] 为第 i 句的 (开始, 结束) 秒数，相对本轮采集开始（导出字幕用）。
+    按句号或字符偏移取片段都只需 O(k)（字符偏移多一次二分查找）。
+    """
+
+    def __init__(self):
+        self.segments: List[str] = []
+        self.offsets: List[int] = [0]
+        self.times: List[Tuple[float, float]] = []
+        self._partial: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    # --------------------- Write ---------------------
+
+    def add_delta(self, text: str):
+        """追加增量到当前未完成句。"""
+        if text:
+            self._partial.append(text)
+
+    def _span(self, start: Optional[float], end: Optional[float]) -> Tuple[float, float]:
+        """缺省的开始时间接上一句的结束，缺省的结束时间等于开始。"""
+        if start is None:
+            start = self.last_end
+        if end is None or end < start:
+            end = start
+        return float(start), float(end)
+
+    def commit(self, text: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None) -> int:
+        """
+        结句：以 text（服务端给的完整句）为准，缺省时用已累积的增量；句内换行替换为空格。
+        start/end：该句的时间（秒，相对采集开始）。返回该句的编号。
+        """
+        if not text:
+            text = "".join(self._partial)
+        self._partial.clear()
+        text = _one_line(text)
+        self.segments.append(text)
+        self.offsets.append(self.offsets[-1] + len(text) + 1)
+        self.times.append(self._span(start, end))
+        return len(self.segments) - 1
+
+    def clear(self):
+        self.segments.clear()
+        self.offsets[:] = [0]
+        self.times.clear()
+        self._partial.clear()
+
+    # --------------------- Read ---------------------
+
+    @property
+    def partial(self) -> str:
+        if len(self._partial) > 1:
+            # 折叠成一段，避免反复 join 同一批碎片
+            self._partial[:] = ["".join(self._partial)]
+        return self._partial[0] if self._partial else ""
+
+    @property
+    def length(self) -> int:
+        """已完成部分的总字符数（含换行）。"""
+        return self.offsets[-1]
+
+    @property
+    def last_end(self) -> float:
+        return self.times[-1][1] if self.times else 0.0
+
+    def timing(self, start: int = 0, end: Optional[int] = None) -> List[Tuple[float, float]]:
+        """第 start..end 句的 (开始, 结束) 秒数。"""
+        return self.times[max(0, start):end]
+
+    def since(self, seq: int) -> List[str]:
+        """编号 >= seq 的已完成句子。"""
+        return self.segments[max(0, seq):]
+
+    def slice(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        return self.segments[max(0, start):end]
+
+    def index_of_offset(self, offset: int) -> int:
+        """字符偏移落在哪一句（偏移越界时返回 len(self)）。"""
+        if offset <= 0:
+            return 0
+        return min(bisect_right(self.offsets, offset) - 1, len(self.segments))
+
+    def text(self, start: int = 0, end: Optional[int] = None) -> str:
+        """第 start..end 句拼成的文本（每句以换行结尾）。"""
+        return "".join(s + "\n" for s in self.slice(start, end))
+
+    def text_bytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        return self.text(start, end).encode("utf-8")
+
+    def text_from_offset(self, offset: int, limit: Optional[int] = None) -> str:
+        """从字符偏移 offset 起最多 limit 个字符（仅已完成部分）。"""
+        offset = max(0, min(offset, self.length))
+        i = self.index_of_offset(offset)
+        out: List[str] = []
+        need = None if limit is None else max(0, limit)
+        skip = offset - self.offsets[i] if i < len(self.segments) else 0
+        while i < len(self.segments) and (need is None or need > 0):
+            piece = (self.segments[i] + "\n")[skip:]
+            if need is not None:
+                piece = piece[:need]
+                need -= len(piece)
+            out.append(piece)
+            skip = 0
+            i += 1
+        return "".join(out)
+
+
+# ---------------------------
+# Disk-backed store
+# ---------------------------
+_ENTRY = struct.Struct("<QQ")  # 每句一条：(该句在日志里的起始字节, 起始字符偏移)
+_TIME = struct.Struct("<dd")   # 每句一条：(开始秒, 结束秒)
+
+
+class _MappedFile:
+    """只读 mmap，文件变长后按需重映射（空文件不能 mmap，返回 b""）。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = None
+        self._mm = None
+        self.size = 0
+
+    def view(self, need: int):
+        if need > self.size:
+            self.close()
+            size = os.path.getsize(self.path)
+            if size:
+                self._f = open(self.path, "rb")
+                self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.size = size
+        return self._mm if self._mm is not None else b""
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        if self._f is not None:
+            self._f.close()
+        self._mm = self._f = None
+        self.size = 0
+
+
+class _CharOffsets:
+    """把索引文件里的字符偏移列当成只读序列，供 bisect 直接在 mmap 上二分。"""
+
+    def __init__(self, store: "DiskSegmentStore"):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store) + 1
+
+    def __getitem__(self, i: int) -> int:
+        return self.store._entry(i)[1]
+
+
+def _safe_name(name: str) -> str:
+    # 不截断：截断会让 <id>.src / <id>.dst / <id>.dst.<lang> 落到同一个文件（session_id 已在 SessionManager 校验长度）
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "_"
+
+
+class DiskSegmentStore(SegmentStore):
+    """
+    与 SegmentStore 接口相同，但已完成的句子追加写到磁盘：
+    - <name>.log：UTF-8 文本，每句一行（句内换行替换为空格）；
+    - <name>.idx：每句 16 字节 (起始字节, 起始字符偏移)，按句号/字符偏移定位都是 O(1)/O(log n) 次 mmap 读；
+    - <name>.tim：每句 16 字节 (开始秒, 结束秒)；
+    - 内存里只留最近 tail 句（SSE 快照/增量轮询最常读的部分）和当前未完成句。
+    读取走 mmap，多小时的会话内存也不随转写增长；进程重启后同名会话从磁盘恢复。
+    clear() 不删除数据：把现有日志改名归档（<name>.<时间>.log/.idx），再从空开始。
+    """
+
+    def __init__(self, directory: str, name: str, tail: int = 256):
+        self.dir = directory
+        self.name = _safe_name(name)
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, self.name + ".log")
+        self.idx_path = os.path.join(directory, self.name + ".idx")
+        self.tim_path = os.path.join(directory, self.name + ".tim")
+        self._tail: "deque[str]" = deque(maxlen=tail)
+        self._partial: List[str] = []
+        self._open()
+
+    @staticmethod
+    def exists(directory: str, name: str) -> bool:
+        """directory 下是否已有名为 name 的非空转写日志。"""
+        path = os.path.join(directory, _safe_name(name) + ".log")
+        return os.path.exists(path) and os.path.getsize(path) > 0
+
+    # --------------------- Files ---------------------
+
+    def _open(self):
+        self._count, self._bytes, self._chars = self._recover()
+        self._recover_times()
+        self._log = open(self.log_path, "ab")
+        self._idx = open(self.idx_path, "ab")
+        self._tim = open(self.tim_path, "ab")
+        self._log_map = _MappedFile(self.log_path)
+        self._idx_map = _MappedFile(self.idx_path)
+        self._tim_map = _MappedFile(self.tim_path)
+        self._last_end = self._time(self._count - 1)[1] if self._count else 0.0
+        self._tail.clear()
+        first = max(0, self._count - self._tail.maxlen)
+        self._tail.extend(self._read(first, self._count))
+
+    def _recover(self):
+        """读回已有日志：丢掉写了一半的索引项，截掉没有索引项的日志尾巴。"""
+        if not os.path.exists(self.log_path) or not os.path.exists(self.idx_path):
+            for p in (self.log_path, self.idx_path):
+                open(p, "wb").close()
+            return 0, 0, 0
+        log_size = os.path.getsize(self.log_path)
+        with open(self.idx_path, "rb") as f:
+            raw = f.read()
+        count = len(raw) // _ENTRY.size
+        while count and _ENTRY.unpack_from(raw, (count - 1) * _ENTRY.size)[0] >= log_size:
+            count -= 1
+        if not count:
+            for p in (self.log_path, self.idx_path):
+                open(p, "wb").close()
+            return 0, 0, 0
+        last_byte, last_char = _ENTRY.unpack_from(raw, (count - 1) * _ENTRY.size)
+        with open(self.log_path, "rb") as f:
+            f.seek(last_byte)
+            tail = f.read()
+        nl = tail.find(b"\n")
+        if nl < 0:  # 最后一句没写完整
+            count -= 1
+            end_byte, end_char = last_byte, last_char
+        else:
+            end_byte = last_byte + nl + 1
+            end_char = last_char + len(tail[:nl].decode("utf-8", "replace")) + 1
+        with open(self.log_path, "r+b") as f:
+            f.truncate(end_byte)
+        with open(self.idx_path, "r+b") as f:
+            f.truncate(count * _ENTRY.size)
+        return count, end_byte, end_char
+
+    def _recover_times(self):
+        """时间文件与索引对齐：多的截掉，少的（写到一半或旧日志没有）补 0。"""
+        want = self._count * _TIME.size
+        with open(self.tim_path, "ab") as f:
+            have = f.tell() // _TIME.size * _TIME.size
+            if have < want:
+                f.truncate(have)
+                f.write(_TIME.pack(0.0, 0.0) * ((want - have) // _TIME.size))
+            else:
+                f.truncate(want)
+
+    def close(self):
+        for f in (self._log, self._idx, self._tim):
+            f.close()
+        self._log_map.close()
+        self._idx_map.close()
+        self._tim_map.close()
+
+    def _time(self, i: int) -> Tuple[float, float]:
+        mm = self._tim_map.view((i + 1) * _TIME.size)
+        return _TIME.unpack_from(mm, i * _TIME.size)
+
+    def _entry(self, i: int):
+        """第 i 句的 (起始字节, 起始字符偏移)；i == len 时为总长。"""
+        if i >= self._count:
+            return self._bytes, self._chars
+        mm = self._idx_map.view((i + 1) * _ENTRY.size)
+        return _ENTRY.unpack_from(mm, i * _ENTRY.size)
+
+    def _read(self, start: int, end: int) -> List[str]:
+        if start >= end:
+            return []
+        return self._read_text(start, end).split("\n")[:-1]
+
+    def _read_text(self, start: int, end: int) -> str:
+        a, b = self._entry(start)[0], self._entry(end)[0]
+        mm = self._log_map.view(b)
+        return mm[a:b].decode("utf-8", "replace")
+
+    # --------------------- Write ---------------------
+
+    def commit(self, text: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None) -> int:
+        if not text:
+            text = "".join(self._partial)
+        self._partial.clear()
+        text = _one_line(text)
+        data = (text + "\n").encode("utf-8")
+        # 先写日志再写索引：中途崩溃时最多丢一条没有索引的尾巴，恢复时截掉
+        self._log.write(data)
+        self._log.flush()
+        self._idx.write(_ENTRY.pack(self._bytes, self._chars))
+        self._idx.flush()
+        span = self._span(start, end)
+        self._tim.write(_TIME.pack(*span))
+        self._tim.flush()
+        self._last_end = span[1]
+        self._bytes += len(data)
+        self._chars += len(text) + 1
+        self._count += 1
+        self._tail.append(text)
+        return self._count - 1
+
+    def clear(self):
+        self._partial.clear()
+        if not self._count:
+            return
+        self.close()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        archive = os.path.join(self.dir, f"{self.name}.{stamp}")
+        n = 1
+        while os.path.exists(archive + ".log"):
+            n += 1
+            archive = os.path.join(self.dir, f"{self.name}.{stamp}-{n}")
+        os.replace(self.log_path, archive + ".log")
+        os.replace(self.idx_path, archive + ".idx")
+        os.replace(self.tim_path, archive + ".tim")
+        self._open()
+
+    # --------------------- Read ---------------------
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def segments(self) -> List[str]:
+        return self._read(0, self._count)
+
+    @property
+    def offsets(self) -> _CharOffsets:
+        return _CharOffsets(self)
+
+    @property
+    def length(self) -> int:
+        return self._chars
+
+    @property
+    def last_end(self) -> float:
+        return self._last_end
+
+    def timing(self, start: int = 0, end: Optional[int] = None) -> List[Tuple[float, float]]:
+        start, end, _ = slice(max(0, start), end).indices(self._count)
+        if start >= end:
+            return []
+        mm = self._tim_map.view(end * _TIME.size)
+        return list(_TIME.iter_unpack(mm[start * _TIME.size:end * _TIME.size]))
+
+    def slice(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        start, end, _ = slice(max(0, start), end).indices(self._count)
+        tail_start = self._count - len(self._tail)
+        if start >= tail_start:
+            return list(self._tail)[start - tail_start:max(0, end - tail_start)]
+        return self._read(start, end)
+
+    def since(self, seq: int) -> List[str]:
+        return self.slice(seq)
+
+    def index_of_offset(self, offset: int) -> int:
+        if offset <= 0:
+            return 0
+        return min(bisect_right(self.offsets, offset) - 1, self._count)
+
+    def text(self, start: int = 0, end: Optional[int] = None) -> str:
+        start, end, _ = slice(max(0, start), end).indices(self._count)
+        return self._read_text(start, end) if start < end else ""
+
+    def text_bytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """同 text()，但直接返回 mmap 里的 UTF-8 字节，不解码。"""
+        start, end, _ = slice(max(0, start), end).indices(self._count)
+        if start >= end:
+            return b""
+        a, b = self._entry(start)[0], self._entry(end)[0]
+        return self._log_map.view(b)[a:b]
+
+    def text_from_offset(self, offset: int, limit: Optional[int] = None) -> str:
+        offset = max(0, min(offset, self._chars))
+        end_offset = self._chars if limit is None else min(self._chars, offset + max(0, limit))
+        if offset >= end_offset:
+            return ""
+        i = self.index_of_offset(offset)
+        j = min(self.index_of_offset(end_offset - 1) + 1, self._count)
+        text = self._read_text(i, j)
+        base = self._entry(i)[1]
+        return text[offset - base:end_offset - base]
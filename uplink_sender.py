@@ -0,0 +1,174 @@
+# uplink_sender.py
+# -*- coding: utf-8 -*-
+# 上行发送队列：采集只入队、不等网络；后台任务看着连接的写缓冲发送，拥塞时合并帧或按策略丢弃
+
+import time
+import asyncio
+import contextlib
+from collections import deque
+from typing import Optional
+
+DROP_OLDEST = "drop_oldest"  # 保实时：丢最旧的音频（默认）
+DROP_NEWEST = "drop_newest"  # 保完整开头：队列满时新帧不再入队
+
+
+class UplinkSender:
+    """
+    一个客户端一条发送队列（16k/mono/PCM16 帧）：
+    - push() 同步入队，采集循环/远程推流永远不会因为上游慢而卡住；
+    - 后台任务逐帧发送；连接写缓冲（transport.get_write_buffer_size()）超过 high_water_bytes 时暂停，
+      让积压留在这里——留在这里的还能合并、能按策略丢，进了 socket 缓冲就只能干等；
+    - 恢复后把排队的多帧合并成一条更大的 append（最多 max_coalesce_ms），减少消息数与每条的外壳开销；
+    - 队列音频超过 max_queue_ms 时按 policy 丢弃。
+    统计：depth_ms / max_depth_ms（排队音频）、coalesced（被合并掉的消息数）、dropped_frames / dropped_ms、
+    congested_ms（因写缓冲过高暂停的累计时间）、write_buffer（当前连接写缓冲字节数）。
+    """
+
+    def __init__(
+        self,
+        client,
+        *,
+        max_queue_ms: int = 3000,
+        max_coalesce_ms: int = 500,
+        high_water_bytes: int = 32 * 1024,
+        policy: str = DROP_OLDEST,
+    ):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"unknown drop policy: {policy}")
+        self.client = client
+        self.bytes_per_ms = client.input_rate * 2 / 1000
+        self.max_queue_bytes = int(max_queue_ms * self.bytes_per_ms)
+        self.max_coalesce_bytes = int(max_coalesce_ms * self.bytes_per_ms)
+        self.high_water_bytes = high_water_bytes
+        self.policy = policy
+        self.poll_s = client.input_chunk / client.input_rate / 4  # 拥塞时查写缓冲的间隔：四分之一帧
+        self._q: "deque[tuple[bytes, Optional[float], Optional[str]]]" = deque()
+        self._q_bytes = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.max_depth_bytes = 0
+        self.sent = 0
+        self.send_errors = 0
+        self.coalesced = 0
+        self.dropped_frames = 0
+        self.dropped_bytes = 0
+        self.congested_s = 0.0
+
+    # --------------------- Producer ---------------------
+
+    def push(self, frame: bytes, captured_at: Optional[float] = None, b64: Optional[str] = None):
+        """入队一帧（不阻塞）；超出上限时按策略丢弃。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        n = len(frame)
+        if self._q_bytes + n > self.max_queue_bytes:
+            if self.policy == DROP_NEWEST:
+                self._drop(n)
+                return
+            while self._q and self._q_bytes + n > self.max_queue_bytes:
+                old = self._q.popleft()[0]
+                self._q_bytes -= len(old)
+                self._drop(len(old))
+        self._q.append((frame, captured_at, b64))
+        self._q_bytes += n
+        self.max_depth_bytes = max(self.max_depth_bytes, self._q_bytes)
+        self._wake.set()
+
+    def _drop(self, nbytes: int):
+        self.dropped_frames += 1
+        self.dropped_bytes += nbytes
+
+    def take_all(self) -> list:
+        """取走全部排队帧（断线时交给预连接缓冲，保持顺序）。"""
+        frames = [f for f, _, _ in self._q]
+        self._q.clear()
+        self._q_bytes = 0
+        return frames
+
+    @property
+    def depth(self) -> int:
+        return len(self._q)
+
+    # --------------------- Sender ---------------------
+
+    def _write_buffer(self) -> int:
+        transport = getattr(self.client.ws, "transport", None)
+        if transport is None:
+            return 0
+        with contextlib.suppress(Exception):
+            return transport.get_write_buffer_size()
+        return 0
+
+    def _take(self):
+        """
+        取队首一帧；后面还有积压时合并成一条（合并后 base64 重新算，单帧时沿用预编码负载）。
+        返回 (音频, captured_at, b64, stamp_bytes)：captured_at 取第一个带时刻的帧，stamp_bytes 为到该帧末尾的字节数。
+        """
+        frame, captured_at, b64 = self._q.popleft()
+        self._q_bytes -= len(frame)
+        if not self._q or len(frame) + len(self._q[0][0]) > self.max_coalesce_bytes:
+            return frame, captured_at, b64, None
+        parts = [frame]
+        size = len(frame)
+        stamp_bytes = size if captured_at is not None else None
+        while self._q and size + len(self._q[0][0]) <= self.max_coalesce_bytes:
+            nxt, at, _ = self._q.popleft()
+            self._q_bytes -= len(nxt)
+            parts.append(nxt)
+            size += len(nxt)
+            if captured_at is None and at is not None:
+                captured_at, stamp_bytes = at, size
+        self.coalesced += len(parts) - 1
+        return b"".join(parts), captured_at, None, stamp_bytes
+
+    async def _run(self):
+        client = self.client
+        while True:
+            if not self._q or not client.is_connected:
+                # 空闲，或断线中（新帧由 feed_frames 转入预连接缓冲，重连后补发）
+                self._wake.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_s * 4)
+                continue
+            if self._write_buffer() > self.high_water_bytes:
+                t = time.monotonic()
+                await asyncio.sleep(self.poll_s)
+                self.congested_s += time.monotonic() - t
+                continue
+            try:
+                await client.flush_pending()
+                frame, captured_at, b64, stamp_bytes = self._take()
+                await client.send_audio_chunk(frame, captured_at, b64, stamp_bytes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 单帧发送失败（断线以外的异常）只丢这一帧，任务不能退出，否则之后的帧会被队列策略悄悄丢光
+                self.send_errors += 1
+                print(f"[UPLINK] send failed: {e!r}")
+                await asyncio.sleep(self.poll_s)
+                continue
+            self.sent += 1
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.take_all()
+
+    # --------------------- Stats ---------------------
+
+    def stats(self) -> dict:
+        ms = self.bytes_per_ms
+        return {
+            "policy": self.policy,
+            "depth_ms": round(self._q_bytes / ms),
+            "max_depth_ms": round(self.max_depth_bytes / ms),
+            "sent": self.sent,
+            "send_errors": self.send_errors,
+            "coalesced": self.coalesced,
+            "dropped_frames": self.dropped_frames,
+            "dropped_ms": round(self.dropped_bytes / ms),
+            "congested_ms": round(self.congested_s * 1000),
+            "write_buffer": self._write_buffer(),
+        }
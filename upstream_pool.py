@@ -0,0 +1,178 @@
+# upstream_pool.py
+# -*- coding: utf-8 -*-
+# 预热的上行连接池：提前完成 TLS + WebSocket 握手和 session.update，Start 时直接接管
+
+import os
+import time
+import asyncio
+import contextlib
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+
+from livetranslate_client import API_URL, build_session_config, open_upstream
+
+PoolKey = Tuple[str, Optional[str], Tuple[str, ...]]
+
+
+def make_pool_key(target_language: str, voice: Optional[str], audio_enabled: bool = True) -> PoolKey:
+    """与 LiveTranslateClient.pool_key 一致：(目标语言, 音色, 输出模态)。"""
+    session = build_session_config(target_language, voice, audio_enabled)
+    return (target_language, session.get("voice"), tuple(session["modalities"]))
+
+
+def parse_pool_keys(spec: str) -> list:
+    """解析 LT_POOL_KEYS，例如 "en:Cherry,ja:Cherry,ko"（省略音色即仅文本）。"""
+    keys = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        lang, _, voice = item.partition(":")
+        voice = voice.strip() or None
+        keys.append(make_pool_key(lang.strip(), voice, audio_enabled=voice is not None))
+    return keys
+
+
+class UpstreamPool:
+    """
+    按 (目标语言, 音色, 模态) 分组的预热连接：
+    - size   ：每个键保持的空闲连接数（LT_POOL_SIZE，默认 1，0 为关闭）；
+    - max_age：空闲连接的最长寿命（秒），过期或已被对端关闭的连接会被丢弃并补上（LT_POOL_MAX_AGE）；
+    - idle_ttl：不在 warm() 名单里、按需用到的键（如跟随语言）保持预热多久（秒）：超过这么久没人用就关掉空闲连接、
+      不再补位（LT_POOL_IDLE_TTL，默认 600，0 为只预热名单内的键）。否则每出现一种语言/音色组合就多一条常驻、可能计费的连接。
+    acquire() 只取现成的连接，取不到返回 None，由调用方冷连接；被取走后后台自动补位。
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        size: Optional[int] = None,
+        max_age: Optional[float] = None,
+        idle_ttl: Optional[float] = None,
+        api_url: str = API_URL,
+    ):
+        self.api_key = api_key
+        self.size = size if size is not None else int(os.getenv("LT_POOL_SIZE", "1"))
+        self.max_age = max_age if max_age is not None else float(os.getenv("LT_POOL_MAX_AGE", "240"))
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.getenv("LT_POOL_IDLE_TTL", "600"))
+        self.api_url = api_url
+        self._pinned: set = set()  # warm() 登记的键：常驻预热
+        self._last_used: Dict[PoolKey, float] = {}  # 按需键 -> 最近一次 acquire
+        self._idle: Dict[PoolKey, "deque[Tuple[object, float]]"] = {}
+        self._filling: Dict[PoolKey, asyncio.Task] = {}
+        self._maintainer: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+
+    # --------------------- Public ---------------------
+
+    def warm(self, keys: Iterable[PoolKey]):
+        """登记需要保持预热的键并开始补位。"""
+        for key in keys:
+            self._pinned.add(key)
+            self._idle.setdefault(key, deque())
+            self._schedule_fill(key)
+        if self._maintainer is None or self._maintainer.done():
+            self._maintainer = asyncio.create_task(self._maintain_loop())
+
+    async def acquire(self, key: PoolKey):
+        """取一个可用的预热连接；没有就返回 None。名单外的键在 idle_ttl 内会被按需预热。"""
+        if key not in self._pinned:
+            if self.idle_ttl <= 0:
+                self.misses += 1
+                return None
+            self._last_used[key] = time.monotonic()
+        idle = self._idle.setdefault(key, deque())
+        ws = None
+        while idle:
+            cand, created = idle.popleft()
+            if self._usable(cand, created):
+                ws = cand
+                break
+            await self._discard(cand)
+        if ws is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self._schedule_fill(key)
+        return ws
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "on_demand": len(self._last_used),
+            "hits": self.hits,
+            "misses": self.misses,
+            "idle": {"/".join(str(p) for p in k[:2]): len(v) for k, v in self._idle.items()},
+        }
+
+    async def close(self):
+        self._closed = True
+        if self._maintainer:
+            self._maintainer.cancel()
+        for t in list(self._filling.values()):
+            t.cancel()
+        for idle in self._idle.values():
+            while idle:
+                ws, _ = idle.popleft()
+                await self._discard(ws)
+
+    # --------------------- Internal ---------------------
+
+    def _usable(self, ws, created: float) -> bool:
+        return getattr(ws, "close_code", None) is None and time.monotonic() - created < self.max_age
+
+    async def _discard(self, ws):
+        with contextlib.suppress(Exception):
+            await ws.close()
+
+    def _schedule_fill(self, key: PoolKey):
+        if self._closed or self.size <= 0:
+            return
+        t = self._filling.get(key)
+        if t is None or t.done():
+            self._filling[key] = asyncio.create_task(self._fill(key))
+
+    async def _fill(self, key: PoolKey):
+        target_language, voice, modalities = key
+        session = build_session_config(target_language, voice, "audio" in modalities)
+        idle = self._idle.setdefault(key, deque())
+        while not self._closed and len(idle) < self.size:
+            try:
+                ws = await open_upstream(self.api_key, session, self.api_url)
+            except Exception as e:
+                print(f"[POOL] warm-up failed for {key}: {e}")
+                return
+            idle.append((ws, time.monotonic()))
+            print(f"[POOL] warmed {key} ({len(idle)}/{self.size})")
+
+    async def _expire(self, key: PoolKey):
+        """按需键过期：停止补位并关掉它的空闲连接。"""
+        self._last_used.pop(key, None)
+        t = self._filling.pop(key, None)
+        if t is not None:
+            t.cancel()
+        idle = self._idle.pop(key, None) or ()
+        for ws, _ in idle:
+            await self._discard(ws)
+        print(f"[POOL] expired {key} (unused for {self.idle_ttl:.0f}s)")
+
+    async def _maintain_loop(self, interval: float = 15):
+        while not self._closed:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for key, used in list(self._last_used.items()):
+                if now - used > self.idle_ttl:
+                    await self._expire(key)
+            for key, idle in list(self._idle.items()):
+                # 先同步摘掉失效连接，再逐个关闭，避免与 acquire 交错时少算可用连接
+                stale = [item for item in idle if not self._usable(*item)]
+                for item in stale:
+                    idle.remove(item)
+                for ws, _ in stale:
+                    await self._discard(ws)
+                self._schedule_fill(key)
@@ -0,0 +1,114 @@
+# vad.py
+# -*- coding: utf-8 -*-
+# 能量门限 VAD：在编码/发送前丢掉静音段，只把“说话 + 前后缓冲”送上行
+
+import math
+from array import array
+from collections import deque
+from typing import List
+
+try:
+    import audioop  # Python 3.13 起已移除，缺失时退回纯 Python 计算
+except ImportError:
+    audioop = None
+
+
+def pcm16_rms(frame: bytes) -> int:
+    """单声道 PCM16 帧的 RMS 能量。"""
+    if not frame:
+        return 0
+    if audioop is not None:
+        return audioop.rms(frame, 2)
+    samples = array("h")
+    samples.frombytes(frame[: len(frame) // 2 * 2])
+    if not samples:
+        return 0
+    return int(math.sqrt(sum(s * s for s in samples) / len(samples)))
+
+
+class VoiceActivityGate:
+    """
+    简单的能量门 + 前置/拖尾缓冲：
+    - rms_threshold : 帧 RMS 超过该值视为有声；
+    - pre_roll_ms   : 静音期间保留最近这么多音频，开口时先补发，避免吃掉首字；
+    - silence_ms    : 说话中连续静音超过该值才关门（拖尾，期间照常发送）；
+    - end_silence_ms: 关门时补一段数字静音，让服务端 VAD 及时断句；
+    - max_utter_ms  : 连续说话超过该值时插入一次 end_silence，强制服务端断句（0 为不限制）。
+    process() 输入一帧，返回应发送的若干帧（可能为空）。
+    """
+
+    def __init__(
+        self,
+        *,
+        sample_rate: int = 16000,
+        frame_ms: int = 100,
+        rms_threshold: int = 1200,
+        silence_ms: int = 350,
+        max_utter_ms: int = 7000,
+        pre_roll_ms: int = 200,
+        end_silence_ms: int = 250,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_ms = max(1, frame_ms)
+        self.rms_threshold = rms_threshold
+        self.silence_ms = silence_ms
+        self.max_utter_ms = max_utter_ms
+        self.end_silence = b"\x00\x00" * (sample_rate * max(0, end_silence_ms) // 1000)
+
+        self._pre_roll: "deque[bytes]" = deque(maxlen=max(0, math.ceil(pre_roll_ms / self.frame_ms)))
+        self._active = False
+        self._silent_ms = 0
+        self._utter_ms = 0
+
+        # 统计：便于核对省下了多少上行
+        self.frames_in = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def process(self, frame: bytes) -> List[bytes]:
+        self.frames_in += 1
+        voiced = pcm16_rms(frame) >= self.rms_threshold
+        out: List[bytes] = []
+
+        if not self._active:
+            if not voiced:
+                if self._pre_roll.maxlen:
+                    if len(self._pre_roll) == self._pre_roll.maxlen:
+                        self.frames_dropped += 1
+                    self._pre_roll.append(frame)
+                else:
+                    self.frames_dropped += 1
+                return out
+            # 开门：先补发前置缓冲
+            self._active = True
+            self._silent_ms = 0
+            self._utter_ms = 0
+            out.extend(self._pre_roll)
+            self._pre_roll.clear()
+
+        out.append(frame)
+        self._utter_ms += self.frame_ms
+        self._silent_ms = 0 if voiced else self._silent_ms + self.frame_ms
+
+        if self._silent_ms >= self.silence_ms:
+            # 拖尾结束：关门并补静音
+            self._active = False
+            if self.end_silence:
+                out.append(self.end_silence)
+        elif self.max_utter_ms and self._utter_ms >= self.max_utter_ms:
+            self._utter_ms = 0
+            if self.end_silence:
+                out.append(self.end_silence)
+
+        self.frames_sent += sum(1 for f in out if f is not self.end_silence)
+        return out
+
+    def reset(self):
+        self._pre_roll.clear()
+        self._active = False
+        self._silent_ms = 0
+        self._utter_ms = 0
@@ -0,0 +1,78 @@
+# wire_codec.py
+# -*- coding: utf-8 -*-
+# 上行事件的快速编码：input_audio_buffer.append 的 JSON 外壳预先拼好，只把 base64 负载拼进去
+# 下行事件的快速解码：音频增量跳过完整 JSON 解析，其余事件可选 orjson
+
+import os
+import json
+import time
+import itertools
+from binascii import a2b_base64, b2a_base64
+
+
+class AudioAppendEncoder:
+    """
+    等价于
+        json.dumps({"event_id": ..., "type": "input_audio_buffer.append", "audio": b64})
+    但不建 dict、不走通用序列化：base64 字符集无需转义，直接字符串拼接即可。
+    event_id 为“连接前缀 + 自增序号”，同一毫秒内也不会重复；前缀带随机成分，多会话之间也不冲突。
+    """
+
+    def __init__(self, prefix: str | None = None):
+        if prefix is None:
+            prefix = f"evt_{int(time.time() * 1000):x}{os.urandom(2).hex()}_"
+        self.prefix = prefix
+        self._seq = itertools.count(1)
+        self._head = '{"event_id":"' + prefix
+        self._mid = '","type":"input_audio_buffer.append","audio":"'
+        self._tail = '"}'
+
+    def next_event_id(self) -> str:
+        return f"{self.prefix}{next(self._seq)}"
+
+    def encode(self, pcm) -> str:
+        return self.encode_b64(b64encode_pcm(pcm))
+
+    def encode_b64(self, b64: str) -> str:
+        """负载已是 base64 时只拼外壳：一帧发往多条连接（多目标语言）时 base64 只算一次。"""
+        return self._head + str(next(self._seq)) + self._mid + b64 + self._tail
+
+
+def b64encode_pcm(pcm) -> str:
+    return b2a_base64(pcm, newline=False).decode("ascii")
+
+
+# --------------------- Receive ---------------------
+
+try:
+    import orjson  # 可选：更快的 JSON 后端
+    json_loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    json_loads = json.loads
+    JSON_BACKEND = "json"
+
+_AUDIO_DELTA_TYPES = (b'"type":"response.audio.delta"', b'"type": "response.audio.delta"')
+_DELTA_KEYS = (b'"delta":"', b'"delta": "')
+
+
+def decode_audio_delta(message: bytes) -> bytes | None:
+    """
+    response.audio.delta 的快速路径：不做完整 JSON 解析，直接定位 "delta" 字段，
+    用 memoryview 切片（不拷贝）交给 a2b_base64 一次解码成 PCM。
+    不是音频增量、或格式不是预期的紧凑形式（含转义等）时返回 None，由调用方走通用解析。
+    JSON 字符串里的引号必然被转义，所以 '"type":"response.audio.delta"' 不会误命中文本内容。
+    """
+    if not any(mark in message for mark in _AUDIO_DELTA_TYPES):
+        return None
+    for key in _DELTA_KEYS:
+        start = message.find(key)
+        if start >= 0:
+            start += len(key)
+            break
+    else:
+        return None
+    end = message.find(b'"', start)
+    if end < 0 or message.find(b"\\", start, end) >= 0:
+        return None
+    return a2b_base64(memoryview(message)[start:end])